@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Aggregatcache - beräknade aggregat sparade på disk mellan körningar och rapporter
+
+Varje post nycklas på källdatans innehåll (se källa) och på vad som beräknats,
+t.ex. period och dimension, och sparas som en binär fil i .snapshots/aggregat.
+Samma fil ger alltså samma nycklar i alla skript, så att en rapport kan läsa
+aggregat som en annan redan räknat fram. När katalogen växer över maxstorleken
+tas de poster bort som använts längst tillbaka (LRU på filernas ändringstid).
+
+Cachen startas av skripten med starta(); utan den beräknas allt som vanligt.
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+from pathlib import Path
+
+from inlasning import filhash, SNAPSHOT_VERSION
+
+
+AGGREGAT_KATALOG = 'aggregat'
+
+# Största storlek på cachekatalogen innan gamla poster tas bort
+MAX_MB = 256
+
+# Koden som aggregaten beror på - ändras den blir alla poster ogiltiga
+KODFILER = ['inlasning.py', 'rapportmotor.py', 'aggregatcache.py']
+
+# Tillståndet för en startad cache (None när den är avstängd)
+_cache = None
+
+
+def starta(katalog, max_mb=MAX_MB):
+    """Starta cachen i katalog och rensa den ned till max_mb."""
+    global _cache
+    katalog = Path(katalog)
+    katalog.mkdir(parents=True, exist_ok=True)
+    rot = Path(__file__).parent
+    _cache = {
+        'katalog': katalog,
+        'max_byte': max_mb * 1024 * 1024,
+        'version': '-'.join(filhash(rot / fil) for fil in KODFILER),
+        'minne': {},
+        'storlek': sum(fil.stat().st_size for fil in katalog.glob('*.pkl')),
+        # Dashboardservern läser och skriver från flera trådar - låset skyddar minne och storlek
+        'lås': threading.Lock(),
+    }
+    with _cache['lås']:
+        _rensa()
+
+
+def stoppa():
+    """Stäng av cachen - efterföljande anrop beräknar allt."""
+    global _cache
+    _cache = None
+
+
+def källa(*filer, läge=''):
+    """Identitet för källdatan: hash av filernas innehåll och hur de lästs (t.ex. strömmande)."""
+    return '-'.join([filhash(fil) for fil in filer] + [f"v{SNAPSHOT_VERSION}{läge}"])
+
+
+def läs(nyckel):
+    """Läs posten för nyckel, eller None om den saknas eller cachen är avstängd."""
+    if _cache is None:
+        return None
+    fil = _fil(nyckel)
+    with _cache['lås']:
+        if fil.name in _cache['minne']:
+            return _cache['minne'][fil.name]
+    try:
+        with open(fil, 'rb') as f:
+            värde = pickle.load(f)
+        # Markera posten som använd så att den tas bort sist
+        os.utime(fil)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    with _cache['lås']:
+        _cache['minne'][fil.name] = värde
+    return värde
+
+
+def skriv(nyckel, värde):
+    """Spara värde under nyckel (via temporär fil) och rensa cachen om den blivit för stor."""
+    if _cache is None:
+        return
+    fil = _fil(nyckel)
+    # Unik per process och tråd - dashboardservern kan skriva samma nyckel från flera trådar
+    temp = fil.with_name(f"{fil.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(temp, 'wb') as f:
+        pickle.dump(värde, f, protocol=pickle.HIGHEST_PROTOCOL)
+    with _cache['lås']:
+        # En befintlig post skrivs över - bara skillnaden i storlek tillkommer
+        try:
+            gammal = fil.stat().st_size
+        except FileNotFoundError:
+            gammal = 0
+        os.replace(temp, fil)
+        _cache['minne'][fil.name] = värde
+        _cache['storlek'] += fil.stat().st_size - gammal
+        if _cache['storlek'] > _cache['max_byte']:
+            _rensa()
+
+
+def hämta(nyckel, beräkna):
+    """Värdet för nyckel ur cachen, eller beräkna() som då sparas."""
+    värde = läs(nyckel)
+    if värde is None:
+        värde = beräkna()
+        skriv(nyckel, värde)
+    return värde
+
+
+def _fil(nyckel):
+    namn = hashlib.blake2b(repr((_cache['version'], nyckel)).encode('utf-8'), digest_size=16).hexdigest()
+    return _cache['katalog'] / f"{namn}.pkl"
+
+
+def _rensa():
+    """Ta bort de minst nyligen använda posterna tills katalogen ryms i maxstorleken (under låset)."""
+    filer = []
+    for fil in _cache['katalog'].glob('*.pkl'):
+        try:
+            stat = fil.stat()
+        except FileNotFoundError:  # Borttagen av en annan process
+            continue
+        filer.append((stat.st_mtime, stat.st_size, fil))
+
+    storlek = sum(storlek for _, storlek, _ in filer)
+    for _, fil_storlek, fil in sorted(filer):
+        if storlek <= _cache['max_byte']:
+            break
+        fil.unlink(missing_ok=True)
+        _cache['minne'].pop(fil.name, None)
+        storlek -= fil_storlek
+    _cache['storlek'] = storlek
+
+
+def lägg_till_argument(parser):
+    """Lägg till --utan-cache och --cache-mb i ett skripts argumentparser."""
+    parser.add_argument('--utan-cache', action='store_true',
+                        help="beräkna alla aggregat utan att läsa eller spara aggregatcachen")
+    parser.add_argument('--cache-mb', type=int, default=MAX_MB, metavar='MB',
+                        help=f"största storlek på aggregatcachen innan gamla poster tas bort (standard {MAX_MB})")
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Aggregatexport - vyernas KPI:er och dimensionstabeller som kolumnfil för BI-verktyg
+
+Dashboardsen skriver med --export FIL de aggregat som vyerna redan räknat fram
+till en Parquet- eller Arrow IPC-fil (efter filändelsen), i ett gemensamt långt
+format: en rad per vy, tabell, värde och mått med aktuell period, YoY och MoM.
+Raderna skrivs allteftersom vyerna genereras och filen byts in när exporten
+avslutas, på samma sätt som sidan.
+
+Exporten startas av skripten med starta(); utan den skrivs ingenting.
+Kräver pyarrow.
+"""
+
+import argparse
+import os
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+
+# Filändelser och deras format
+FORMAT = {'.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+
+# Exportens kolumner: vyns identitet, radens tabell, värde och mått samt talen
+VYKOLUMNER = ['vy', 'år', 'månad', 'kanal']
+TALKOLUMNER = ['aktuell', 'yoy', 'mom', 'yoy_diff', 'mom_diff', 'yoy_procent', 'mom_procent', 'mål']
+KOLUMNER = VYKOLUMNER + ['tabell', 'dimension', 'värde', 'mått'] + TALKOLUMNER
+
+# Tabellnamnet för vyns KPI:er
+KPI_TABELL = 'KPI'
+
+# Jämförelsekolumnernas suffix i de analyserade tabellerna (se rapportmotor.jämför_dimension)
+JÄMFÖRELSESUFFIX = {
+    'yoy': '_yoy', 'mom': '_mom', 'yoy_diff': '_yoy_diff', 'mom_diff': '_mom_diff',
+    'yoy_procent': '_yoy%', 'mom_procent': '_mom%',
+}
+
+# Antal rader som samlas innan de skrivs som en radgrupp
+RADGRUPP = 65536
+
+# Tillståndet för en startad export (None när den är avstängd)
+_export = None
+
+
+def starta(fil):
+    """Starta exporten till fil - formatet väljs efter filändelsen."""
+    global _export
+    fil = Path(fil)
+    format = FORMAT.get(fil.suffix.lower())
+    if format is None:
+        raise ValueError(f"Okänt exportformat '{fil.suffix}' - använd {', '.join(FORMAT)}")
+    if pa is None:
+        print("⚠️  pyarrow är inte installerat (pip install pyarrow) - kör utan export")
+        return
+
+    schema = pa.schema(
+        [('vy', pa.string()), ('år', pa.int16()), ('månad', pa.int8())]
+        + [(namn, pa.string()) for namn in ['kanal', 'tabell', 'dimension', 'värde', 'mått']]
+        + [(namn, pa.float64()) for namn in TALKOLUMNER]
+    )
+    temp = fil.with_name(fil.name + '.tmp')
+    if format == 'parquet':
+        skrivare = pq.ParquetWriter(temp, schema)
+    else:
+        skrivare = pa.ipc.new_file(temp, schema)
+    _export = {'fil': fil, 'temp': temp, 'schema': schema, 'skrivare': skrivare,
+               'batcher': [], 'buffrade': 0, 'rader': 0}
+
+
+def aktiv():
+    """Om exporten är startad."""
+    return _export is not None
+
+
+def kpirad(mått, aktuell, yoy, mom, yoy_diff=None, mom_diff=None, yoy_procent=None, mom_procent=None, mål=None):
+    """En KPI som rad för vyrader. Saknade förändringar och mål blir tomma."""
+    return {'mått': mått, 'aktuell': aktuell, 'yoy': yoy, 'mom': mom, 'yoy_diff': yoy_diff,
+            'mom_diff': mom_diff, 'yoy_procent': yoy_procent, 'mom_procent': mom_procent, 'mål': mål}
+
+
+def vyrader(vy, år, månad, kanal, kpi, tabeller):
+    """
+    En vys aggregat som kolumner (se KOLUMNER), redo för skriv.
+
+    kpi är vyns KPI:er från kpirad, tabeller (titel, df, dimension, max_rader)
+    som vyernas analyserade tabeller. Varje tabell ger en rad per värde och mått,
+    där måtten är tabellens kolumner utom dimensionen och jämförelserna - en
+    jämförelse som tabellen saknar för ett mått blir tom.
+    """
+    kolumner = {namn: [] for namn in KOLUMNER if namn not in VYKOLUMNER}
+    for rad in kpi:
+        _lägg_till(kolumner, 1, tabell=KPI_TABELL, **rad)
+
+    for titel, df, dimension, max_rader in tabeller:
+        # Tabellerna är små - en gemensam array är billigare än att hämta kolumnerna en och en
+        tabell = df.to_numpy(dtype=object)[:max_rader]
+        index = {namn: i for i, namn in enumerate(df.columns)}
+        värden = tabell[:, index[dimension]].astype(str).astype(object)
+        for mått, i in index.items():
+            if mått == dimension or mått.endswith(tuple(JÄMFÖRELSESUFFIX.values())):
+                continue
+            jämförelser = {
+                namn: tabell[:, index[mått + suffix]].astype(float)
+                for namn, suffix in JÄMFÖRELSESUFFIX.items() if mått + suffix in index
+            }
+            _lägg_till(kolumner, len(tabell), tabell=titel, dimension=dimension, värde=värden, mått=mått,
+                       aktuell=tabell[:, i].astype(float), **jämförelser)
+
+    rader = {namn: np.concatenate(delar) for namn, delar in kolumner.items()}
+    antal = len(rader['mått'])
+    rader.update(vy=np.full(antal, vy, dtype=object), kanal=np.full(antal, kanal, dtype=object),
+                 år=np.full(antal, år, dtype=np.int16), månad=np.full(antal, månad, dtype=np.int8))
+    return rader
+
+
+def _lägg_till(kolumner, antal, **värden):
+    """Lägg antal rader till kolumnerna - skalärer upprepas och saknade kolumner blir tomma."""
+    for namn, delar in kolumner.items():
+        värde = värden.get(namn)
+        if isinstance(värde, np.ndarray):
+            delar.append(värde)
+        elif namn in TALKOLUMNER:
+            delar.append(np.full(antal, np.nan if värde is None else värde, dtype=float))
+        else:
+            delar.append(np.full(antal, värde, dtype=object))
+
+
+def skriv(rader):
+    """Lägg en vys rader (från vyrader) till exporten - de skrivs i radgrupper om RADGRUPP rader."""
+    if _export is None:
+        return
+    schema = _export['schema']
+    # from_pandas: NaN blir tomma värden, som i en dataframe
+    batch = pa.record_batch([pa.array(rader[fält.name], type=fält.type, from_pandas=True) for fält in schema],
+                            schema=schema)
+    _export['batcher'].append(batch)
+    _export['buffrade'] += batch.num_rows
+    _export['rader'] += batch.num_rows
+    if _export['buffrade'] >= RADGRUPP:
+        _töm()
+
+
+def _töm():
+    if _export['batcher']:
+        _export['skrivare'].write_table(pa.Table.from_batches(_export['batcher'], schema=_export['schema']))
+        _export['batcher'], _export['buffrade'] = [], 0
+
+
+def avsluta():
+    """Skriv de sista raderna och byt in exportfilen."""
+    global _export
+    if _export is None:
+        return
+    _töm()
+    _export['skrivare'].close()
+    os.replace(_export['temp'], _export['fil'])
+    print(f"📦 Aggregat exporterade: {_export['fil']} ({_export['rader']} rader)")
+    _export = None
+
+
+def lägg_till_argument(parser):
+    """Lägg till --export i ett skripts argumentparser."""
+    parser.add_argument('--export', type=_exportfil, metavar='FIL',
+                        help="skriv vyernas KPI:er och dimensionstabeller till FIL för BI-verktyg - "
+                             "Parquet (.parquet) eller Arrow IPC (.arrow), kräver pyarrow")
+
+
+def _exportfil(värde):
+    if Path(värde).suffix.lower() not in FORMAT:
+        raise argparse.ArgumentTypeError(f"okänt exportformat '{värde}' - använd {', '.join(FORMAT)}")
+    return värde
@@ -0,0 +1,439 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark för dashboards och analysrapport med syntetisk data
+
+Genererar CSV-filer med samma scheman som de riktiga exporterna och tar tid på
+varje steg (load, clean, filter, aggregate, render, write) för de tre skripten,
+samt dashboardsens aggregatexport (export) när pyarrow finns och dashboardserverns
+långsammaste rendering av en ocachad vy (server). Resultatet sparas som JSON per
+commit så att regressioner syns mellan commits.
+
+    python benchmark.py --rader 10000 1000000 --kardinalitet KampanjKod=100 SNI=800
+    python benchmark.py --rader 100000 --jämför benchmarks/abc1234.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import aggregatexport
+from inlasning import (
+    förbered_försäljning, förbered_nya_kunder, förbered_kundstock, förbered_kundmål,
+    slå_ihop_kategorier, slå_samman_ramar, indexera_perioder, filtrera_period, SNAPSHOT_KATALOG,
+)
+from mallar import sidmarkör, skriv_sida
+from rapportmotor import bygg_kub
+
+
+PROJEKTKATALOG = Path(__file__).parent
+RESULTATKATALOG = PROJEKTKATALOG / "benchmarks"
+
+# Filnamnen skripten letar efter bredvid sig själva
+FÖRSÄLJNING_FIL = "8520e6e8-926a-4264-b6ad-e545036fe730 - Sheet1.csv"
+NYA_KUNDER_FIL = "3726d67f-37f5-4502-8e8d-c191ed5167cc - Sheet1.csv"
+KUNDSTOCK_FILER = {2024: "2024-kundstock - Sheet1.csv", 2025: "2025 kundstock - Sheet1.csv"}
+KUNDMÅL_FIL = "kundmål - Sheet1.csv"
+
+SKRIPT = ['generera_dashboard.py', 'generera_kundflode_dashboard.py', 'oktober_analys.py']
+
+# Antal distinkta värden per dimension i den syntetiska datan
+STANDARD_KARDINALITET = {
+    'KampanjKod': 30,
+    'SNI': 300,
+    'SäljKanal': 4,
+    'Anskaffad via - Detalj': 10,
+    'Omsättningsintervall': 7,
+}
+
+PERIODER = [2024 * 100 + m for m in range(1, 13)] + [2025 * 100 + m for m in range(1, 11)]
+# Skrivsteget skriver bara sektionerna, utan sidans CSS och skript
+SIDMALL = sidmarkör('kpi') + sidmarkör('tabeller')
+
+MÅNADER = ['Jan', 'Feb', 'Mars', 'Apr', 'Maj', 'Juni', 'Juli', 'Aug', 'Sep', 'Okt', 'Nov', 'Dec']
+
+
+# ==================== SYNTETISK DATA ====================
+
+def svenskt_heltal(värden):
+    """Formatera heltal (< 1 000 000) med hårt mellanslag som tusentalsavgränsare, som i exporterna."""
+    värden = pd.Series(värden)
+    tusental, rest = värden // 1000, värden % 1000
+    med_avgränsare = tusental.astype(str) + '\xa0' + rest.astype(str).str.zfill(3)
+    return med_avgränsare.where(värden >= 1000, värden.astype(str))
+
+
+def värdelista(fasta, prefix, antal):
+    """Fasta värden som koden särbehandlar, utfyllda med syntetiska värden upp till given kardinalitet."""
+    return fasta + [f"{prefix}{i}" for i in range(antal - len(fasta))]
+
+
+def dimensionsvärden(kardinalitet):
+    """Värdelistor per kolumn för given kardinalitet."""
+    return {
+        'KampanjKod': värdelista(['Kod saknas', 'GRATTISNYSTARTAD', 'NYSTARTAD'], 'KAMP', kardinalitet['KampanjKod']),
+        'SäljKanal': värdelista(['Fortnox.Se', 'Fortnox', 'Partner', 'Byrå'], 'Kanal ', kardinalitet['SäljKanal']),
+        'SNI': värdelista(['-'], '', kardinalitet['SNI']),
+        'SNI_kund': värdelista(['Okänt'], '', kardinalitet['SNI']),
+        'Anskaffad via - Detalj': värdelista(
+            ['-', 'Fortnox.se webb', 'Fortnox se kampanj', 'Fortnox säljare', 'Winback kampanj',
+             'Byrå', 'Cling', 'Boardeaser', 'Okänd'], 'Partner ', kardinalitet['Anskaffad via - Detalj']),
+        'Omsättningsintervall': värdelista(
+            ['Okänd', '< 1 tkr', '1 - 49 tkr', '50 - 249 tkr', '250 - 999 tkr', '1000 - 2499 tkr', '> 100000 tkr'],
+            'Intervall ', kardinalitet['Omsättningsintervall']),
+    }
+
+
+def generera_försäljning(rng, n, värden):
+    """Ett block av försäljningsexporten."""
+    return pd.DataFrame({
+        'ÅrMånad': rng.choice(PERIODER, n),
+        'KampanjKod': rng.choice(värden['KampanjKod'], n),
+        'SäljKanal': rng.choice(värden['SäljKanal'], n),
+        'Antal anställda': rng.choice(['0', '1-4', '5-9', '10-19', '20-49', '50+'], n),
+        'Avtalsperiod': rng.choice(['1 mån', '12 mån', '24 mån'], n),
+        'Bolagsform': rng.choice(['AB', 'EF', 'HB', 'KB', 'Förening'], n),
+        'Kundtyp': rng.choice(['FÖRETAG', 'BYRÅ'], n),
+        'SNI': rng.choice(värden['SNI'], n),
+        'Antal försäljningsordrar': svenskt_heltal(rng.integers(0, 2000, n)),
+        'Försäljning': svenskt_heltal(rng.integers(0, 200000, n)),
+        'Rabattvärde': svenskt_heltal(rng.integers(0, 20000, n)),
+    })
+
+
+def _kunddimensioner(rng, n, värden):
+    return {
+        'KundTyp': rng.choice(['BYRÅKUND', 'DIREKTKUND', 'DIREKTKUND_BYRÅAVTAL'], n),
+        'Antal anställda': rng.choice(['Okänd', '0', '1-4', '5-9', '10-49'], n),
+        'SNI': rng.choice(värden['SNI_kund'], n),
+        'Bolagform': rng.choice(['AB', 'EF', 'HB', 'Okänd'], n),
+        'Omsättningsintervall': rng.choice(värden['Omsättningsintervall'], n),
+    }
+
+
+def generera_nya_kunder(rng, n, värden):
+    """Ett block av exporten för nya kunder."""
+    df = pd.DataFrame({
+        'ÅrMånad': rng.choice(PERIODER, n),
+        'Anskaffad via - Detalj': rng.choice(värden['Anskaffad via - Detalj'], n),
+        **_kunddimensioner(rng, n, värden),
+    })
+    df['Nya kunder'] = rng.integers(0, 20, n)
+    return df
+
+
+def generera_kundstock(rng, n, värden, år):
+    """Ett block av kundstocksexporten för ett år."""
+    df = pd.DataFrame({
+        'ÅrMånad': rng.choice([p for p in PERIODER if p // 100 == år], n),
+        **_kunddimensioner(rng, n, värden),
+    })
+    df['Antal kunder'] = svenskt_heltal(rng.integers(0, 5000, n))
+    return df
+
+
+def skriv_syntetisk_data(katalog, rader, kardinalitet=None, frö=1, blockstorlek=1_000_000):
+    """
+    Skriv alla fem CSV-filerna med given storlek till katalog.
+
+    Datan genereras och skrivs i block så att även 50M rader ryms i minnet.
+    """
+    katalog = Path(katalog)
+    katalog.mkdir(parents=True, exist_ok=True)
+    värden = dimensionsvärden({**STANDARD_KARDINALITET, **(kardinalitet or {})})
+    rng = np.random.default_rng(frö)
+
+    generatorer = [
+        (FÖRSÄLJNING_FIL, lambda n: generera_försäljning(rng, n, värden)),
+        (NYA_KUNDER_FIL, lambda n: generera_nya_kunder(rng, n, värden)),
+    ] + [
+        (fil, lambda n, år=år: generera_kundstock(rng, n, värden, år)) for år, fil in KUNDSTOCK_FILER.items()
+    ]
+    for fil, generera in generatorer:
+        with open(katalog / fil, 'w', encoding='utf-8', newline='') as f:
+            for start in range(0, rader, blockstorlek):
+                generera(min(blockstorlek, rader - start)).to_csv(f, index=False, header=start == 0)
+
+    # Kundmålen är alltid en rad per månad
+    mål = pd.DataFrame({'Månad': MÅNADER})
+    for kanal in ['Byrå', 'Winback', 'säljare', 'fortnox.se', 'Cling/Boardeaser/Okänt', 'Totalt']:
+        mål[kanal] = svenskt_heltal(rng.integers(100, 5000, len(MÅNADER)))
+    mål.to_csv(katalog / KUNDMÅL_FIL, index=False)
+
+
+# ==================== TIDTAGNING ====================
+
+@contextlib.contextmanager
+def tidtagning(tider, steg):
+    """Lägg till tiden för blocket (sekunder) till steget i tider."""
+    start = time.perf_counter()
+    yield
+    tider[steg] = tider.get(steg, 0.0) + time.perf_counter() - start
+
+
+def mät_försäljningsdashboard(katalog):
+    """Stegvis tidtagning av generera_dashboard.py (kuben ersätter filtrering per vy)."""
+    import generera_dashboard as gd
+    tider = {}
+    with tidtagning(tider, 'load'):
+        rå = pd.read_csv(katalog / FÖRSÄLJNING_FIL)
+    with tidtagning(tider, 'clean'):
+        df = förbered_försäljning(rå)
+        df['KampanjKod'] = slå_ihop_kategorier(df['KampanjKod'], {'GRATTISNYSTARTAD': 'NYSTARTAD'})
+        df = indexera_perioder(df)
+
+    månader = [(m, f"Månad {m}") for m in range(1, 11)]
+    kanaler = [(None, "alla", "Alla kanaler"), ("Fortnox.Se", "fortnox-se", "Fortnox.Se"),
+               ("Fortnox", "fortnox", "Fortnox (Säljare)")]
+    with tidtagning(tider, 'aggregate'):
+        matriser = gd.vymatriser(bygg_kub(df, gd.DIMENSIONER, gd.MÅTT))
+        vyer = {(m, kanal, kanal_id): gd.beräkna_vy(matriser, m, 2025, kanal)
+                for m, _ in månader for kanal, kanal_id, _ in kanaler}
+    with tidtagning(tider, 'render'):
+        innehåll = []
+        for (m, _, kanal_id), vy in vyer.items():
+            kpi, tabeller = gd.rendera_vy(vy)
+            innehåll.append({'kpi': kpi, 'tabeller': tabeller, 'år': 2025, 'månad_nr': m, 'månad_namn': f"Månad {m}",
+                             'kanal_id': kanal_id, 'kanal_namn': kanal_id})
+        sektioner = list(gd.bygg_html_sektioner(innehåll, (2025, 10)))
+    with tidtagning(tider, 'write'):
+        skriv_sida(katalog / 'benchmark_oktober_dashboard.html', SIDMALL, ['kpi', 'tabeller'], sektioner)
+    if aggregatexport.pa is not None:
+        with tidtagning(tider, 'export'), contextlib.redirect_stdout(io.StringIO()):
+            aggregatexport.starta(katalog / 'benchmark_oktober_dashboard.parquet')
+            for (_, kanal, _), vy in vyer.items():
+                aggregatexport.skriv(gd.exportrader(vy, kanal))
+            aggregatexport.avsluta()
+
+    # Dashboardserverns renderingstid för en vy som inte finns i sidcachen - den långsammaste vyn
+    import dashboardserver
+    delad = {'matriser': matriser, 'perioder': PERIODER, 'källa': None, 'kodversion': None}
+    for m, _ in månader:
+        for _, kanal_id, _ in kanaler:
+            serversteg = {}
+            with tidtagning(serversteg, 'server'):
+                dashboardserver.rendera_försäljning(delad, {'month': m, 'channel': kanal_id, 'year': 2025})
+            tider['server'] = max(tider.get('server', 0.0), serversteg['server'])
+    if tider['server'] * 1000 > dashboardserver.RENDERINGSBUDGET_MS:
+        print(f"   ⚠️  långsammaste servervyn tog {tider['server'] * 1000:.1f} ms "
+              f"(budget {dashboardserver.RENDERINGSBUDGET_MS} ms)")
+    return tider
+
+
+def mät_kundflödesdashboard(katalog):
+    """Stegvis tidtagning av generera_kundflode_dashboard.py (periodmatriserna ersätter filtrering per vy)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        import generera_kundflode_dashboard as gk
+    tider = {}
+    with tidtagning(tider, 'load'):
+        rå_nya = pd.read_csv(katalog / NYA_KUNDER_FIL)
+        rå_stock = {år: pd.read_csv(katalog / fil) for år, fil in KUNDSTOCK_FILER.items()}
+        rå_mål = pd.read_csv(katalog / KUNDMÅL_FIL)
+    with tidtagning(tider, 'clean'):
+        df_nya = indexera_perioder(förbered_nya_kunder(rå_nya))
+        stock = []
+        for år, rå in rå_stock.items():
+            df = förbered_kundstock(rå)
+            df['År'] = np.int16(år)
+            stock.append(df)
+        df_stock = indexera_perioder(slå_samman_ramar(stock))
+        df_mål = förbered_kundmål(rå_mål)
+
+    månader = [(m, f"Månad {m}") for m in range(1, 11)]
+    kanaler = [(k, k) for k in ['alla', 'fortnox.se', 'fortnox', 'winback', 'byrå', 'övrigt']]
+    with tidtagning(tider, 'aggregate'):
+        kuber = gk.bygg_kundkuber(df_nya, df_stock)
+        mål = gk.kundmål_per_period(df_mål)
+        vyer = {}
+        for m, namn in månader:
+            for kanal, kanal_namn in kanaler:
+                vyer[f"nya_{m}_{kanal}"] = (gk.beräkna_innehåll_nya_kunder(kuber['nya'], mål, m, 2025, kanal), namn, kanal_namn)
+            vyer[f"netto_{m}"] = (gk.beräkna_innehåll_netto(kuber, m, 2025), namn, None)
+    with tidtagning(tider, 'render'):
+        innehåll_map = []
+        for vy, namn, kanal_namn in vyer.values():
+            kpi, tabeller = gk.rendera_vy(vy)
+            innehåll_map.append({'typ': 'nya' if vy['typ'] == 'nya' else 'netto', 'kpi': kpi, 'tabeller': tabeller,
+                                 'år': vy['år'], 'månad_nr': vy['månad'], 'månad': namn,
+                                 'kanal_id': kanal_namn, 'kanal': kanal_namn})
+        sektioner = list(gk.bygg_html_sektioner(innehåll_map, (2025, 10)))
+    with tidtagning(tider, 'write'):
+        skriv_sida(katalog / 'benchmark_kundflode_dashboard.html', SIDMALL, ['kpi', 'tabeller'], sektioner)
+    if aggregatexport.pa is not None:
+        with tidtagning(tider, 'export'), contextlib.redirect_stdout(io.StringIO()):
+            aggregatexport.starta(katalog / 'benchmark_kundflode_dashboard.parquet')
+            for nyckel, (vy, namn, kanal_namn) in vyer.items():
+                aggregatexport.skriv(gk.exportrader(vy, nyckel.split('_')[0], kanal_namn))
+            aggregatexport.avsluta()
+    return tider
+
+
+def mät_oktoberanalys(katalog):
+    """Stegvis tidtagning av oktober_analys.py."""
+    import oktober_analys as oa
+    tider = {}
+    with tidtagning(tider, 'load'):
+        rå = pd.read_csv(katalog / FÖRSÄLJNING_FIL)
+    with tidtagning(tider, 'clean'):
+        df = förbered_försäljning(rå)
+        df['KampanjKod'] = slå_ihop_kategorier(df['KampanjKod'], {'GRATTISNYSTARTAD': 'NYSTARTAD'})
+        df = indexera_perioder(df)
+    with tidtagning(tider, 'filter'):
+        okt_2025 = filtrera_period(df, 2025, 10)
+        okt_2024 = filtrera_period(df, 2024, 10)
+        sep_2025 = filtrera_period(df, 2025, 9)
+    with tidtagning(tider, 'aggregate'):
+        # Utan startad aggregatcache räknas kuben alltid om
+        kub = oa.bygg_kub(df, källa=None)
+        kpi_okt_2025 = oa.beräkna_huvud_kpi(kub, oa.OKTOBER_2025)
+        jämförelser = [oa.jämför_perioder(kpi_okt_2025, oa.beräkna_huvud_kpi(kub, jmf))
+                       for jmf in [oa.OKTOBER_2024, oa.SEPTEMBER_2025]]
+        dimensioner = [(oa.analysera_dimension(kub, oa.OKTOBER_2025, jmf, dimension, top_n=top_n), dimension)
+                       for dimension, top_n in [('KampanjKod', 10), ('SäljKanal', 20), ('Antal anställda', 20),
+                                                ('Avtalsperiod', 20), ('Bolagsform', 20), ('Kundtyp', 20), ('SNI', 15)]
+                       for jmf in [oa.OKTOBER_2024, oa.SEPTEMBER_2025]]
+    with tidtagning(tider, 'render'):
+        rapport = io.StringIO()
+        with contextlib.redirect_stdout(rapport):
+            for jämförelse in jämförelser:
+                oa.skriv_rapport_huvud_kpi("", jämförelse)
+            for analys, dimension in dimensioner:
+                oa.skriv_rapport_dimension(dimension, analys, dimension)
+    with tidtagning(tider, 'write'):
+        (katalog / 'benchmark_oktober_analys.txt').write_text(rapport.getvalue(), encoding='utf-8')
+    return tider
+
+
+STEGVIS_MÄTNING = {
+    'generera_dashboard.py': mät_försäljningsdashboard,
+    'generera_kundflode_dashboard.py': mät_kundflödesdashboard,
+    'oktober_analys.py': mät_oktoberanalys,
+}
+
+
+def mät_hela_körningen(katalog, skript):
+    """
+    Kör skriptet som vanligt, först utan och sedan med snapshots och aggregatcache.
+    Returnerar (kall, varm) i sekunder.
+    """
+    shutil.copy(PROJEKTKATALOG / skript, katalog / skript)
+    shutil.rmtree(katalog / SNAPSHOT_KATALOG, ignore_errors=True)
+    tider = []
+    for _ in range(2):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, skript], cwd=katalog, check=True,
+                       stdout=subprocess.DEVNULL, env={**os.environ, 'PYTHONPATH': str(PROJEKTKATALOG)})
+        tider.append(time.perf_counter() - start)
+    return tider
+
+
+def kör_benchmark(rader_lista, kardinalitet, upprepningar=1, frö=1):
+    """Generera data för varje storlek och mät alla skript. Returnerar resultatet som dict."""
+    körningar = []
+    for rader in rader_lista:
+        with tempfile.TemporaryDirectory(prefix='benchmark_') as temp:
+            katalog = Path(temp)
+            print(f"\n📦 Genererar syntetisk data: {rader:,} rader per fil")
+            start = time.perf_counter()
+            skriv_syntetisk_data(katalog, rader, kardinalitet, frö)
+            print(f"   klart på {time.perf_counter() - start:.1f} s")
+
+            resultat = {}
+            for skript in SKRIPT:
+                # Bästa tiden per steg över upprepningarna
+                bästa = {}
+                for _ in range(upprepningar):
+                    for steg, sekunder in STEGVIS_MÄTNING[skript](katalog).items():
+                        bästa[steg] = min(bästa.get(steg, sekunder), sekunder)
+                kall, varm = mät_hela_körningen(katalog, skript)
+                resultat[skript] = {'steg': bästa, 'total_kall': kall, 'total_varm': varm}
+                print(f"   {skript:<34} " + "  ".join(f"{steg} {s:.3f}" for steg, s in bästa.items())
+                      + f"  | total {kall:.2f} s (kall) / {varm:.2f} s (varm)")
+            körningar.append({'rader': rader, 'resultat': resultat})
+
+    return {
+        'commit': git_commit(),
+        'tidpunkt': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'kardinalitet': {**STANDARD_KARDINALITET, **(kardinalitet or {})},
+        'upprepningar': upprepningar,
+        'körningar': körningar,
+    }
+
+
+def git_commit():
+    """Kort hash för aktuell commit, eller None utanför ett git-repo."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJEKTKATALOG,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def jämför_resultat(tidigare, nuvarande):
+    """Skriv ut kvoten nuvarande/tidigare per storlek, skript och steg (> 1 betyder långsammare)."""
+    print(f"\n📊 Jämförelse mot {tidigare.get('commit')} ({tidigare.get('tidpunkt')})")
+    tidigare_körningar = {k['rader']: k['resultat'] for k in tidigare['körningar']}
+    for körning in nuvarande['körningar']:
+        före = tidigare_körningar.get(körning['rader'])
+        if före is None:
+            continue
+        print(f"\n{körning['rader']:,} rader")
+        for skript, res in körning['resultat'].items():
+            if skript not in före:
+                continue
+            tider = {**res['steg'], 'total_kall': res['total_kall'], 'total_varm': res['total_varm']}
+            tider_före = {**före[skript]['steg'], 'total_kall': före[skript]['total_kall'],
+                          'total_varm': före[skript]['total_varm']}
+            kvoter = [f"{steg} {tider[steg] / tider_före[steg]:.2f}x" for steg in tider
+                      if tider_före.get(steg)]
+            print(f"   {skript:<34} " + "  ".join(kvoter))
+
+
+def tolka_kardinalitet(argument):
+    """Tolka ['KampanjKod=100', 'SNI=800'] till en dict."""
+    kardinalitet = {}
+    for arg in argument or []:
+        kolumn, _, antal = arg.partition('=')
+        if kolumn not in STANDARD_KARDINALITET or not antal.isdigit():
+            raise SystemExit(f"Ogiltig kardinalitet '{arg}' - använd KOLUMN=ANTAL med KOLUMN i "
+                             f"{', '.join(STANDARD_KARDINALITET)}")
+        kardinalitet[kolumn] = int(antal)
+    return kardinalitet
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarka dashboards och analysrapport med syntetisk data")
+    parser.add_argument('--rader', type=int, nargs='+', default=[10_000, 100_000],
+                        help="antal rader per CSV-fil, t.ex. 10000 1000000 50000000")
+    parser.add_argument('--kardinalitet', nargs='*', metavar='KOLUMN=ANTAL',
+                        help=f"antal distinkta värden per kolumn ({', '.join(STANDARD_KARDINALITET)})")
+    parser.add_argument('--upprepningar', type=int, default=1, help="mät varje steg N gånger och spara bästa tiden")
+    parser.add_argument('--frö', type=int, default=1, help="slumpfrö för den syntetiska datan")
+    parser.add_argument('--utdata', type=Path, help="JSON-fil för resultatet (standard benchmarks/<commit>.json)")
+    parser.add_argument('--jämför', type=Path, help="tidigare resultatfil att jämföra med")
+    args = parser.parse_args()
+
+    resultat = kör_benchmark(args.rader, tolka_kardinalitet(args.kardinalitet), args.upprepningar, args.frö)
+
+    utdata = args.utdata or RESULTATKATALOG / f"{resultat['commit'] or 'okänd'}.json"
+    utdata.parent.mkdir(parents=True, exist_ok=True)
+    utdata.write_text(json.dumps(resultat, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f"\n✅ Resultat sparat: {utdata}")
+
+    if args.jämför:
+        jämför_resultat(json.loads(args.jämför.read_text(encoding='utf-8')), resultat)
@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Dashboardserver - lokal HTTP-server som renderar dashboardvyerna vid förfrågan
+
+Exporterna läses in och aggregeras en gång när servern startar och hålls sedan
+i minnet. Varje vy beräknas och renderas först när den efterfrågas, för valfri
+månad och valfritt år - utan att dashboardsen behöver genereras om:
+
+    /sales?month=10&channel=fortnox-se&year=2025
+    /kundflode?view=nya&month=10&channel=byrå
+
+De renderade sidorna sparas per vy i minnet (LRU) tillsammans med en ETag, så
+att en upprepad förfrågan besvaras direkt, eller med 304 om webbläsaren redan
+har sidan. De beräknade vyerna hamnar dessutom i aggregatcachen och delas med
+generera_dashboard.py och generera_kundflode_dashboard.py.
+"""
+
+import argparse
+import gc
+import hashlib
+import json
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import aggregatcache
+from aggregatcache import AGGREGAT_KATALOG
+import generera_dashboard as försäljning
+import generera_kundflode_dashboard as kundflöde
+from inkrementell import kodversion
+from inlasning import SNAPSHOT_KATALOG, ladda_försäljning
+from mallar import sidmarkör, MÅNADSNAMN
+from rapportmotor import bygg_kub_cachad, perioder_i_data, välj_perioder
+
+
+PORT = 8050
+
+# Antal renderade sidor som hålls i minnet
+MAX_SIDOR = 512
+
+# Längsta processortid (ms) en vy som inte finns i sidcachen bör ta att rendera
+RENDERINGSBUDGET_MS = 50
+
+# Vyn som visas när parametrar saknas - perioden är den sista i datan
+STANDARD = {'channel': 'alla', 'view': 'nya'}
+
+# Ersätter sidans showContent: servern har redan renderat vald vy, så ett byte
+# av månad, kanal eller vy hämtar en ny sida i stället för att visa dolda sektioner
+SERVER_VISNING_JS = """<script>
+        const SERVERVY = {vy};
+        currentMonth = SERVERVY.month;
+        currentYear = SERVERVY.year;
+        currentChannel = SERVERVY.channel;
+        if (SERVERVY.view) {{ currentView = SERVERVY.view; }}
+
+        function showContent() {{
+            const vy = {{month: currentMonth, channel: currentChannel, year: currentYear}};
+            if (SERVERVY.view) {{ vy.view = currentView; }}
+            if (['month', 'channel', 'year', 'view'].some(nyckel => vy[nyckel] !== SERVERVY[nyckel])) {{
+                location.href = location.pathname + '?' + new URLSearchParams(vy);
+                return;
+            }}
+            document.querySelectorAll('.section[data-month]').forEach(section => {{
+                section.style.display = 'block';
+            }});
+        }}
+
+        // Markera vald period, kanal och vy bland knapparna
+        [['switchMonth', ['month', 'year']], ['switchChannel', ['channel']], ['switchView', ['view']]].forEach(([funktion, nycklar]) => {{
+            document.querySelectorAll(`[data-${{nycklar[0]}}][onclick*="${{funktion}}"]`).forEach(knapp => {{
+                knapp.classList.toggle('active', nycklar.every(nyckel => knapp.dataset[nyckel] === String(SERVERVY[nyckel])));
+            }});
+        }});
+        const kanalfilter = document.getElementById('channel-filter');
+        if (SERVERVY.view && kanalfilter) {{
+            kanalfilter.style.display = SERVERVY.view === 'nya' ? 'block' : 'none';
+        }}
+        updatePeriodText();
+        showContent();
+    </script>"""
+
+
+def ladda_data(radblock=None):
+    """Läs in exporterna och bygg de delade aggregaten för båda dashboardsen."""
+    läge = '.aggregerat' if radblock else ''
+
+    print("Läser försäljningsdata...")
+    df = ladda_försäljning(försäljning.CSV_FIL, radblock)
+    källa = aggregatcache.källa(försäljning.CSV_FIL, läge=läge)
+    delad_försäljning = {
+        'matriser': försäljning.vymatriser(bygg_kub_cachad(df, källa, försäljning.DIMENSIONER, försäljning.MÅTT)),
+        'perioder': perioder_i_data(df),
+        'klientrendering': False, 'källa': källa,
+        'kodversion': kodversion([Path(försäljning.__file__)]),
+    }
+
+    print("Läser kundflödesdata...")
+    df_nya = kundflöde.ladda_nya_kunder_data(kundflöde.NYA_KUNDER_FIL, radblock)
+    df_stock = kundflöde.ladda_kundstock_data(kundflöde.KUNDSTOCK_FILER, radblock)
+    delad_kundflöde = {
+        'kuber': kundflöde.bygg_kundkuber(df_nya, df_stock),
+        'perioder': perioder_i_data(df_nya, df_stock),
+        'mål': kundflöde.kundmål_per_period(kundflöde.ladda_kundmål_data(kundflöde.KUNDMÅL_FIL)),
+        'klientrendering': False,
+        'källor': {
+            'nya': aggregatcache.källa(kundflöde.NYA_KUNDER_FIL, läge=läge),
+            'stock': aggregatcache.källa(*kundflöde.KUNDSTOCK_FILER.values(), läge=läge),
+            'mål': aggregatcache.källa(kundflöde.KUNDMÅL_FIL),
+        },
+        'kodversion': kodversion([Path(kundflöde.__file__)]),
+    }
+
+    return {'sales': delad_försäljning, 'kundflode': delad_kundflöde}
+
+
+def fyll_sida(sida, kpi, tabeller):
+    """Sidmallen med en vys KPI- och tabellsektion insatta vid markörerna."""
+    return sida.replace(sidmarkör('kpi'), kpi).replace(sidmarkör('tabeller'), tabeller)
+
+
+def server_skript(vy):
+    """Skriptet som visar vyn och låter sidans knappar hämta andra vyer från servern."""
+    return SERVER_VISNING_JS.format(vy=json.dumps(vy, ensure_ascii=False))
+
+
+def rendera_försäljning(delad, vy):
+    """Försäljningsdashboarden för en månad och säljkanal."""
+    säljkanal, kanal_id, kanal_namn = next(kanal for kanal in försäljning.KANALER if kanal[1] == vy['channel'])
+    beräknad = försäljning.beräkna_vy_cachad(delad, vy['year'], vy['month'], säljkanal)
+    kpi, tabeller = försäljning.rendera_vy(beräknad)
+    aktiv = (vy['year'], vy['month'])
+    sektioner = försäljning.bygg_html_sektioner([{
+        'kpi': kpi, 'tabeller': tabeller, 'år': vy['year'],
+        'månad_nr': vy['month'], 'månad_namn': MÅNADSNAMN[vy['month']],
+        'kanal_id': kanal_id, 'kanal_namn': kanal_namn,
+    }], aktiv)
+    return fyll_sida(försäljning.sidmall(delad['perioder'], aktiv, server_skript(vy)), *next(sektioner))
+
+
+def rendera_kundflöde(delad, vy):
+    """Kundflödesdashboarden för en månad och vy (nya kunder per kanal, eller nettoförändring)."""
+    månad_namn = MÅNADSNAMN[vy['month']]
+    if vy['view'] == 'nya':
+        beräknad = kundflöde.beräkna_vy_cachad(delad, 'nya', vy['year'], vy['month'], vy['channel'])
+        data = {'typ': 'nya', 'kanal_id': vy['channel'], 'kanal': dict(kundflöde.KANALER)[vy['channel']]}
+    else:
+        beräknad = kundflöde.beräkna_vy_cachad(delad, 'netto', vy['year'], vy['month'], None)
+        data = {'typ': 'netto'}
+    data['kpi'], data['tabeller'] = kundflöde.rendera_vy(beräknad)
+    data.update({'år': vy['year'], 'månad_nr': vy['month'], 'månad': månad_namn})
+    aktiv = (vy['year'], vy['month'])
+    sektioner = kundflöde.bygg_html_sektioner([data], aktiv)
+    return fyll_sida(kundflöde.sidmall(delad['perioder'], aktiv, server_skript(vy)), *next(sektioner))
+
+
+# Sökväg: (renderare, giltiga kanaler, giltiga vyer)
+SIDOR = {
+    'sales': (rendera_försäljning, [kanal_id for _, kanal_id, _ in försäljning.KANALER], None),
+    'kundflode': (rendera_kundflöde, [kanal_id for kanal_id, _ in kundflöde.KANALER], ['nya', 'netto']),
+}
+
+
+def tolka_vy(sida, fråga, sista_period):
+    """Vyn som efterfrågas i frågesträngen, med standardvärden (och sista_period, ÅÅÅÅMM) för det som saknas."""
+    _, kanaler, vyer = SIDOR[sida]
+    parametrar = {nyckel: värden[-1] for nyckel, värden in parse_qs(fråga).items()}
+    try:
+        vy = {'month': int(parametrar.get('month', sista_period % 100)),
+              'channel': parametrar.get('channel', STANDARD['channel']),
+              'year': int(parametrar.get('year', sista_period // 100))}
+    except ValueError:
+        raise ValueError("month och year måste vara heltal") from None
+    if not 1 <= vy['month'] <= 12:
+        raise ValueError(f"Ogiltig månad: {vy['month']}")
+    if vy['channel'] not in kanaler:
+        raise ValueError(f"Okänd kanal: {vy['channel']} (giltiga: {', '.join(kanaler)})")
+    if vyer:
+        vy['view'] = parametrar.get('view', STANDARD['view'])
+        if vy['view'] not in vyer:
+            raise ValueError(f"Okänd vy: {vy['view']} (giltiga: {', '.join(vyer)})")
+        if vy['view'] == 'netto':
+            # Nettovyn har ingen kanal - alla kanaler ger samma sida och samma nyckel i sidcachen
+            vy['channel'] = STANDARD['channel']
+    return vy
+
+
+def skapa_sidcache(data, max_sidor=MAX_SIDOR):
+    """Tom sidcache för renderade sidor per vy, med de inlästa aggregaten."""
+    # Låset skyddar bara sidorna och pågående renderingar - själva renderingen sker utanför
+    return {'data': data, 'max_sidor': max_sidor, 'sidor': OrderedDict(), 'pågående': {},
+            'lås': threading.Lock()}
+
+
+def hämta_sida(sidcache, sida, vy):
+    """
+    (etag, innehåll) för vyn, renderad vid behov. De minst nyligen använda sidorna tas bort först.
+
+    Olika vyer renderas parallellt, så att en cachad sida aldrig väntar på en
+    rendering. Efterfrågas en vy som redan renderas väntar förfrågan på den.
+    """
+    nyckel = (sida, tuple(sorted(vy.items())))
+    sidor, pågående = sidcache['sidor'], sidcache['pågående']
+    with sidcache['lås']:
+        if nyckel in sidor:
+            sidor.move_to_end(nyckel)
+            return sidor[nyckel]
+        klar = pågående.get(nyckel)
+        if klar is None:
+            klar = pågående[nyckel] = threading.Event()
+            renderar = True
+        else:
+            renderar = False
+    if not renderar:
+        # Sidan finns i cachen när renderingen är klar - annars (fel eller bortrensad) renderas den här
+        klar.wait()
+        return hämta_sida(sidcache, sida, vy)
+
+    try:
+        # Trådens processortid - samtidiga renderingar delar GIL:en, och väntan på den
+        # syns redan i förfrågans svarstid
+        start = time.thread_time()
+        innehåll = SIDOR[sida][0](sidcache['data'][sida], vy).encode('utf-8')
+        ms = (time.thread_time() - start) * 1000
+        if ms > RENDERINGSBUDGET_MS:
+            print(f"⚠️  /{sida} {vy} renderades på {ms:.1f} ms (budget {RENDERINGSBUDGET_MS} ms)")
+        etag = '"' + hashlib.blake2b(innehåll, digest_size=16).hexdigest() + '"'
+        with sidcache['lås']:
+            sidor[nyckel] = (etag, innehåll)
+            if len(sidor) > sidcache['max_sidor']:
+                sidor.popitem(last=False)
+    finally:
+        with sidcache['lås']:
+            del pågående[nyckel]
+        klar.set()
+    return etag, innehåll
+
+
+def förvärm(sidcache):
+    """Rendera standardvyerna - det senaste årets perioder, som i de genererade dashboardsen."""
+    for år, månad in [divmod(period, 100) for period in välj_perioder(sidcache['data']['sales']['perioder'])]:
+        for _, kanal_id, _ in försäljning.KANALER:
+            hämta_sida(sidcache, 'sales', {'month': månad, 'channel': kanal_id, 'year': år})
+    for år, månad in [divmod(period, 100) for period in välj_perioder(sidcache['data']['kundflode']['perioder'])]:
+        for kanal_id, _ in kundflöde.KANALER:
+            hämta_sida(sidcache, 'kundflode', {'month': månad, 'channel': kanal_id, 'year': år, 'view': 'nya'})
+        hämta_sida(sidcache, 'kundflode', {'month': månad, 'channel': 'alla', 'year': år, 'view': 'netto'})
+    print(f"Förvärmning klar: {len(sidcache['sidor'])} vyer i minnet")
+
+
+def etag_matchar(etag, if_none_match):
+    """Om etag finns i en If-None-Match-rubrik: kommaseparerade taggar, där W/ ignoreras och * matchar allt."""
+    taggar = [tagg.strip() for tagg in if_none_match.split(',')]
+    return any(tagg == '*' or tagg.removeprefix('W/') == etag for tagg in taggar)
+
+
+def skapa_hanterare(sidcache):
+    """Förfrågningshanterare som serverar vyerna ur sidcache."""
+
+    class Hanterare(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.hantera()
+
+        def do_HEAD(self):
+            # Som GET men utan innehåll, se skriv
+            self.hantera()
+
+        def hantera(self):
+            start = time.perf_counter()
+            self.status = None
+            try:
+                self.svara()
+            except Exception as fel:
+                traceback.print_exc()
+                if self.status is None:  # Inget svar har skickats ännu
+                    self.svara_text(HTTPStatus.INTERNAL_SERVER_ERROR, f"Fel vid rendering: {fel}")
+            print(f"{self.command} {self.path} {self.status} ({(time.perf_counter() - start) * 1000:.1f} ms)")
+
+        def skriv(self, innehåll):
+            if self.command != 'HEAD':
+                self.wfile.write(innehåll)
+
+        def svara(self):
+            adress = urlsplit(self.path)
+            sida = adress.path.strip('/')
+            if sida == '':
+                self.send_response(HTTPStatus.FOUND)
+                self.send_header('Location', '/sales')
+                self.end_headers()
+                return
+            if sida not in SIDOR:
+                self.svara_text(HTTPStatus.NOT_FOUND, f"Okänd sida: {adress.path} (finns: /sales, /kundflode)")
+                return
+            try:
+                vy = tolka_vy(sida, adress.query, sidcache['data'][sida]['perioder'][-1])
+            except ValueError as fel:
+                self.svara_text(HTTPStatus.BAD_REQUEST, str(fel))
+                return
+
+            etag, innehåll = hämta_sida(sidcache, sida, vy)
+            if etag_matchar(etag, self.headers.get('If-None-Match', '')):
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header('ETag', etag)
+                self.end_headers()
+            else:
+                self.send_response(HTTPStatus.OK)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(innehåll)))
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                self.skriv(innehåll)
+
+        def svara_text(self, status, text):
+            innehåll = text.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Content-Length', str(len(innehåll)))
+            self.end_headers()
+            self.skriv(innehåll)
+
+        def log_request(self, code='-', size='-'):
+            # Förfrågan loggas med svarstid när den besvarats (se hantera)
+            self.status = int(code)
+
+    return Hanterare
+
+
+def starta_server(port=PORT, radblock=None, förvärm_vyer=False, max_sidor=MAX_SIDOR):
+    """Läs in datan och servera dashboardsen på http://localhost:port tills servern avbryts."""
+    sidcache = skapa_sidcache(ladda_data(radblock), max_sidor)
+    # De inlästa aggregaten lever lika länge som servern - utan frysning går varje
+    # fullständig skräpsamling igenom dem mitt i en rendering
+    gc.freeze()
+    if förvärm_vyer:
+        threading.Thread(target=förvärm, args=(sidcache,), daemon=True).start()
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), skapa_hanterare(sidcache))
+    print(f"\n🌐 Dashboardserver på http://localhost:{port}/sales och http://localhost:{port}/kundflode")
+    print("Avsluta med Ctrl+C")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servera försäljnings- och kundflödesdashboarden lokalt")
+    parser.add_argument('--port', type=int, default=PORT, help=f"port att lyssna på (standard {PORT})")
+    parser.add_argument('--radblock', type=int, metavar='N',
+                        help="läs CSV-filerna strömmande i block om N rader och aggregera direkt "
+                             "(för exporter större än minnet)")
+    parser.add_argument('--förvärm', action='store_true',
+                        help="rendera standardvyerna i bakgrunden direkt vid start")
+    parser.add_argument('--max-sidor', type=int, default=MAX_SIDOR, metavar='N',
+                        help=f"antal renderade sidor som hålls i minnet (standard {MAX_SIDOR})")
+    aggregatcache.lägg_till_argument(parser)
+    args = parser.parse_args()
+
+    if not args.utan_cache:
+        aggregatcache.starta(Path(__file__).parent / SNAPSHOT_KATALOG / AGGREGAT_KATALOG, args.cache_mb)
+    starta_server(port=args.port, radblock=args.radblock, förvärm_vyer=args.förvärm, max_sidor=args.max_sidor)
@@ -4,260 +4,94 @@
 Generera HTML Dashboard för Oktober-försäljning med Fortnox-styling
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from datetime import datetime
 
-
-def ladda_data(filpath):
-    """Ladda och förbered datan från CSV-filen."""
-    df = pd.read_csv(filpath)
-    
-    # Rensa och konvertera numeriska kolumner - ta bort mellanslag och non-breaking spaces
-    numeriska_kolumner = ['Antal försäljningsordrar', 'Försäljning', 'Rabattvärde']
-    for kol in numeriska_kolumner:
-        # Konvertera till string först, sedan ta bort alla mellanslag (både vanliga och non-breaking)
-        df[kol] = df[kol].astype(str).str.replace(' ', '').str.replace('\xa0', '')
-        df[kol] = pd.to_numeric(df[kol], errors='coerce').fillna(0)
-    
-    # Separera år och månad från ÅrMånad-kolumnen
-    df['År'] = df['ÅrMånad'] // 100
-    df['Månad'] = df['ÅrMånad'] % 100
-    
-    # Slå ihop kampanjkoder
-    # GRATTISNYSTARTAD och NYSTARTAD ska båda visas som NYSTARTAD
-    df['KampanjKod'] = df['KampanjKod'].replace('GRATTISNYSTARTAD', 'NYSTARTAD')
-    
-    # Beräkna ordervärde (försäljning + rabattvärde)
-    df['Ordervärde'] = df['Försäljning'] + df['Rabattvärde']
-    
-    # Beräkna rabatt%
-    df['Rabatt%'] = np.where(
-        df['Ordervärde'] > 0,
-        (df['Rabattvärde'] / df['Ordervärde']) * 100,
-        0
-    )
-    
-    return df
+import aggregatcache
+import aggregatexport
+import mallar
+import rapportmotor
+from aggregatcache import AGGREGAT_KATALOG
+from inlasning import ladda_försäljning, SNAPSHOT_KATALOG
+from inkrementell import periodhashar, ändrade_perioder, jämförelseperioder, kodversion, ladda_vycache, spara_vycache
+from rapportmotor import (bygg_kub_cachad, uppdatera_kub, periodmatriser_ur_kub, matris_summor, jämför_i_matris,
+                          försäljnings_kpi, jämför_perioder, perioder_i_data, välj_perioder,
+                          med_jämförelseperioder, lägg_till_periodargument, FÖRSÄLJNINGSMÅTT)
+from klientrendering import data_skript, avrunda, RENDERARE_JS
+from mallar import (rendera_rader, förändringsklass, förändringspil, heltal, kpi_kort, sidmarkör, skriv_sida,
+                    periodknappar, periodrubrik, MÅNADSNAMN)
+from parallell import generera_parallellt
+import profilering
+from profilering import steg
 
 
-def filtrera_period(df, år, månad):
-    """Filtrera data för en specifik period."""
-    return df[(df['År'] == år) & (df['Månad'] == månad)].copy()
+# Summerbara mått och dimensioner som förberäknas i försäljningskuben
+MÅTT = FÖRSÄLJNINGSMÅTT
+DIMENSIONER = ['KampanjKod', 'Antal anställda', 'Bolagsform', 'Kundtyp', 'SNI', 'SäljKanal']
 
+# Måtten i dimensionstabellerna - de sorteras på ordervärde och jämför antalet ordrar
+TABELLMÅTT = ['Ordervärde', 'Antal försäljningsordrar']
 
-def beräkna_huvud_kpi(df):
-    """Beräkna huvud-KPI:er för en given period."""
-    return {
-        'Ordervärde': df['Ordervärde'].sum(),
-        'Försäljning': df['Försäljning'].sum(),
-        'Rabattvärde': df['Rabattvärde'].sum(),
-        'Försäljningsantal': df['Antal försäljningsordrar'].sum(),
-        'Rabatt%': (df['Rabattvärde'].sum() / df['Ordervärde'].sum() * 100) if df['Ordervärde'].sum() > 0 else 0,
-    }
+# Försäljningsexporten som dashboarden byggs från
+CSV_FIL = Path(__file__).parent / "8520e6e8-926a-4264-b6ad-e545036fe730 - Sheet1.csv"
 
+# Säljkanaler: (värde i SäljKanal, id i sidan, visningsnamn) - None är alla kanaler
+KANALER = [
+    (None, "alla", "Alla kanaler"),
+    ("Fortnox.Se", "fortnox-se", "Fortnox.Se"),
+    ("Fortnox", "fortnox", "Fortnox (Säljare)")
+]
 
-def jämför_perioder(kpi_aktuell, kpi_jämförelse):
-    """Jämför två perioder och returnera förändringarna."""
-    jämförelse = {}
-    
-    for nyckel in ['Ordervärde', 'Försäljning', 'Rabattvärde', 'Försäljningsantal']:
-        värde_aktuell = kpi_aktuell[nyckel]
-        värde_jämförelse = kpi_jämförelse[nyckel]
-        
-        if värde_jämförelse > 0:
-            förändring_procent = ((värde_aktuell - värde_jämförelse) / värde_jämförelse) * 100
-        else:
-            förändring_procent = 0 if värde_aktuell == 0 else 100
-        
-        jämförelse[nyckel] = {
-            'Aktuell': värde_aktuell,
-            'Jämförelse': värde_jämförelse,
-            'Förändring%': förändring_procent,
+# Ersätter sidans showContent vid klientrendering: rendera vald månad och kanal från JSON-datan
+KLIENT_VISNING_JS = """<script>
+        function showContent() {
+            const vy = DASHBOARD_DATA.vyer[currentYear + '_' + currentMonth + '_' + currentChannel];
+            const [kpiRubrik, tabellRubrik] = vy.rubriker;
+            document.getElementById('klient-kpi').innerHTML = sektion(kpiRubrik,
+                'Jämförelser Year-over-Year & Month-over-Month',
+                '<div class="kpi-grid">' + vy.kpi.map(kpi => kpiKortFörsäljning(kpi, currentMonth, currentYear)).join('') + '</div>');
+            document.getElementById('klient-tabeller').innerHTML = sektion(tabellRubrik,
+                'Top-prestationer och trender per dimension',
+                '<div class="tables-grid">' + vy.tabeller.map(tabellFörsäljning).join('') + '</div>');
         }
-    
-    # Rabatt% behandlas annorlunda
-    jämförelse['Rabatt%'] = {
-        'Aktuell': kpi_aktuell['Rabatt%'],
-        'Jämförelse': kpi_jämförelse['Rabatt%'],
-        'Förändring_pp': kpi_aktuell['Rabatt%'] - kpi_jämförelse['Rabatt%'],
-    }
-    
-    return jämförelse
-
-
-def analysera_dimension(df_aktuell, df_yoy_jämförelse, df_mom_jämförelse, dimension, top_n=10, exkludera_värden=None):
-    """Analysera en specifik dimension med både YoY och MoM jämförelser."""
-    
-    # Filtrera bort oönskade värden om specificerat
-    if exkludera_värden:
-        df_aktuell = df_aktuell[~df_aktuell[dimension].isin(exkludera_värden)]
-        df_yoy_jämförelse = df_yoy_jämförelse[~df_yoy_jämförelse[dimension].isin(exkludera_värden)]
-        df_mom_jämförelse = df_mom_jämförelse[~df_mom_jämförelse[dimension].isin(exkludera_värden)]
-    
-    # Aggregera för aktuell period
-    agg_aktuell = df_aktuell.groupby(dimension).agg({
-        'Ordervärde': 'sum',
-        'Antal försäljningsordrar': 'sum'
-    }).reset_index()
-    
-    # Aggregera för YoY jämförelseperiod
-    agg_yoy = df_yoy_jämförelse.groupby(dimension).agg({
-        'Antal försäljningsordrar': 'sum'
-    }).reset_index()
-    
-    # Aggregera för MoM jämförelseperiod
-    agg_mom = df_mom_jämförelse.groupby(dimension).agg({
-        'Antal försäljningsordrar': 'sum'
-    }).reset_index()
-    
-    # Slå samman YoY
-    jämförelse_df = pd.merge(
-        agg_aktuell,
-        agg_yoy,
-        on=dimension,
-        how='outer',
-        suffixes=('_aktuell', '_yoy')
-    ).fillna(0)
-    
-    # Slå samman MoM
-    jämförelse_df = pd.merge(
-        jämförelse_df,
-        agg_mom,
-        on=dimension,
-        how='outer'
-    ).fillna(0)
-    
-    # Rename MoM kolumn
-    jämförelse_df = jämförelse_df.rename(columns={'Antal försäljningsordrar': 'Antal försäljningsordrar_mom'})
-    
-    # Sortera efter ordervärde aktuell period
-    jämförelse_df = jämförelse_df.sort_values('Ordervärde', ascending=False)
-    
-    return jämförelse_df.head(top_n) if len(jämförelse_df) > top_n else jämförelse_df
-
-
-def generera_kpi_card_kombinerad(titel, värde_aktuell, värde_yoy, värde_mom, förändring_yoy, förändring_mom, är_rabatt=False, månad=10, år=2025):
-    """Generera HTML för ett kombinerat KPI-kort med både YoY och MoM."""
-    
-    # Månadsnamn
-    månadsnamn = {
-        1: "Jan", 2: "Feb", 3: "Mar", 4: "Apr", 5: "Maj", 6: "Jun",
-        7: "Jul", 8: "Aug", 9: "Sep", 10: "Okt", 11: "Nov", 12: "Dec"
-    }
-    
-    # Beräkna föregående månad för MoM-jämförelse
-    if månad == 1:
-        mom_månad = 12
-        mom_år = år - 1
-    else:
-        mom_månad = månad - 1
-        mom_år = år
-    
-    # YoY jämförelse (samma månad föregående år)
-    yoy_år = år - 1
-    
-    if är_rabatt:
-        värde_text = f"{värde_aktuell:.2f}%"
-        yoy_text = f"vs {månadsnamn[månad]} {yoy_år}: {värde_yoy:.2f}%"
-        mom_text = f"vs {månadsnamn[mom_månad]} {mom_år}: {värde_mom:.2f}%"
-        yoy_förändring_text = f"{förändring_yoy:+.2f}pp"
-        mom_förändring_text = f"{förändring_mom:+.2f}pp"
-        yoy_positiv = förändring_yoy < 0  # Lägre rabatt är bättre
-        mom_positiv = förändring_mom < 0
-    else:
-        if "värde" in titel.lower():
-            värde_text = f"{värde_aktuell:,.0f} kr"
-            yoy_text = f"vs {månadsnamn[månad]} {yoy_år}: {värde_yoy:,.0f} kr"
-            mom_text = f"vs {månadsnamn[mom_månad]} {mom_år}: {värde_mom:,.0f} kr"
-        else:
-            värde_text = f"{int(värde_aktuell):,}"
-            yoy_text = f"vs {månadsnamn[månad]} {yoy_år}: {int(värde_yoy):,}"
-            mom_text = f"vs {månadsnamn[mom_månad]} {mom_år}: {int(värde_mom):,}"
-        yoy_förändring_text = f"{förändring_yoy:+.1f}%"
-        mom_förändring_text = f"{förändring_mom:+.1f}%"
-        yoy_positiv = förändring_yoy > 0
-        mom_positiv = förändring_mom > 0
-    
-    yoy_pil = "↑" if yoy_positiv else "↓" if not yoy_positiv and förändring_yoy != 0 else "→"
-    yoy_färg = "positive" if yoy_positiv else "negative" if förändring_yoy != 0 else "neutral"
-    
-    mom_pil = "↑" if mom_positiv else "↓" if not mom_positiv and förändring_mom != 0 else "→"
-    mom_färg = "positive" if mom_positiv else "negative" if förändring_mom != 0 else "neutral"
-    
-    return f"""
-    <div class="kpi-card">
-        <div class="kpi-title">{titel}</div>
-        <div class="kpi-value">{värde_text}</div>
-        <div class="kpi-comparisons">
-            <div class="comparison-row">
-                <span class="comparison-label">YoY:</span>
-                <span class="comparison-value">{yoy_text}</span>
-                <span class="kpi-change-inline {yoy_färg}">
-                    <span class="arrow-small">{yoy_pil}</span>
-                    {yoy_förändring_text}
-                </span>
-            </div>
-            <div class="comparison-row">
-                <span class="comparison-label">MoM:</span>
-                <span class="comparison-value">{mom_text}</span>
-                <span class="kpi-change-inline {mom_färg}">
-                    <span class="arrow-small">{mom_pil}</span>
-                    {mom_förändring_text}
-                </span>
-            </div>
-        </div>
-    </div>
-    """
+        showContent();
+    </script>"""
 
 
-def generera_tabell(titel, df, dimension_namn, max_rader=10):
-    """Generera HTML-tabell för dimensionsanalys."""
-    
-    # Begränsa antal rader
-    df = df.head(max_rader)
-    
-    # Beräkna förändringar för både YoY och MoM
-    df = df.copy()
-    df['Antal_yoy_förändring%'] = np.where(
-        df['Antal försäljningsordrar_yoy'] > 0,
-        ((df['Antal försäljningsordrar_aktuell'] - df['Antal försäljningsordrar_yoy']) / 
-         df['Antal försäljningsordrar_yoy']) * 100,
-        0
-    )
-    
-    df['Antal_mom_förändring%'] = np.where(
-        df['Antal försäljningsordrar_mom'] > 0,
-        ((df['Antal försäljningsordrar_aktuell'] - df['Antal försäljningsordrar_mom']) / 
-         df['Antal försäljningsordrar_mom']) * 100,
-        0
-    )
-    
-    rader_html = ""
-    for _, rad in df.iterrows():
-        yoy_förändring = rad['Antal_yoy_förändring%']
-        yoy_klass = "positive" if yoy_förändring > 0 else "negative" if yoy_förändring < 0 else "neutral"
-        yoy_pil = "↑" if yoy_förändring > 0 else "↓" if yoy_förändring < 0 else "→"
-        
-        mom_förändring = rad['Antal_mom_förändring%']
-        mom_klass = "positive" if mom_förändring > 0 else "negative" if mom_förändring < 0 else "neutral"
-        mom_pil = "↑" if mom_förändring > 0 else "↓" if mom_förändring < 0 else "→"
-        
-        rader_html += f"""
+# Mall för en rad i dimensionstabellerna (se generera_tabell)
+TABELLRAD_MALL = """
         <tr>
-            <td class="dimension-name">{rad[dimension_namn]}</td>
-            <td class="number">{int(rad['Antal försäljningsordrar_aktuell']):,}</td>
+            <td class="dimension-name">{namn}</td>
+            <td class="number">{antal:,}</td>
             <td class="number {yoy_klass}">
                 <span class="arrow-small">{yoy_pil}</span>
-                {yoy_förändring:+.1f}%
+                {yoy:+.1f}%
             </td>
             <td class="number {mom_klass}">
                 <span class="arrow-small">{mom_pil}</span>
-                {mom_förändring:+.1f}%
+                {mom:+.1f}%
             </td>
         </tr>
         """
+
+
+def generera_tabell(titel, df, dimension_namn, max_rader=10):
+    """Generera HTML-tabell för dimensionsanalys."""
+    
+    df = df.head(max_rader)
+    
+    yoy = df['Antal försäljningsordrar_yoy%']
+    mom = df['Antal försäljningsordrar_mom%']
+    rader_html = rendera_rader(
+        TABELLRAD_MALL,
+        namn=df[dimension_namn],
+        antal=heltal(df['Antal försäljningsordrar']),
+        yoy_klass=förändringsklass(yoy), yoy_pil=förändringspil(yoy), yoy=yoy,
+        mom_klass=förändringsklass(mom), mom_pil=förändringspil(mom), mom=mom,
+    )
     
     return f"""
     <div class="table-card">
@@ -279,159 +113,181 @@ def generera_tabell(titel, df, dimension_namn, max_rader=10):
     """
 
 
-def generera_innehåll_för_filter(df, okt_2025, okt_2024, sep_2025, filter_namn):
-    """Generera KPI och tabeller för ett specifikt filter."""
-    # Beräkna KPI:er
-    kpi_okt_2025 = beräkna_huvud_kpi(okt_2025)
-    kpi_okt_2024 = beräkna_huvud_kpi(okt_2024)
-    kpi_sep_2025 = beräkna_huvud_kpi(sep_2025)
-    
-    # Jämförelser
-    yoy = jämför_perioder(kpi_okt_2025, kpi_okt_2024)
-    mom = jämför_perioder(kpi_okt_2025, kpi_sep_2025)
+def vymatriser(kub):
+    """Försäljningskuben som periodmatriser med säljkanalen som filter, för beräkna_vy."""
+    return periodmatriser_ur_kub(kub, TABELLMÅTT)
 
 
-def generera_innehåll_för_månad_och_kanal(df, månad, år=2025, säljkanal=None):
-    """Generera KPI och tabeller för en specifik månad och säljkanal."""
-    # Filtrera data baserat på säljkanal
-    if säljkanal:
-        df = df[df['SäljKanal'] == säljkanal]
-    
-    # Filtrera för aktuell månad
-    aktuell_period = filtrera_period(df, år, månad)
-    
-    # Filtrera för YoY jämförelse (samma månad föregående år)
-    yoy_period = filtrera_period(df, år - 1, månad)
-    
-    # Filtrera för MoM jämförelse (föregående månad)
-    if månad == 1:
-        # Januari jämför med december föregående år
-        mom_period = filtrera_period(df, år - 1, 12)
-    else:
-        mom_period = filtrera_period(df, år, månad - 1)
-    
+def beräkna_vy(matriser, månad, år=2025, säljkanal=None):
+    """
+    Beräkna KPI:er och dimensionstabeller för en specifik månad och säljkanal ur kubens
+    periodmatriser (se vymatriser).
+
+    Perioden och dess jämförelser (YoY och MoM) är celler i matriserna, så vyn
+    är uttag av arrayer utan någon koppling mellan perioderna. Returnerar vyns
+    data utan HTML, så att den kan renderas antingen här (rendera_vy) eller i
+    webbläsaren (vydata + klientrendering).
+    """
     # Beräkna KPI:er
-    kpi_aktuell = beräkna_huvud_kpi(aktuell_period)
-    kpi_yoy = beräkna_huvud_kpi(yoy_period)
-    kpi_mom = beräkna_huvud_kpi(mom_period)
+    summor = matris_summor(matriser[None], år, månad, säljkanal)
+    kpi_aktuell, kpi_yoy, kpi_mom = (försäljnings_kpi(summor[period]) for period in ('aktuell', 'yoy', 'mom'))
     
     # Jämförelser
     yoy = jämför_perioder(kpi_aktuell, kpi_yoy)
     mom = jämför_perioder(kpi_aktuell, kpi_mom)
     
-    # Generera kombinerade KPI-kort
+    # KPI-kort: (titel, aktuell, yoy, mom, förändring yoy, förändring mom, är_rabatt)
+    kpi = [
+        (nyckel, kpi_aktuell[nyckel], kpi_yoy[nyckel], kpi_mom[nyckel],
+         yoy[nyckel]['Förändring%'], mom[nyckel]['Förändring%'], False)
+        for nyckel in ['Ordervärde', 'Försäljning', 'Försäljningsantal']
+    ]
+    kpi.append(('Rabatt%', kpi_aktuell['Rabatt%'], kpi_yoy['Rabatt%'], kpi_mom['Rabatt%'],
+                yoy['Rabatt%']['Förändring_pp'], mom['Rabatt%']['Förändring_pp'], True))
+    
+    # Analysera dimensioner
+    def analysera(dimension, top_n, exkludera_värden=None):
+        return jämför_i_matris(
+            matriser[dimension], år, månad, säljkanal, top_n=top_n, sortera_efter='Ordervärde',
+            exkludera_värden=exkludera_värden, jämförda_mått=['Antal försäljningsordrar']
+        )
+    
+    # Tabeller: (titel, analys, dimension, max_rader). Säljkanal visas endast om vi
+    # inte filtrerat på kanal - platsen behålls som None så att layouten är densamma.
+    tabeller = [
+        ("Kundtyp", analysera('Kundtyp', top_n=5), 'Kundtyp', 5),
+        ("Säljkanaler", analysera('SäljKanal', top_n=5), 'SäljKanal', 5) if säljkanal is None else None,
+        ("Top Kampanjkoder", analysera('KampanjKod', top_n=8, exkludera_värden=['Kod saknas']), 'KampanjKod', 8),
+        ("Antal Anställda", analysera('Antal anställda', top_n=8), 'Antal anställda', 8),
+        ("Bolagsform", analysera('Bolagsform', top_n=5), 'Bolagsform', 5),
+        ("Top SNI-koder", analysera('SNI', top_n=10, exkludera_värden=['-']), 'SNI', 10),
+    ]
+    
+    return {'månad': månad, 'år': år, 'kpi': kpi, 'tabeller': tabeller}
+
+
+def rendera_vy(vy):
+    """Rendera en beräknad vy till HTML för KPI-kort och tabeller."""
+    kort = "\n            ".join(
+        kpi_kort(titel, aktuell, värde_yoy, värde_mom, förändring_yoy, förändring_mom, vy['månad'], vy['år'],
+                 format='procent' if är_rabatt else 'kr' if "värde" in titel.lower() else 'heltal')
+        for titel, aktuell, värde_yoy, värde_mom, förändring_yoy, förändring_mom, är_rabatt in vy['kpi']
+    )
     kpi_cards = f"""
         <div class="kpi-grid">
-            {generera_kpi_card_kombinerad("Ordervärde", 
-                kpi_aktuell['Ordervärde'], kpi_yoy['Ordervärde'], kpi_mom['Ordervärde'],
-                yoy['Ordervärde']['Förändring%'], mom['Ordervärde']['Förändring%'], 
-                månad=månad, år=år)}
-            {generera_kpi_card_kombinerad("Försäljning", 
-                kpi_aktuell['Försäljning'], kpi_yoy['Försäljning'], kpi_mom['Försäljning'],
-                yoy['Försäljning']['Förändring%'], mom['Försäljning']['Förändring%'],
-                månad=månad, år=år)}
-            {generera_kpi_card_kombinerad("Försäljningsantal", 
-                kpi_aktuell['Försäljningsantal'], kpi_yoy['Försäljningsantal'], kpi_mom['Försäljningsantal'],
-                yoy['Försäljningsantal']['Förändring%'], mom['Försäljningsantal']['Förändring%'],
-                månad=månad, år=år)}
-            {generera_kpi_card_kombinerad("Rabatt%", 
-                kpi_aktuell['Rabatt%'], kpi_yoy['Rabatt%'], kpi_mom['Rabatt%'],
-                yoy['Rabatt%']['Förändring_pp'], mom['Rabatt%']['Förändring_pp'], 
-                är_rabatt=True, månad=månad, år=år)}
+            {kort}
         </div>
     """
     
-    # Analysera dimensioner
-    kampanj_analys = analysera_dimension(aktuell_period, yoy_period, mom_period, 'KampanjKod', top_n=8, exkludera_värden=['Kod saknas'])
-    anställda_analys = analysera_dimension(aktuell_period, yoy_period, mom_period, 'Antal anställda', top_n=8)
-    bolagsform_analys = analysera_dimension(aktuell_period, yoy_period, mom_period, 'Bolagsform', top_n=5)
-    kundtyp_analys = analysera_dimension(aktuell_period, yoy_period, mom_period, 'Kundtyp', top_n=5)
-    sni_analys = analysera_dimension(aktuell_period, yoy_period, mom_period, 'SNI', top_n=10, exkludera_värden=['-'])
-    
-    # Generera tabeller (visa säljkanal endast om vi inte filtrerat på kanal)
-    if säljkanal is None:
-        säljkanal_analys = analysera_dimension(aktuell_period, yoy_period, mom_period, 'SäljKanal', top_n=5)
-        säljkanal_tabell = generera_tabell("Säljkanaler", säljkanal_analys, 'SäljKanal', 5)
-    else:
-        säljkanal_tabell = ""
-    
+    tabeller_html = "\n            ".join(
+        generera_tabell(*tabell) if tabell else "" for tabell in vy['tabeller']
+    )
     tabeller = f"""
         <div class="tables-grid">
-            {generera_tabell("Kundtyp", kundtyp_analys, 'Kundtyp', 5)}
-            {säljkanal_tabell}
-            {generera_tabell("Top Kampanjkoder", kampanj_analys, 'KampanjKod', 8)}
-            {generera_tabell("Antal Anställda", anställda_analys, 'Antal anställda', 8)}
-            {generera_tabell("Bolagsform", bolagsform_analys, 'Bolagsform', 5)}
-            {generera_tabell("Top SNI-koder", sni_analys, 'SNI', 10)}
+            {tabeller_html}
         </div>
     """
     
     return kpi_cards, tabeller
 
 
-def generera_dashboard():
-    """Huvudfunktion för att generera dashboard."""
-    
-    # Hitta CSV-filen
-    csv_fil = Path(__file__).parent / "8520e6e8-926a-4264-b6ad-e545036fe730 - Sheet1.csv"
-    
-    # Ladda data
-    df = ladda_data(csv_fil)
-    
-    # Definiera månader som finns i datan
-    månader = [
-        (1, "Januari"), (2, "Februari"), (3, "Mars"), (4, "April"),
-        (5, "Maj"), (6, "Juni"), (7, "Juli"), (8, "Augusti"),
-        (9, "September"), (10, "Oktober")
-    ]
-    
-    # Definiera säljkanaler
-    kanaler = [
-        (None, "alla", "Alla kanaler"),
-        ("Fortnox.Se", "fortnox-se", "Fortnox.Se"),
-        ("Fortnox", "fortnox", "Fortnox (Säljare)")
+def vydata(vy):
+    """Forma om en beräknad vy till kompakt JSON-data för klientrendering."""
+    kpi = [
+        [titel, float(aktuell), float(värde_yoy), float(värde_mom), float(förändring_yoy), float(förändring_mom), är_rabatt]
+        for titel, aktuell, värde_yoy, värde_mom, förändring_yoy, förändring_mom, är_rabatt in vy['kpi']
     ]
     
-    # Generera innehåll för alla kombinationer av månad och kanal
-    månad_kanal_innehåll = {}
-    for månad_nr, månad_namn in månader:
-        for kanal_filter, kanal_id, kanal_visningsnamn in kanaler:
-            kpi_cards, tabeller = generera_innehåll_för_månad_och_kanal(df, månad_nr, 2025, kanal_filter)
-            månad_kanal_innehåll[f"{månad_nr}_{kanal_id}"] = {
-                'kpi': kpi_cards,
-                'tabeller': tabeller,
-                'månad_namn': månad_namn,
-                'kanal_namn': kanal_visningsnamn
-            }
+    tabeller = []
+    for tabell in vy['tabeller']:
+        if not tabell:
+            continue
+        titel, df, dimension, max_rader = tabell
+        df = df.head(max_rader)
+        rader = [
+            [str(namn), int(antal), avrunda(förändring_yoy), avrunda(förändring_mom)]
+            for namn, antal, förändring_yoy, förändring_mom in zip(
+                df[dimension], df['Antal försäljningsordrar'],
+                df['Antal försäljningsordrar_yoy%'], df['Antal försäljningsordrar_mom%'])
+        ]
+        tabeller.append([titel, dimension, rader])
     
-    # Bygg HTML-innehåll dynamiskt för alla månad-kanal kombinationer
-    kpi_sections_html = ""
-    table_sections_html = ""
-    
-    for månad_nr, månad_namn in månader:
-        for kanal_filter, kanal_id, kanal_visningsnamn in kanaler:
-            key = f"{månad_nr}_{kanal_id}"
-            innehåll = månad_kanal_innehåll[key]
-            
-            # Standard: visa oktober + alla kanaler, dölj resten
-            display = "block" if månad_nr == 10 and kanal_id == "alla" else "none"
-            
-            # KPI-sektion
-            kpi_sections_html += f"""
+    return {'kpi': kpi, 'tabeller': tabeller}
+
+
+def exportrader(vy, säljkanal):
+    """Vyns KPI:er och tabeller som rader för aggregatexporten (kanalen 'alla' utan säljkanal)."""
+    kpi = [
+        # Rabatt% jämförs i procentenheter, som då är differensen
+        aggregatexport.kpirad(titel, aktuell, värde_yoy, värde_mom, aktuell - värde_yoy, aktuell - värde_mom,
+                              *((None, None) if är_rabatt else (förändring_yoy, förändring_mom)))
+        for titel, aktuell, värde_yoy, värde_mom, förändring_yoy, förändring_mom, är_rabatt in vy['kpi']
+    ]
+    return aggregatexport.vyrader('försäljning', vy['år'], vy['månad'], säljkanal or 'alla', kpi,
+                                  filter(None, vy['tabeller']))
+
+
+def beräkna_vy_cachad(delad, år, månad, säljkanal):
+    """
+    Beräkna en vy ur den delade kuben via aggregatcachen.
+
+    Vyn nycklas på källdatan och koden, så att en omkörning med oförändrad fil
+    (eller dashboardservern) bara behöver rendera den.
+    """
+    with steg('beräkna_vy'):
+        return aggregatcache.hämta(
+            ('försäljningsvy', delad['källa'], delad['kodversion'], år, månad, säljkanal),
+            lambda: beräkna_vy(delad['matriser'], månad, år, säljkanal)
+        )
+
+
+def generera_vy(delad, år, månad, säljkanal):
+    """
+    Generera en vy ur den delade kuben - HTML, eller JSON-data vid klientrendering -
+    och, när delad['export'] är satt, vyns rader för aggregatexporten (annars None).
+    """
+    vy = beräkna_vy_cachad(delad, år, månad, säljkanal)
+    if delad['klientrendering']:
+        with steg('vydata'):
+            data = vydata(vy)
+        innehåll = data['kpi'], data['tabeller']
+    else:
+        with steg('rendera_vy'):
+            innehåll = rendera_vy(vy)
+    return innehåll + (exportrader(vy, säljkanal) if delad['export'] else None,)
+
+
+def bygg_html_sektioner(månad_kanal_innehåll, aktiv):
+    """
+    Bygg HTML-sektionerna (KPI, tabeller) för varje månad-kanal kombination, dolda utom
+    den aktiva perioden (år, månad) för alla kanaler.
+
+    Sektionerna ges en vy i taget i samma ordning som innehållet, så att de kan
+    skrivas till filen medan resten av vyerna genereras.
+    """
+    for innehåll in månad_kanal_innehåll:
+        år, månad_nr, månad_namn = innehåll['år'], innehåll['månad_nr'], innehåll['månad_namn']
+        kanal_id, kanal_visningsnamn = innehåll['kanal_id'], innehåll['kanal_namn']
+        
+        # Standard: visa aktiv period + alla kanaler, dölj resten
+        display = "block" if (år, månad_nr) == tuple(aktiv) and kanal_id == "alla" else "none"
+        
+        # KPI-sektion
+        kpi_section = f"""
         <!-- KPI-sektion för {månad_namn} - {kanal_visningsnamn} -->
-        <div class="section" id="kpi-{månad_nr}-{kanal_id}" data-month="{månad_nr}" data-channel="{kanal_id}" style="display: {display};">
+        <div class="section" id="kpi-{år}-{månad_nr}-{kanal_id}" data-month="{månad_nr}" data-year="{år}" data-channel="{kanal_id}" style="display: {display};">
             <div class="section-header">
-                <h2>Nyckeltal {månad_namn} 2025{'' if kanal_id == 'alla' else ' - ' + kanal_visningsnamn}</h2>
+                <h2>Nyckeltal {månad_namn} {år}{'' if kanal_id == 'alla' else ' - ' + kanal_visningsnamn}</h2>
                 <p class="subtitle">Jämförelser Year-over-Year & Month-over-Month</p>
             </div>
             {innehåll['kpi']}
         </div>
         """
-            
-            # Tabell-sektion
-            table_sections_html += f"""
+        
+        # Tabell-sektion
+        table_section = f"""
         <!-- Detaljerad analys för {månad_namn} - {kanal_visningsnamn} -->
-        <div class="section" id="tabeller-{månad_nr}-{kanal_id}" data-month="{månad_nr}" data-channel="{kanal_id}" style="display: {display};">
+        <div class="section" id="tabeller-{år}-{månad_nr}-{kanal_id}" data-month="{månad_nr}" data-year="{år}" data-channel="{kanal_id}" style="display: {display};">
             <div class="section-header">
                 <h2>Detaljerad Analys{'' if kanal_id == 'alla' else ' - ' + kanal_visningsnamn}</h2>
                 <p class="subtitle">Top-prestationer och trender per dimension</p>
@@ -439,6 +295,34 @@ def generera_dashboard():
             {innehåll['tabeller']}
         </div>
         """
+        
+        yield kpi_section, table_section
+
+
+def bygg_klientsektioner(månad_kanal_innehåll):
+    """Bygg tomma behållare, vydatan som JSON och skripten som renderar vald vy."""
+    vyer = {}
+    for key, innehåll in månad_kanal_innehåll.items():
+        kanal_suffix = '' if innehåll['kanal_id'] == 'alla' else ' - ' + innehåll['kanal_namn']
+        vyer[key] = {
+            'rubriker': [f"Nyckeltal {innehåll['månad_namn']} {innehåll['år']}{kanal_suffix}", f"Detaljerad Analys{kanal_suffix}"],
+            'kpi': innehåll['kpi'],
+            'tabeller': innehåll['tabeller'],
+        }
+    
+    klient_skript = "\n    ".join([data_skript({'vyer': vyer}), RENDERARE_JS, KLIENT_VISNING_JS])
+    return '<div id="klient-kpi"></div>', '<div id="klient-tabeller"></div>', klient_skript
+
+
+def sidmall(perioder, aktiv, klient_skript=""):
+    """
+    Dashboardsidan med markörer där KPI- och tabellsektionerna skrivs in (se skriv_sida).
+
+    perioder (ÅÅÅÅMM) blir sidans periodfilter, med den aktiva perioden (år, månad) vald.
+    """
+    aktivt_år, aktiv_månad = aktiv
+    # Sektionerna skrivs in vid markörerna när sidan sparas
+    kpi_sections_html, table_sections_html = sidmarkör('kpi'), sidmarkör('tabeller')
     
     # Skapa HTML-dokument
     html_content = f"""
@@ -450,7 +334,7 @@ def generera_dashboard():
     <meta name="robots" content="noindex, nofollow, noarchive, nosnippet">
     <meta name="googlebot" content="noindex, nofollow, noarchive, nosnippet">
     <meta http-equiv="X-Robots-Tag" content="noindex, nofollow, noarchive, nosnippet">
-    <title>Nykundsförsäljning 2025 - Fortnox</title>
+    <title>Nykundsförsäljning {periodrubrik(perioder)} - Fortnox</title>
     <link rel="preconnect" href="https://fonts.googleapis.com">
     <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
     <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap" rel="stylesheet">
@@ -1141,10 +1025,10 @@ def generera_dashboard():
     <div id="mainContent" class="content-hidden">
     <div class="container">
         <div class="header">
-            <h1>📊 Nykundsförsäljning 2025</h1>
+            <h1>📊 Nykundsförsäljning {periodrubrik(perioder)}</h1>
             <div class="header-meta">
                 Genererad: {datetime.now().strftime('%Y-%m-%d %H:%M')} | 
-                <span id="current-period">Oktober 2025</span> | 
+                <span id="current-period">{MÅNADSNAMN[aktiv_månad]} {aktivt_år}</span> | 
                 Jämförelser: YoY & MoM
             </div>
             <a href="kundflode_dashboard.html" class="nav-button">👥 Gå till Kundflödesrapport →</a>
@@ -1154,16 +1038,7 @@ def generera_dashboard():
         <div class="filter-section">
             <span class="filter-label">Välj månad:</span>
             <div class="filter-buttons">
-                <button class="filter-button" onclick="switchMonth(1)" data-month="1">Januari</button>
-                <button class="filter-button" onclick="switchMonth(2)" data-month="2">Februari</button>
-                <button class="filter-button" onclick="switchMonth(3)" data-month="3">Mars</button>
-                <button class="filter-button" onclick="switchMonth(4)" data-month="4">April</button>
-                <button class="filter-button" onclick="switchMonth(5)" data-month="5">Maj</button>
-                <button class="filter-button" onclick="switchMonth(6)" data-month="6">Juni</button>
-                <button class="filter-button" onclick="switchMonth(7)" data-month="7">Juli</button>
-                <button class="filter-button" onclick="switchMonth(8)" data-month="8">Augusti</button>
-                <button class="filter-button" onclick="switchMonth(9)" data-month="9">September</button>
-                <button class="filter-button active" onclick="switchMonth(10)" data-month="10">Oktober</button>
+                {periodknappar(perioder, aktiv)}
             </div>
         </div>
         
@@ -1197,8 +1072,9 @@ def generera_dashboard():
     </div> <!-- Stäng mainContent div -->
     
     <script>
-        // Håll reda på aktuell månad och kanal
-        let currentMonth = 10;
+        // Håll reda på aktuell period och kanal
+        let currentMonth = {aktiv_månad};
+        let currentYear = {aktivt_år};
         let currentChannel = 'alla';
         
         // Månadsnamn för visning
@@ -1210,12 +1086,13 @@ def generera_dashboard():
         
         // Funktion för att uppdatera period-text
         function updatePeriodText() {{
-            document.getElementById('current-period').textContent = monthNames[currentMonth] + ' 2025';
+            document.getElementById('current-period').textContent = monthNames[currentMonth] + ' ' + currentYear;
         }}
         
-        // Funktion för att växla månad
-        function switchMonth(month) {{
+        // Funktion för att växla period
+        function switchMonth(month, year) {{
             currentMonth = month;
+            currentYear = year;
             
             // Uppdatera aktiv månadsknapp
             document.querySelectorAll('[data-month]').forEach(btn => {{
@@ -1223,7 +1100,7 @@ def generera_dashboard():
                     btn.classList.remove('active');
                 }}
             }});
-            document.querySelector(`[data-month="${{month}}"][onclick*="switchMonth"]`).classList.add('active');
+            document.querySelector(`[data-month="${{month}}"][data-year="${{year}}"][onclick*="switchMonth"]`).classList.add('active');
             
             // Uppdatera period-text
             updatePeriodText();
@@ -1253,20 +1130,165 @@ def generera_dashboard():
                 section.style.display = 'none';
             }});
             
-            // Visa innehåll för vald månad och kanal
-            document.querySelectorAll(`[data-month="${{currentMonth}}"][data-channel="${{currentChannel}}"]`).forEach(section => {{
+            // Visa innehåll för vald period och kanal
+            document.querySelectorAll(`[data-month="${{currentMonth}}"][data-year="${{currentYear}}"][data-channel="${{currentChannel}}"]`).forEach(section => {{
                 section.style.display = 'block';
             }});
         }}
-    </script>
+    </script>{klient_skript}
 </body>
 </html>
     """
+    return html_content
+
+
+def generera_dashboard(inkrementell=False, klientrendering=False, arbetare=1, radblock=None,
+                       från=None, till=None, senaste=None):
+    """
+    Huvudfunktion för att generera dashboard.
+
+    Med inkrementell=True sparas kuben och de renderade vyerna mellan körningar,
+    och bara månader vars rader har ändrats (samt vyer som jämför mot dem)
+    räknas om.
+
+    Med klientrendering=True skrivs vyerna som kompakt JSON i sidan och renderas
+    i webbläsaren när de visas, i stället för att alla 30 vyer förrenderas som HTML.
+
+    arbetare anger hur många processer vyerna genereras i (0 = en per kärna).
+    Resultatet är detsamma som vid seriell körning.
+
+    Med radblock läses CSV-filen strömmande i block om så många rader och
+    aggregeras direkt, så att exporter större än minnet kan användas.
+
+    När aggregatexporten är startad (--export) skrivs varje vys KPI:er och
+    tabeller till exportfilen när vyn tas emot, se aggregatexport.
+
+    Perioderna som visas hämtas ur datans ÅrMånad: som standard alla månader
+    under det senaste året, annars de som väljs med från, till (ÅÅÅÅMM) och
+    senaste (rullande fönster om N månader), se välj_perioder.
+    """
+    
+    # Ladda data
+    with steg('ladda_data') as mätning:
+        df = ladda_försäljning(CSV_FIL, radblock)
+        mätning['rader'] = len(df)
+    källa = aggregatcache.källa(CSV_FIL, läge='.aggregerat' if radblock else '')
+    
+    # Perioderna som visas upptäcks ur datan
+    perioder_i_datan = perioder_i_data(df)
+    if not perioder_i_datan:
+        raise ValueError("Inga perioder i datan - exporten saknar rader med år och månad")
+    perioder = välj_perioder(perioder_i_datan, från, till, senaste)
+    if not perioder:
+        raise ValueError(f"Inga perioder i datan ({perioder_i_datan[0]}-{perioder_i_datan[-1]}) matchar urvalet")
+    print(f"Perioder: {perioder[0]}-{perioder[-1]} ({len(perioder)} månader)")
+    
+    if inkrementell:
+        # Jämför periodernas innehåll med förra körningen och bygg bara om ändrade perioder
+        # Vyerna sparas i olika form beroende på läge, så varje läge har en egen cache
+        läge = "klient." if klientrendering else ""
+        cache_fil = CSV_FIL.parent / SNAPSHOT_KATALOG / f"oktober_dashboard.{läge}vycache.pkl"
+        with steg('uppdatera_kub') as mätning:
+            cache = ladda_vycache(cache_fil, kodversion([
+                Path(__file__), Path(rapportmotor.__file__), Path(mallar.__file__),
+                Path(__file__).parent / "klientrendering.py"
+            ]))
+            hashar = periodhashar(df)
+            ändrade = ändrade_perioder(cache['periodhashar'], hashar)
+            kub = uppdatera_kub(cache['kub'], df, ändrade, DIMENSIONER, MÅTT)
+            mätning['rader'] = len(df)
+        print(f"Inkrementell körning: {len(ändrade)} ändrade perioder")
+    else:
+        # Aggregera de visade perioderna och deras jämförelseperioder i ett pass -
+        # perioder som redan aggregerats för samma fil läses ur aggregatcachen.
+        with steg('bygg_kub') as mätning:
+            kub = bygg_kub_cachad(df, källa, DIMENSIONER, MÅTT,
+                                  perioder=sorted(set(med_jämförelseperioder(perioder)) & set(perioder_i_datan)))
+            mätning['rader'] = len(df)
+    
+    # Kubens uttag läggs i periodmatriser, så att varje vy tar ut sin period och
+    # dess jämförelser som arrayer i stället för att koppla ihop uttagen
+    with steg('bygg_matriser'):
+        matriser = vymatriser(kub)
+    
+    # Perioderna som (år, månad) och säljkanalerna
+    månader = [divmod(period, 100) for period in perioder]
+    kanaler = KANALER
+    
+    # Vyer som ska genereras - vid inkrementell körning återanvänds oförändrade vyer ur cachen
+    def behöver_genereras(år, månad_nr, key):
+        return not (inkrementell and key in cache['vyer'] and not (jämförelseperioder(år, månad_nr) & ändrade))
     
-    # Spara HTML-filen
+    uppgifter = [
+        (år, månad_nr, kanal_filter, kanal_id)
+        for år, månad_nr in månader
+        for kanal_filter, kanal_id, _ in kanaler
+        if behöver_genereras(år, månad_nr, f"{år}_{månad_nr}_{kanal_id}")
+    ]
+    
+    genereras = {(år, månad_nr, kanal_id) for år, månad_nr, _, kanal_id in uppgifter}
+    vycache = {}
+    
+    def månad_kanal_innehåll():
+        """Innehåll för alla kombinationer av månad och kanal, i visningsordning."""
+        # Vyerna är oberoende av varandra och kan genereras i flera processer. De tas
+        # emot en i taget, så att varje vy kan skrivas ut innan nästa behövs.
+        # (stegen inuti generera_vy mäts bara när vyerna genereras i den här processen)
+        # Med --export skrivs varje vys aggregat till exportfilen när vyn tas emot.
+        delad = {'matriser': matriser, 'klientrendering': klientrendering, 'källa': källa,
+                 'kodversion': kodversion([Path(__file__)]), 'export': aggregatexport.aktiv()}
+        genererade = generera_parallellt(
+            generera_vy, [(år, månad_nr, kanal_filter) for år, månad_nr, kanal_filter, _ in uppgifter],
+            delad, arbetare
+        )
+        for år, månad_nr in månader:
+            for kanal_filter, kanal_id, kanal_visningsnamn in kanaler:
+                key = f"{år}_{månad_nr}_{kanal_id}"
+                if (år, månad_nr, kanal_id) in genereras:
+                    kpi_cards, tabeller, rader = next(genererade)
+                else:
+                    # Återanvända vyer beräknas bara för exporten - ur aggregatcachen när den är på
+                    kpi_cards, tabeller = cache['vyer'][key]
+                    rader = exportrader(beräkna_vy_cachad(delad, år, månad_nr, kanal_filter), kanal_filter) \
+                        if delad['export'] else None
+                if rader is not None:
+                    with steg('exportera'):
+                        aggregatexport.skriv(rader)
+                if inkrementell:
+                    vycache[key] = (kpi_cards, tabeller)
+                yield {
+                    'kpi': kpi_cards,
+                    'tabeller': tabeller,
+                    'år': år,
+                    'månad_nr': månad_nr,
+                    'månad_namn': MÅNADSNAMN[månad_nr],
+                    'kanal_id': kanal_id,
+                    'kanal_namn': kanal_visningsnamn
+                }
+    
+    # Bygg sektionerna - förrenderad HTML eller tomma behållare som fylls i webbläsaren
+    if klientrendering:
+        # Vydatan bäddas in som ett JSON-block och samlas därför ihop innan sidan skrivs
+        with steg('generera_vyer'):
+            innehåll = {f"{vy['år']}_{vy['månad_nr']}_{vy['kanal_id']}": vy for vy in månad_kanal_innehåll()}
+        kpi_sektion, tabellsektion, klient_skript = bygg_klientsektioner(innehåll)
+        sektioner = [(kpi_sektion, tabellsektion)]
+    else:
+        sektioner = bygg_html_sektioner(månad_kanal_innehåll(), månader[-1])
+        klient_skript = ""
+    
+    html_content = sidmall(perioder, månader[-1], klient_skript)
+    
+    # Spara HTML-filen - förrenderade vyer genereras och skrivs en i taget
     output_fil = Path(__file__).parent / "oktober_dashboard.html"
-    with open(output_fil, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    with steg('generera_och_skriv'):
+        skriv_sida(output_fil, html_content, ['kpi', 'tabeller'], sektioner)
+    
+    if inkrementell:
+        cache['periodhashar'] = hashar
+        cache['kub'] = kub
+        cache['vyer'] = vycache
+        spara_vycache(cache_fil, cache)
     
     print(f"\n✅ Dashboard genererad framgångsrikt!")
     print(f"📄 Fil: {output_fil}")
@@ -1276,4 +1298,30 @@ def generera_dashboard():
 
 
 if __name__ == "__main__":
-    generera_dashboard()
+    parser = argparse.ArgumentParser(description="Generera HTML-dashboard för nykundsförsäljning")
+    parser.add_argument('--inkrementell', action='store_true',
+                        help="återanvänd cachade vyer och räkna bara om månader vars data har ändrats")
+    parser.add_argument('--klientrendering', action='store_true',
+                        help="skriv vyerna som JSON i sidan och rendera dem i webbläsaren")
+    parser.add_argument('--arbetare', type=int, default=1, metavar='N',
+                        help="generera vyerna i N processer (0 = en per kärna, standard 1)")
+    parser.add_argument('--radblock', type=int, metavar='N',
+                        help="läs CSV-filerna strömmande i block om N rader och aggregera direkt "
+                             "(för exporter större än minnet)")
+    lägg_till_periodargument(parser)
+    profilering.lägg_till_argument(parser)
+    aggregatcache.lägg_till_argument(parser)
+    aggregatexport.lägg_till_argument(parser)
+    args = parser.parse_args()
+    
+    if args.profil or args.profil_dump:
+        profilering.starta(args.profil_dump)
+    if not args.utan_cache:
+        aggregatcache.starta(Path(__file__).parent / SNAPSHOT_KATALOG / AGGREGAT_KATALOG, args.cache_mb)
+    if args.export:
+        aggregatexport.starta(args.export)
+    generera_dashboard(inkrementell=args.inkrementell, klientrendering=args.klientrendering,
+                       arbetare=args.arbetare, radblock=args.radblock,
+                       från=args.från, till=args.till, senaste=args.senaste)
+    aggregatexport.avsluta()
+    profilering.avsluta("generera_dashboard.py", Path(__file__).parent / "oktober_dashboard.profil.json")
@@ -4,230 +4,129 @@
 Generera HTML Dashboard för Kundflöde med Fortnox-styling
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from datetime import datetime
 
+import aggregatcache
+import aggregatexport
+from aggregatcache import AGGREGAT_KATALOG
+from inkrementell import kodversion
+from inlasning import (
+    läs_csv, förbered_nya_kunder, förbered_kundstock, förbered_kundmål,
+    slå_samman_ramar, indexera_perioder, SNAPSHOT_KATALOG,
+)
+from rapportmotor import (bygg_periodmatriser, jämför_i_matris, matris_summor, jämför_perioder,
+                          flöde_per_period, flöde_per_värde, perioder_i_data, välj_perioder,
+                          lägg_till_periodargument)
+from klientrendering import data_skript, avrunda, RENDERARE_JS
+from mallar import (rendera_rader, förändringsklass, heltal, kpi_kort, sidmarkör, skriv_sida,
+                    periodknappar, periodrubrik, MÅNADSNAMN, MÅNADER_KORT)
+from parallell import generera_parallellt
+import profilering
+from profilering import steg
 
-def ladda_nya_kunder_data(filpath):
-    """Ladda och förbered data för nya kunder."""
-    df = pd.read_csv(filpath)
-    
-    # Rensa numeriska kolumner
-    df['Nya kunder'] = pd.to_numeric(df['Nya kunder'], errors='coerce').fillna(0).astype(int)
-    
-    # Separera år och månad
-    df['År'] = df['ÅrMånad'] // 100
-    df['Månad'] = df['ÅrMånad'] % 100
-    
-    # Gruppera anskaffningskanaler
-    def kategorisera_kanal(kanal):
-        if pd.isna(kanal) or kanal == '-':
-            return 'övrigt'
-        kanal_lower = str(kanal).lower()
-        if 'fortnox.se' in kanal_lower or 'fortnox se' in kanal_lower:
-            return 'fortnox.se'
-        elif 'fortnox' in kanal_lower and 'fortnox.se' not in kanal_lower:
-            return 'fortnox'
-        elif 'winback' in kanal_lower:
-            return 'winback'
-        elif 'byrå' in kanal_lower:
-            return 'byrå'
-        elif 'cling' in kanal_lower or 'boardeaser' in kanal_lower or 'okänd' in kanal_lower:
-            return 'övrigt'
-        else:
-            return 'övrigt'
-    
-    df['Anskaffningskanal'] = df['Anskaffad via - Detalj'].apply(kategorisera_kanal)
-    
-    return df
 
+# Exporterna som dashboarden byggs från
+NYA_KUNDER_FIL = Path(__file__).parent / "3726d67f-37f5-4502-8e8d-c191ed5167cc - Sheet1.csv"
+# Kundstocken exporteras en fil per år
+KUNDSTOCK_FILER = {
+    2024: Path(__file__).parent / "2024-kundstock - Sheet1.csv",
+    2025: Path(__file__).parent / "2025 kundstock - Sheet1.csv",
+}
+KUNDMÅL_FIL = Path(__file__).parent / "kundmål - Sheet1.csv"
 
-def ladda_kundstock_data(filpath_2024, filpath_2025):
-    """Ladda och kombinera kundstock för 2024 och 2025."""
-    df_2024 = pd.read_csv(filpath_2024)
-    df_2025 = pd.read_csv(filpath_2025)
-    
-    # Lägg till år-information
-    df_2024['År'] = 2024
-    df_2025['År'] = 2025
-    
-    # Kombinera
-    df = pd.concat([df_2024, df_2025], ignore_index=True)
-    
-    # Rensa numeriska kolumner
-    df['Antal kunder'] = pd.to_numeric(df['Antal kunder'], errors='coerce').fillna(0).astype(int)
-    
-    # Separera månad från ÅrMånad
-    df['Månad'] = df['ÅrMånad'] % 100
-    
-    return df
+# Året som kundmålen gäller när målarket inte har någon År-kolumn
+MÅLÅR = 2025
 
+# Anskaffningskanaler: (id, visningsnamn)
+KANALER = [
+    ('alla', 'Alla kanaler'),
+    ('fortnox.se', 'Fortnox.Se'),
+    ('fortnox', 'Fortnox (Säljare)'),
+    ('winback', 'Winback'),
+    ('byrå', 'Byrå'),
+    ('övrigt', 'Övrigt')
+]
 
-def ladda_kundmål_data(filpath):
-    """Ladda och förbered kundmål."""
-    df = pd.read_csv(filpath)
-    
-    # Mappa månadsnamn till nummer
-    månad_map = {
-        'Jan': 1, 'Feb': 2, 'Mars': 3, 'Apr': 4, 'Maj': 5, 'Juni': 6,
-        'Juli': 7, 'Aug': 8, 'Sep': 9, 'Okt': 10, 'Nov': 11, 'Dec': 12
-    }
-    df['Månad'] = df['Månad'].map(månad_map)
-    
-    # Rensa numeriska kolumner (non-breaking spaces)
-    def rensa_nummer(värde):
-        if pd.isna(värde):
-            return 0
-        if isinstance(värde, (int, float)):
-            return int(värde)
-        return int(str(värde).replace('\xa0', '').replace(' ', '').replace(',', ''))
-    
-    df['Byrå'] = df['Byrå'].apply(rensa_nummer)
-    df['Winback'] = df['Winback'].apply(rensa_nummer)
-    df['säljare'] = df['säljare'].apply(rensa_nummer)
-    df['fortnox.se'] = df['fortnox.se'].apply(rensa_nummer)
-    df['Cling/Boardeaser/Okänt'] = df['Cling/Boardeaser/Okänt'].apply(rensa_nummer)
-    df['Totalt'] = df['Totalt'].apply(rensa_nummer)
-    
-    # Omforma till long format med kanal-kategorier
-    mål_data = []
-    for _, row in df.iterrows():
-        månad = row['Månad']
-        mål_data.append({'Månad': månad, 'Kanal': 'byrå', 'Mål': row['Byrå']})
-        mål_data.append({'Månad': månad, 'Kanal': 'winback', 'Mål': row['Winback']})
-        mål_data.append({'Månad': månad, 'Kanal': 'fortnox', 'Mål': row['säljare']})
-        mål_data.append({'Månad': månad, 'Kanal': 'fortnox.se', 'Mål': row['fortnox.se']})
-        mål_data.append({'Månad': månad, 'Kanal': 'övrigt', 'Mål': row['Cling/Boardeaser/Okänt']})
-        mål_data.append({'Månad': månad, 'Kanal': 'alla', 'Mål': row['Totalt']})
-    
-    return pd.DataFrame(mål_data)
 
+# Ersätter sidans showContent vid klientrendering: rendera vald vy, månad och kanal från JSON-datan
+KLIENT_VISNING_JS = """<script>
+        function showContent() {
+            const nyckel = currentView === 'nya' ? `nya_${currentYear}_${currentMonth}_${currentChannel}` : `netto_${currentYear}_${currentMonth}`;
+            const vy = DASHBOARD_DATA.vyer[nyckel];
+            const [rubrik, underrubrik] = vy.rubriker;
+            document.getElementById('klient-kpi').innerHTML = sektion(rubrik, underrubrik,
+                '<div class="kpi-grid">' + kpiKortKundflöde(vy.kpi, currentMonth, currentYear) + '</div>');
+            document.getElementById('klient-tabeller').innerHTML = sektion(null, null,
+                '<div class="tables-grid">' + vy.tabeller.map(tabellKundflöde).join('') + '</div>');
+        }
+        showContent();
+    </script>"""
 
-def filtrera_period(df, år, månad):
-    """Filtrera data för en specifik period."""
-    return df[(df['År'] == år) & (df['Månad'] == månad)].copy()
 
+def ladda_nya_kunder_data(filpath, radblock=None):
+    """Ladda och förbered data för nya kunder (strömmande och aggregerat med radblock)."""
+    return indexera_perioder(läs_csv(filpath, förbered_nya_kunder, radblock=radblock))
 
-def filtrera_kanal(df, kanal):
-    """Filtrera nya kunder för en specifik anskaffningskanal."""
-    if kanal == 'alla':
-        return df
-    return df[df['Anskaffningskanal'] == kanal].copy()
 
+def ladda_kundstock_data(filer, radblock=None):
+    """Ladda och kombinera kundstocken från en fil per år ({år: fil})."""
+    ramar = []
+    for år, filpath in sorted(filer.items()):
+        df = läs_csv(filpath, förbered_kundstock, radblock=radblock)
+        # Lägg till år-information
+        df['År'] = np.int16(år)
+        ramar.append(df)
+    
+    # Kombinera (med gemensamma kategorier så att dimensionerna förblir kategoriska)
+    return indexera_perioder(slå_samman_ramar(ramar))
 
-def beräkna_nya_kunder_kpi(df):
-    """Beräkna KPI:er för nya kunder."""
-    return {
-        'Nya kunder': int(df['Nya kunder'].sum()),
-    }
 
+def ladda_kundmål_data(filpath):
+    """Ladda och förbered kundmål."""
+    return läs_csv(filpath, förbered_kundmål)
 
-def beräkna_kundstock_kpi(df):
-    """Beräkna KPI:er för kundstock."""
+
+def kundmål_per_period(df_mål, år=MÅLÅR):
+    """
+    Kundmålen som uppslag {(år, månad, kanal): mål}.
+
+    Mål utan år (målark utan År-kolumn) gäller för år. Perioder och kanaler
+    utan mål saknas i uppslaget.
+    """
+    år_kolumn = df_mål['År'] if 'År' in df_mål.columns else np.full(len(df_mål), år)
     return {
-        'Total kundstock': int(df['Antal kunder'].sum()),
+        (int(mål_år), int(månad), kanal): int(mål)
+        for mål_år, månad, kanal, mål in zip(år_kolumn, df_mål['Månad'], df_mål['Kanal'], df_mål['Mål'])
+        if pd.notna(månad) and pd.notna(mål)
     }
 
 
-def jämför_perioder(kpi_aktuell, kpi_jämförelse):
-    """Jämför två perioder och returnera förändringarna."""
-    jämförelse = {}
-    
-    for nyckel in kpi_aktuell.keys():
-        värde_aktuell = kpi_aktuell[nyckel]
-        värde_jämförelse = kpi_jämförelse.get(nyckel, 0)
-        
-        förändring = värde_aktuell - värde_jämförelse
-        
-        if värde_jämförelse > 0:
-            förändring_procent = ((värde_aktuell - värde_jämförelse) / värde_jämförelse) * 100
-        else:
-            förändring_procent = 0 if värde_aktuell == 0 else 100
-        
-        jämförelse[nyckel] = {
-            'Aktuell': värde_aktuell,
-            'Jämförelse': värde_jämförelse,
-            'Förändring': förändring,
-            'Förändring%': förändring_procent,
-        }
-    
-    return jämförelse
+# Dimensionerna i vyernas tabeller - nya kunder visar även kanalfördelningen
+KUNDSTOCKSDIMENSIONER = ['KundTyp', 'Antal anställda', 'SNI', 'Bolagform', 'Omsättningsintervall']
+NYKUNDSDIMENSIONER = ['Anskaffningskanal'] + KUNDSTOCKSDIMENSIONER
 
+# Dimensioner där "Okänd"/"Okänt" inte visas i tabellerna
+DIMENSIONER_UTAN_OKÄND = ['SNI', 'Omsättningsintervall', 'Antal anställda']
 
-def generera_kpi_card_kombinerad(titel, värde_aktuell, värde_yoy, värde_mom, 
-                                 förändr_yoy, förändr_mom, förändr_yoy_pct, förändr_mom_pct,
-                                 månad=10, år=2025, mål=None):
-    """Generera HTML för ett kombinerat KPI-kort med både YoY och MoM samt mål."""
-    
-    månadsnamn = {
-        1: "Jan", 2: "Feb", 3: "Mar", 4: "Apr", 5: "Maj", 6: "Jun",
-        7: "Jul", 8: "Aug", 9: "Sep", 10: "Okt", 11: "Nov", 12: "Dec"
-    }
-    
-    mom_månad = 12 if månad == 1 else månad - 1
-    mom_år = år - 1 if månad == 1 else år
-    yoy_år = år - 1
-    
-    värde_text = f"{int(värde_aktuell):,}"
-    yoy_text = f"vs {månadsnamn[månad]} {yoy_år}: {int(värde_yoy):,}"
-    mom_text = f"vs {månadsnamn[mom_månad]} {mom_år}: {int(värde_mom):,}"
-    
-    yoy_förändring_text = f"{förändr_yoy_pct:+.1f}% ({förändr_yoy:+,})"
-    mom_förändring_text = f"{förändr_mom_pct:+.1f}% ({förändr_mom:+,})"
-    
-    yoy_positiv = förändr_yoy > 0
-    mom_positiv = förändr_mom > 0
-    
-    yoy_pil = "↑" if yoy_positiv else "↓" if förändr_yoy < 0 else "→"
-    yoy_färg = "positive" if yoy_positiv else "negative" if förändr_yoy < 0 else "neutral"
-    
-    mom_pil = "↑" if mom_positiv else "↓" if förändr_mom < 0 else "→"
-    mom_färg = "positive" if mom_positiv else "negative" if förändr_mom < 0 else "neutral"
-    
-    # Lägg till målrad om mål finns
-    mål_html = ""
-    if mål is not None and mål > 0:
-        uppfyllelse = (värde_aktuell / mål) * 100
-        mål_diff = värde_aktuell - mål
-        mål_uppnått = uppfyllelse >= 100
-        mål_pil = "✓" if mål_uppnått else "✗"
-        mål_färg = "positive" if mål_uppnått else "negative"
-        mål_html = f"""
-            <div class="comparison-row">
-                <span class="comparison-label">Mål:</span>
-                <span class="comparison-value">{int(mål):,}</span>
-                <span class="kpi-change-inline {mål_färg}">
-                    <span class="arrow-small">{mål_pil}</span>
-                    {uppfyllelse:.1f}% ({mål_diff:+,})
-                </span>
-            </div>"""
-    
-    return f"""
-    <div class="kpi-card">
-        <div class="kpi-title">{titel}</div>
-        <div class="kpi-value">{värde_text}</div>
-        <div class="kpi-comparisons">
-            <div class="comparison-row">
-                <span class="comparison-label">YoY:</span>
-                <span class="comparison-value">{yoy_text}</span>
-                <span class="kpi-change-inline {yoy_färg}">
-                    <span class="arrow-small">{yoy_pil}</span>
-                    {yoy_förändring_text}
-                </span>
-            </div>
-            <div class="comparison-row">
-                <span class="comparison-label">MoM:</span>
-                <span class="comparison-value">{mom_text}</span>
-                <span class="kpi-change-inline {mom_färg}">
-                    <span class="arrow-small">{mom_pil}</span>
-                    {mom_förändring_text}
-                </span>
-            </div>{mål_html}
-        </div>
-    </div>
+
+def bygg_kundkuber(df_nya, df_stock):
     """
+    Periodmatriser (se rapportmotor.bygg_periodmatris) för alla vyer, en per dimension.
+
+    Nya kunder summeras per anskaffningskanal och kundstocken utan kanal,
+    med alla dimensioner i ett gemensamt pass per ram. Dimensionen None ger
+    vyernas totaler till KPI-korten. Med matriserna byggda en gång är varje
+    vy (period och kanal) bara ett uttag ur dem.
+    """
+    return {
+        'nya': bygg_periodmatriser(df_nya, [None] + NYKUNDSDIMENSIONER, ['Nya kunder'],
+                                   filter_kolumn='Anskaffningskanal'),
+        'stock': bygg_periodmatriser(df_stock, [None] + KUNDSTOCKSDIMENSIONER, ['Antal kunder']),
+    }
 
 
 def sortera_omsättningsintervall(intervall_str):
@@ -250,118 +149,50 @@ def sortera_omsättningsintervall(intervall_str):
     return 999999999
 
 
-def analysera_dimension_nya_kunder(df_aktuell, df_yoy, df_mom, dimension, top_n=10):
-    """Analysera en dimension för nya kunder med YoY och MoM."""
-    
-    # Filtrera bort "Okänd" och "Okänt" för SNI, Omsättningsintervall och Antal anställda
-    if dimension in ['SNI', 'Omsättningsintervall', 'Antal anställda']:
-        df_aktuell = df_aktuell[~df_aktuell[dimension].isin(['Okänd', 'Okänt'])].copy()
-        df_yoy = df_yoy[~df_yoy[dimension].isin(['Okänd', 'Okänt'])].copy()
-        df_mom = df_mom[~df_mom[dimension].isin(['Okänd', 'Okänt'])].copy()
-    
-    # Aktuell period
-    aktuell = df_aktuell.groupby(dimension).agg({
-        'Nya kunder': 'sum'
-    }).reset_index()
-    
-    # YoY
-    yoy = df_yoy.groupby(dimension).agg({
-        'Nya kunder': 'sum'
-    }).reset_index()
-    yoy = yoy.rename(columns={'Nya kunder': 'Nya kunder_yoy'})
-    
-    # MoM
-    mom = df_mom.groupby(dimension).agg({
-        'Nya kunder': 'sum'
-    }).reset_index()
-    mom = mom.rename(columns={'Nya kunder': 'Nya kunder_mom'})
-    
-    # Slå ihop
-    result = aktuell.merge(yoy, on=dimension, how='left').merge(mom, on=dimension, how='left')
-    result = result.fillna(0)
-    
-    # Beräkna förändringar
-    result['YoY_diff'] = result['Nya kunder'] - result['Nya kunder_yoy']
-    result['MoM_diff'] = result['Nya kunder'] - result['Nya kunder_mom']
-    
-    result['YoY%'] = result.apply(
-        lambda row: ((row['Nya kunder'] - row['Nya kunder_yoy']) / row['Nya kunder_yoy'] * 100) 
-        if row['Nya kunder_yoy'] > 0 else (100 if row['Nya kunder'] > 0 else 0),
-        axis=1
-    )
-    
-    result['MoM%'] = result.apply(
-        lambda row: ((row['Nya kunder'] - row['Nya kunder_mom']) / row['Nya kunder_mom'] * 100) 
-        if row['Nya kunder_mom'] > 0 else (100 if row['Nya kunder'] > 0 else 0),
-        axis=1
+def analysera_dimension(matris, år, månad, kanal=None, top_n=10):
+    """
+    Analysera en dimension för nya kunder eller kundstock med YoY och MoM ur dess periodmatris.
+
+    Bara värden som finns i aktuell period visas. Omsättningsintervall sorteras
+    på intervallens storlek, övriga dimensioner fallande på måttet.
+    """
+    dimension, (mått,) = matris['dimension'], matris['mått']
+    return jämför_i_matris(
+        matris, år, månad, kanal, top_n=top_n, sortera_efter=mått, bara_aktuella=True,
+        sorteringsnyckel=sortera_omsättningsintervall if dimension == 'Omsättningsintervall' else None,
+        exkludera_värden=['Okänd', 'Okänt'] if dimension in DIMENSIONER_UTAN_OKÄND else None,
     )
-    
-    # Sortera och begränsa
-    if dimension == 'Omsättningsintervall':
-        # Sortera omsättningsintervall efter numeriskt värde
-        result['_sort_key'] = result[dimension].apply(sortera_omsättningsintervall)
-        result = result.sort_values('_sort_key').drop('_sort_key', axis=1).head(top_n)
-    else:
-        result = result.sort_values('Nya kunder', ascending=False).head(top_n)
-    
-    return result
 
 
-def analysera_dimension_kundstock(df_aktuell, df_yoy, df_mom, dimension, top_n=10):
-    """Analysera en dimension för kundstock med YoY och MoM."""
-    
-    # Filtrera bort "Okänd" och "Okänt" för SNI, Omsättningsintervall och Antal anställda
-    if dimension in ['SNI', 'Omsättningsintervall', 'Antal anställda']:
-        df_aktuell = df_aktuell[~df_aktuell[dimension].isin(['Okänd', 'Okänt'])].copy()
-        df_yoy = df_yoy[~df_yoy[dimension].isin(['Okänd', 'Okänt'])].copy()
-        df_mom = df_mom[~df_mom[dimension].isin(['Okänd', 'Okänt'])].copy()
-    
-    # Aktuell period
-    aktuell = df_aktuell.groupby(dimension).agg({
-        'Antal kunder': 'sum'
-    }).reset_index()
-    
-    # YoY
-    yoy = df_yoy.groupby(dimension).agg({
-        'Antal kunder': 'sum'
-    }).reset_index()
-    yoy = yoy.rename(columns={'Antal kunder': 'Antal kunder_yoy'})
-    
-    # MoM
-    mom = df_mom.groupby(dimension).agg({
-        'Antal kunder': 'sum'
-    }).reset_index()
-    mom = mom.rename(columns={'Antal kunder': 'Antal kunder_mom'})
-    
-    # Slå ihop
-    result = aktuell.merge(yoy, on=dimension, how='left').merge(mom, on=dimension, how='left')
-    result = result.fillna(0)
-    
-    # Beräkna förändringar
-    result['YoY_diff'] = result['Antal kunder'] - result['Antal kunder_yoy']
-    result['MoM_diff'] = result['Antal kunder'] - result['Antal kunder_mom']
-    
-    result['YoY%'] = result.apply(
-        lambda row: ((row['Antal kunder'] - row['Antal kunder_yoy']) / row['Antal kunder_yoy'] * 100) 
-        if row['Antal kunder_yoy'] > 0 else (100 if row['Antal kunder'] > 0 else 0),
-        axis=1
-    )
-    
-    result['MoM%'] = result.apply(
-        lambda row: ((row['Antal kunder'] - row['Antal kunder_mom']) / row['Antal kunder_mom'] * 100) 
-        if row['Antal kunder_mom'] > 0 else (100 if row['Antal kunder'] > 0 else 0),
-        axis=1
-    )
-    
-    # Sortera och begränsa
-    if dimension == 'Omsättningsintervall':
-        # Sortera omsättningsintervall efter numeriskt värde
-        result['_sort_key'] = result[dimension].apply(sortera_omsättningsintervall)
-        result = result.sort_values('_sort_key').drop('_sort_key', axis=1).head(top_n)
-    else:
-        result = result.sort_values('Antal kunder', ascending=False).head(top_n)
-    
-    return result
+# Mallar för en rad i nykunds- och kundstockstabellerna
+TABELLRAD_NYA_KUNDER_MALL = """
+        <tr>
+            <td>{namn}</td>
+            <td style="text-align: right;">{antal:,}</td>
+            <td style="text-align: right;" class="{yoy_klass}">{yoy:+.1f}%</td>
+            <td style="text-align: right;" class="{mom_klass}">{mom:+.1f}%</td>
+        </tr>
+        """
+
+TABELLRAD_KUNDFLÖDE_MALL = """
+        <tr>
+            <td>{namn}</td>
+            <td style="text-align: right;">{ingående:,}</td>
+            <td style="text-align: right;">{nya:,}</td>
+            <td style="text-align: right;">{tappade:,}</td>
+            <td style="text-align: right;" class="{netto_klass}">{netto:+,}</td>
+            <td style="text-align: right;">{churn:.1f}%</td>
+        </tr>
+        """
+
+TABELLRAD_KUNDSTOCK_MALL = """
+        <tr>
+            <td>{namn}</td>
+            <td style="text-align: right;">{antal:,}</td>
+            <td style="text-align: right;" class="{yoy_klass}">{yoy:+,}</td>
+            <td style="text-align: right;" class="{mom_klass}">{mom:+,}</td>
+        </tr>
+        """
 
 
 def generera_tabell_nya_kunder(titel, df, dimension_namn, max_rader=10):
@@ -377,19 +208,13 @@ def generera_tabell_nya_kunder(titel, df, dimension_namn, max_rader=10):
     
     df = df.head(max_rader)
     
-    rows_html = ""
-    for _, rad in df.iterrows():
-        yoy_klass = "positive" if rad['YoY_diff'] > 0 else "negative" if rad['YoY_diff'] < 0 else "neutral"
-        mom_klass = "positive" if rad['MoM_diff'] > 0 else "negative" if rad['MoM_diff'] < 0 else "neutral"
-        
-        rows_html += f"""
-        <tr>
-            <td>{rad[dimension_namn]}</td>
-            <td style="text-align: right;">{int(rad['Nya kunder']):,}</td>
-            <td style="text-align: right;" class="{yoy_klass}">{rad['YoY%']:+.1f}%</td>
-            <td style="text-align: right;" class="{mom_klass}">{rad['MoM%']:+.1f}%</td>
-        </tr>
-        """
+    rows_html = rendera_rader(
+        TABELLRAD_NYA_KUNDER_MALL,
+        namn=df[dimension_namn],
+        antal=heltal(df['Nya kunder']),
+        yoy_klass=förändringsklass(df['Nya kunder_yoy_diff']), yoy=df['Nya kunder_yoy%'],
+        mom_klass=förändringsklass(df['Nya kunder_mom_diff']), mom=df['Nya kunder_mom%'],
+    )
     
     return f"""
     <div class="table-container">
@@ -424,19 +249,13 @@ def generera_tabell_kundstock(titel, df, dimension_namn, max_rader=10):
     
     df = df.head(max_rader)
     
-    rows_html = ""
-    for _, rad in df.iterrows():
-        yoy_klass = "positive" if rad['YoY_diff'] > 0 else "negative" if rad['YoY_diff'] < 0 else "neutral"
-        mom_klass = "positive" if rad['MoM_diff'] > 0 else "negative" if rad['MoM_diff'] < 0 else "neutral"
-        
-        rows_html += f"""
-        <tr>
-            <td>{rad[dimension_namn]}</td>
-            <td style="text-align: right;">{int(rad['Antal kunder']):,}</td>
-            <td style="text-align: right;" class="{yoy_klass}">{int(rad['YoY_diff']):+,}</td>
-            <td style="text-align: right;" class="{mom_klass}">{int(rad['MoM_diff']):+,}</td>
-        </tr>
-        """
+    rows_html = rendera_rader(
+        TABELLRAD_KUNDSTOCK_MALL,
+        namn=df[dimension_namn],
+        antal=heltal(df['Antal kunder']),
+        yoy_klass=förändringsklass(df['Antal kunder_yoy_diff']), yoy=heltal(df['Antal kunder_yoy_diff']),
+        mom_klass=förändringsklass(df['Antal kunder_mom_diff']), mom=heltal(df['Antal kunder_mom_diff']),
+    )
     
     return f"""
     <div class="table-container">
@@ -458,227 +277,354 @@ def generera_tabell_kundstock(titel, df, dimension_namn, max_rader=10):
     """
 
 
-def generera_innehåll_nya_kunder(df_nya, df_mål, månad, år, kanal='alla'):
-    """Generera innehåll för NYA KUNDER vy."""
+def generera_tabell_kundflöde(titel, df, dimension_namn, max_rader=10):
+    """Generera HTML-tabell för kundflödet: ingående stock, nya, tappade, netto och churn."""
     
-    # Filtrera på månad
-    nya_aktuell = filtrera_period(df_nya, år, månad)
-    nya_yoy = filtrera_period(df_nya, år - 1, månad)
-    nya_mom = filtrera_period(df_nya, år - 1 if månad == 1 else år, 12 if månad == 1 else månad - 1)
+    if len(df) == 0:
+        return f"""
+        <div class="table-container">
+            <h3 class="table-title">{titel}</h3>
+            <p style="text-align: center; color: #6B7280; padding: 2rem;">Ingen data tillgänglig</p>
+        </div>
+        """
+    
+    df = df.head(max_rader)
+    
+    rows_html = rendera_rader(
+        TABELLRAD_KUNDFLÖDE_MALL,
+        namn=df[dimension_namn],
+        ingående=heltal(df['Ingående']), nya=heltal(df['Nya']), tappade=heltal(df['Tappade']),
+        netto_klass=förändringsklass(df['Netto']), netto=heltal(df['Netto']),
+        churn=df['Churn%'],
+    )
+    
+    return f"""
+    <div class="table-container">
+        <h3 class="table-title">{titel}</h3>
+        <table>
+            <thead>
+                <tr>
+                    <th>{dimension_namn}</th>
+                    <th style="text-align: right;">Ingående</th>
+                    <th style="text-align: right;">Nya</th>
+                    <th style="text-align: right;">Tappade</th>
+                    <th style="text-align: right;">Netto</th>
+                    <th style="text-align: right;">Churn</th>
+                </tr>
+            </thead>
+            <tbody>
+                {rows_html}
+            </tbody>
+        </table>
+    </div>
+    """
+
+
+def _kpi_ur_matris(matris, år, månad, nyckel, kanal=None):
+    """Vyns KPI för aktuell period, YoY och MoM ur totalmatrisen: ({nyckel: värde}, ...)."""
+    summor = matris_summor(matris, år, månad, kanal)
+    (mått,) = matris['mått']
+    return tuple({nyckel: summor[period][mått]} for period in ('aktuell', 'yoy', 'mom'))
+
+
+def beräkna_innehåll_nya_kunder(kuber, mål, månad, år, kanal='alla'):
+    """
+    Beräkna KPI och dimensionstabeller för NYA KUNDER vy ur nykundsmatriserna (se bygg_kundkuber).
+
+    mål är kundmålen som uppslag (se kundmål_per_period), eller None.
+    """
     
-    # Filtrera på kanal
-    nya_aktuell = filtrera_kanal(nya_aktuell, kanal)
-    nya_yoy = filtrera_kanal(nya_yoy, kanal)
-    nya_mom = filtrera_kanal(nya_mom, kanal)
+    # Kanalen väljs i matrisernas filteraxel - None är alla kanaler
+    kanal_filter = None if kanal == 'alla' else kanal
     
     # KPI
-    kpi_nya_aktuell = beräkna_nya_kunder_kpi(nya_aktuell)
-    kpi_nya_yoy = beräkna_nya_kunder_kpi(nya_yoy)
-    kpi_nya_mom = beräkna_nya_kunder_kpi(nya_mom)
+    kpi_nya_aktuell, kpi_nya_yoy, kpi_nya_mom = _kpi_ur_matris(kuber[None], år, månad, 'Nya kunder', kanal_filter)
     
     jmf_yoy = jämför_perioder(kpi_nya_aktuell, kpi_nya_yoy)
     jmf_mom = jämför_perioder(kpi_nya_aktuell, kpi_nya_mom)
     
     # Hämta mål för denna månad och kanal
-    mål_värde = None
-    if df_mål is not None:
-        mål_rad = df_mål[(df_mål['Månad'] == månad) & (df_mål['Kanal'] == kanal)]
-        if not mål_rad.empty:
-            mål_värde = int(mål_rad.iloc[0]['Mål'])
-    
-    # KPI-kort - endast totalen
-    kpi_html = f"""
-        <div class="kpi-grid">
-            {generera_kpi_card_kombinerad("Nya kunder", 
-                kpi_nya_aktuell['Nya kunder'], kpi_nya_yoy['Nya kunder'], kpi_nya_mom['Nya kunder'],
-                jmf_yoy['Nya kunder']['Förändring'], jmf_mom['Nya kunder']['Förändring'],
-                jmf_yoy['Nya kunder']['Förändring%'], jmf_mom['Nya kunder']['Förändring%'],
-                månad=månad, år=år, mål=mål_värde)}
-        </div>
-    """
-    
-    # Tabeller för alla dimensioner
-    kanal_analys = analysera_dimension_nya_kunder(nya_aktuell, nya_yoy, nya_mom, 'Anskaffningskanal', top_n=6)
-    kundtyp_analys = analysera_dimension_nya_kunder(nya_aktuell, nya_yoy, nya_mom, 'KundTyp', top_n=8)
-    anstallda_analys = analysera_dimension_nya_kunder(nya_aktuell, nya_yoy, nya_mom, 'Antal anställda', top_n=8)
-    sni_analys = analysera_dimension_nya_kunder(nya_aktuell, nya_yoy, nya_mom, 'SNI', top_n=10)
-    bolagsform_analys = analysera_dimension_nya_kunder(nya_aktuell, nya_yoy, nya_mom, 'Bolagform', top_n=6)
-    omsattning_analys = analysera_dimension_nya_kunder(nya_aktuell, nya_yoy, nya_mom, 'Omsättningsintervall', top_n=8)
-    
+    mål_värde = mål.get((år, månad, kanal)) if mål is not None else None
+    
+    # Tabeller för alla dimensioner: (titel, analys, dimension, max_rader)
+    def analysera(titel, dimension, top_n):
+        with steg('analysera_dimension'):
+            return (titel, analysera_dimension(kuber[dimension], år, månad, kanal_filter, top_n=top_n), dimension, top_n)
+    
+    tabeller = [
+        analysera("Kundtyp", 'KundTyp', 8),
+        analysera("Antal Anställda", 'Antal anställda', 8),
+        analysera("SNI-kod (Bransch)", 'SNI', 10),
+        analysera("Bolagsform", 'Bolagform', 6),
+        analysera("Omsättningsintervall", 'Omsättningsintervall', 8),
+    ]
     if kanal == 'alla':
-        # Visa alla tabeller inklusive kanalfördelning
-        tabeller_html = f"""
-            <div class="tables-grid">
-                {generera_tabell_nya_kunder("Anskaffningskanal", kanal_analys, 'Anskaffningskanal', 6)}
-                {generera_tabell_nya_kunder("Kundtyp", kundtyp_analys, 'KundTyp', 8)}
-                {generera_tabell_nya_kunder("Antal Anställda", anstallda_analys, 'Antal anställda', 8)}
-                {generera_tabell_nya_kunder("SNI-kod (Bransch)", sni_analys, 'SNI', 10)}
-                {generera_tabell_nya_kunder("Bolagsform", bolagsform_analys, 'Bolagform', 6)}
-                {generera_tabell_nya_kunder("Omsättningsintervall", omsattning_analys, 'Omsättningsintervall', 8)}
-            </div>
-        """
-    else:
-        # Om en kanal är vald, visa breakdown per andra dimensioner (utan kanal)
-        tabeller_html = f"""
-            <div class="tables-grid">
-                {generera_tabell_nya_kunder("Kundtyp", kundtyp_analys, 'KundTyp', 8)}
-                {generera_tabell_nya_kunder("Antal Anställda", anstallda_analys, 'Antal anställda', 8)}
-                {generera_tabell_nya_kunder("SNI-kod (Bransch)", sni_analys, 'SNI', 10)}
-                {generera_tabell_nya_kunder("Bolagsform", bolagsform_analys, 'Bolagform', 6)}
-                {generera_tabell_nya_kunder("Omsättningsintervall", omsattning_analys, 'Omsättningsintervall', 8)}
-            </div>
-        """
+        # Visa kanalfördelningen först - om en kanal är vald visas bara övriga dimensioner
+        tabeller.insert(0, analysera("Anskaffningskanal", 'Anskaffningskanal', 6))
     
-    return kpi_html, tabeller_html
+    return {
+        'typ': 'nya', 'månad': månad, 'år': år, 'mål': mål_värde, 'tabeller': tabeller,
+        # KPI-kort - endast totalen
+        'kpi': _kpi_värden("Nya kunder", 'Nya kunder', kpi_nya_aktuell, kpi_nya_yoy, kpi_nya_mom, jmf_yoy, jmf_mom),
+    }
 
 
-def generera_innehåll_netto(df_stock, månad, år):
-    """Generera innehåll för NETTOFÖRÄNDRING vy."""
-    
-    # Kundstock
-    stock_aktuell = filtrera_period(df_stock, år, månad)
-    stock_yoy = filtrera_period(df_stock, år - 1, månad)
-    stock_mom = filtrera_period(df_stock, år - 1 if månad == 1 else år, 12 if månad == 1 else månad - 1)
+def beräkna_innehåll_netto(kuber, månad, år):
+    """
+    Beräkna KPI, dimensionstabeller och kundflöde för NETTOFÖRÄNDRING vy (se bygg_kundkuber).
+
+    Kundflödet (tappade kunder och churn) härleds ur kundstocken före och
+    efter månaden och månadens nya kunder, se rapportmotor.flöde_per_period.
+    """
+    stock = kuber['stock']
     
     # KPI
-    kpi_stock_aktuell = beräkna_kundstock_kpi(stock_aktuell)
-    kpi_stock_yoy = beräkna_kundstock_kpi(stock_yoy)
-    kpi_stock_mom = beräkna_kundstock_kpi(stock_mom)
+    kpi_stock_aktuell, kpi_stock_yoy, kpi_stock_mom = _kpi_ur_matris(stock[None], år, månad, 'Total kundstock')
     
     jmf_yoy = jämför_perioder(kpi_stock_aktuell, kpi_stock_yoy)
     jmf_mom = jämför_perioder(kpi_stock_aktuell, kpi_stock_mom)
     
-    # KPI-kort
+    # Tabeller per dimension
+    def analysera(titel, dimension, top_n):
+        with steg('analysera_dimension'):
+            return (titel, analysera_dimension(stock[dimension], år, månad, top_n=top_n), dimension, top_n)
+    
+    tabeller = [
+        analysera("Kundtyp", 'KundTyp', 8),
+        analysera("Antal Anställda", 'Antal anställda', 8),
+        analysera("SNI-kod (Bransch)", 'SNI', 10),
+        analysera("Bolagsform", 'Bolagform', 6),
+        analysera("Omsättningsintervall", 'Omsättningsintervall', 8),
+    ]
+    
+    # Kundflöde: de senaste tolv månaderna totalt och månadens tappade kunder per dimension
+    def kundflöde(titel, dimension, top_n):
+        with steg('kundflöde'):
+            flöde = flöde_per_värde(
+                stock[dimension], kuber['nya'][dimension], år, månad, top_n=top_n,
+                exkludera_värden=['Okänd', 'Okänt'] if dimension in DIMENSIONER_UTAN_OKÄND else None,
+            )
+            return (titel, flöde, dimension, top_n)
+    
+    with steg('kundflöde'):
+        per_månad = flöde_per_period(stock[None], kuber['nya'][None], år, månad)
+        per_månad.insert(0, 'Månad', [f"{MÅNADER_KORT[period % 100]} {period // 100}" for period in per_månad.pop('Period')])
+    flöde = [
+        ("Kundflöde senaste 12 månaderna", per_månad, 'Månad', 12),
+        kundflöde("Tappade kunder per kundtyp", 'KundTyp', 8),
+        kundflöde("Tappade kunder per antal anställda", 'Antal anställda', 8),
+        kundflöde("Tappade kunder per bolagsform", 'Bolagform', 6),
+    ]
+    
+    return {
+        'typ': 'stock', 'månad': månad, 'år': år, 'mål': None, 'tabeller': tabeller, 'flöde': flöde,
+        'kpi': _kpi_värden("Total kundstock", 'Total kundstock', kpi_stock_aktuell, kpi_stock_yoy, kpi_stock_mom, jmf_yoy, jmf_mom),
+    }
+
+
+def _kpi_värden(titel, nyckel, kpi_aktuell, kpi_yoy, kpi_mom, jmf_yoy, jmf_mom):
+    """KPI-kortets värden: (titel, aktuell, yoy, mom, diff yoy, diff mom, procent yoy, procent mom)."""
+    return (titel, kpi_aktuell[nyckel], kpi_yoy[nyckel], kpi_mom[nyckel],
+            jmf_yoy[nyckel]['Förändring'], jmf_mom[nyckel]['Förändring'],
+            jmf_yoy[nyckel]['Förändring%'], jmf_mom[nyckel]['Förändring%'])
+
+
+def kpi_kort_kundflöde(vy):
+    """KPI-kortet för en vy, med absoluta förändringar och eventuellt mål."""
+    titel, aktuell, yoy, mom, diff_yoy, diff_mom, procent_yoy, procent_mom = vy['kpi']
+    return kpi_kort(titel, aktuell, yoy, mom, procent_yoy, procent_mom, vy['månad'], vy['år'],
+                    diff_yoy=diff_yoy, diff_mom=diff_mom, mål=vy['mål'])
+
+
+def rendera_vy(vy):
+    """Rendera en beräknad vy (nya kunder eller kundstock) till HTML för KPI-kort och tabeller."""
     kpi_html = f"""
         <div class="kpi-grid">
-            {generera_kpi_card_kombinerad("Total kundstock", 
-                kpi_stock_aktuell['Total kundstock'], kpi_stock_yoy['Total kundstock'], kpi_stock_mom['Total kundstock'],
-                jmf_yoy['Total kundstock']['Förändring'], jmf_mom['Total kundstock']['Förändring'],
-                jmf_yoy['Total kundstock']['Förändring%'], jmf_mom['Total kundstock']['Förändring%'],
-                månad=månad, år=år)}
+            {kpi_kort_kundflöde(vy)}
         </div>
     """
     
-    # Tabeller per dimension
-    kundtyp = analysera_dimension_kundstock(stock_aktuell, stock_yoy, stock_mom, 'KundTyp', top_n=8)
-    anstallda = analysera_dimension_kundstock(stock_aktuell, stock_yoy, stock_mom, 'Antal anställda', top_n=8)
-    sni = analysera_dimension_kundstock(stock_aktuell, stock_yoy, stock_mom, 'SNI', top_n=10)
-    bolagsform = analysera_dimension_kundstock(stock_aktuell, stock_yoy, stock_mom, 'Bolagform', top_n=6)
-    omsattning = analysera_dimension_kundstock(stock_aktuell, stock_yoy, stock_mom, 'Omsättningsintervall', top_n=8)
-    
-    tabeller_html = f"""
+    if vy['typ'] == 'nya':
+        tabeller = "\n                ".join(generera_tabell_nya_kunder(*tabell) for tabell in vy['tabeller'])
+        tabeller_html = f"""
+            <div class="tables-grid">
+                {tabeller}
+            </div>
+        """
+    else:
+        tabeller = "\n            ".join(
+            [generera_tabell_kundstock(*tabell) for tabell in vy['tabeller']] +
+            [generera_tabell_kundflöde(*tabell) for tabell in vy['flöde']]
+        )
+        tabeller_html = f"""
         <div class="tables-grid">
-            {generera_tabell_kundstock("Kundtyp", kundtyp, 'KundTyp', 8)}
-            {generera_tabell_kundstock("Antal Anställda", anstallda, 'Antal anställda', 8)}
-            {generera_tabell_kundstock("SNI-kod (Bransch)", sni, 'SNI', 10)}
-            {generera_tabell_kundstock("Bolagsform", bolagsform, 'Bolagform', 6)}
-            {generera_tabell_kundstock("Omsättningsintervall", omsattning, 'Omsättningsintervall', 8)}
+            {tabeller}
         </div>
     """
     
     return kpi_html, tabeller_html
 
 
+def vydata(vy):
+    """Forma om en beräknad vy till kompakt JSON-data för klientrendering."""
+    titel, aktuell, yoy, mom, diff_yoy, diff_mom, procent_yoy, procent_mom = vy['kpi']
+    kpi = [titel, int(aktuell), int(yoy), int(mom), int(diff_yoy), int(diff_mom),
+           avrunda(procent_yoy), avrunda(procent_mom), vy['mål']]
+    
+    mått = 'Nya kunder' if vy['typ'] == 'nya' else 'Antal kunder'
+    tabeller = []
+    for titel, df, dimension, max_rader in vy['tabeller']:
+        df = df.head(max_rader)
+        if vy['typ'] == 'nya':
+            rader = [
+                [str(namn), int(antal), int(d_yoy), int(d_mom), avrunda(p_yoy), avrunda(p_mom)]
+                for namn, antal, d_yoy, d_mom, p_yoy, p_mom in zip(
+                    df[dimension], df[mått], df[f'{mått}_yoy_diff'], df[f'{mått}_mom_diff'],
+                    df[f'{mått}_yoy%'], df[f'{mått}_mom%'])
+            ]
+        else:
+            # Kundstocken visar bara differenser
+            rader = [
+                [str(namn), int(antal), int(d_yoy), int(d_mom)]
+                for namn, antal, d_yoy, d_mom in zip(
+                    df[dimension], df[mått], df[f'{mått}_yoy_diff'], df[f'{mått}_mom_diff'])
+            ]
+        tabeller.append([vy['typ'], titel, dimension, rader])
+    
+    # Kundflödet: [namn, ingående, nya, tappade, netto, churn%]
+    for titel, df, dimension, max_rader in vy.get('flöde', []):
+        df = df.head(max_rader)
+        rader = [
+            [str(namn), int(ingående), int(nya), int(tappade), int(netto), avrunda(churn)]
+            for namn, ingående, nya, tappade, netto, churn in zip(
+                df[dimension], df['Ingående'], df['Nya'], df['Tappade'], df['Netto'], df['Churn%'])
+        ]
+        tabeller.append(['flöde', titel, dimension, rader])
+    
+    return {'kpi': kpi, 'tabeller': tabeller}
+
+
+def exportrader(vy, vy_typ, kanal):
+    """Vyns KPI, tabeller och kundflöde som rader för aggregatexporten."""
+    titel, aktuell, yoy, mom, diff_yoy, diff_mom, procent_yoy, procent_mom = vy['kpi']
+    kpi = [aggregatexport.kpirad(titel, aktuell, yoy, mom, diff_yoy, diff_mom, procent_yoy, procent_mom, mål=vy['mål'])]
+    return aggregatexport.vyrader(vy_typ, vy['år'], vy['månad'], kanal, kpi, vy['tabeller'] + vy.get('flöde', []))
+
+
+def beräkna_vy_cachad(delad, vy_typ, år, månad, kanal):
+    """
+    Beräkna en vy ur de delade periodmatriserna via aggregatcachen.
+
+    Den beräknade vyn (KPI:er och analyserade dimensioner) nycklas på
+    källfilerna och koden.
+    """
+    källor, version = delad['källor'], delad['kodversion']
+    if vy_typ == 'nya':
+        return aggregatcache.hämta(
+            ('nykundsvy', källor['nya'], källor['mål'], version, år, månad, kanal),
+            lambda: beräkna_innehåll_nya_kunder(delad['kuber']['nya'], delad['mål'], månad, år, kanal)
+        )
+    return aggregatcache.hämta(
+        ('nettovy', källor['stock'], källor['nya'], version, år, månad),
+        lambda: beräkna_innehåll_netto(delad['kuber'], månad, år)
+    )
+
+
+def generera_vy(delad, vy_typ, år, månad, kanal):
+    """
+    Generera en vy ur de delade periodmatriserna - HTML, eller JSON-data vid klientrendering -
+    och, när delad['export'] är satt, vyns rader för aggregatexporten (annars None).
+    """
+    vy = beräkna_vy_cachad(delad, vy_typ, år, månad, kanal)
+    if delad['klientrendering']:
+        with steg('vydata'):
+            data = vydata(vy)
+        innehåll = data['kpi'], data['tabeller']
+    else:
+        with steg('rendera_vy'):
+            innehåll = rendera_vy(vy)
+    return innehåll + (exportrader(vy, vy_typ, kanal) if delad['export'] else None,)
+
+
 # Fortsättning följer i nästa del...
 print("Script loaded, generating dashboard...")
 
 
-def generera_dashboard():
-    """Huvudfunktion för att generera dashboard."""
-    
-    # Hitta filer
-    nya_kunder_fil = Path(__file__).parent / "3726d67f-37f5-4502-8e8d-c191ed5167cc - Sheet1.csv"
-    kundstock_2024_fil = Path(__file__).parent / "2024-kundstock - Sheet1.csv"
-    kundstock_2025_fil = Path(__file__).parent / "2025 kundstock - Sheet1.csv"
-    kundmål_fil = Path(__file__).parent / "kundmål - Sheet1.csv"
-    
-    # Ladda data
-    df_nya = ladda_nya_kunder_data(nya_kunder_fil)
-    df_stock = ladda_kundstock_data(kundstock_2024_fil, kundstock_2025_fil)
-    df_mål = ladda_kundmål_data(kundmål_fil)
-    
-    # Definiera månader
-    månader = [
-        (1, "Januari"), (2, "Februari"), (3, "Mars"), (4, "April"),
-        (5, "Maj"), (6, "Juni"), (7, "Juli"), (8, "Augusti"),
-        (9, "September"), (10, "Oktober")
-    ]
-    
-    # Definiera kanaler
-    kanaler = [
-        ('alla', 'Alla kanaler'),
-        ('fortnox.se', 'Fortnox.Se'),
-        ('fortnox', 'Fortnox (Säljare)'),
-        ('winback', 'Winback'),
-        ('byrå', 'Byrå'),
-        ('övrigt', 'Övrigt')
-    ]
-    
-    # Generera innehåll för alla månader, vyer och kanaler
-    innehåll_map = {}
-    
-    for månad_nr, månad_namn in månader:
-        # NYA KUNDER vy - för alla kanaler
-        for kanal_id, kanal_namn in kanaler:
-            kpi, tab = generera_innehåll_nya_kunder(df_nya, df_mål, månad_nr, 2025, kanal_id)
-            key = f"nya_{månad_nr}_{kanal_id}"
-            innehåll_map[key] = {'kpi': kpi, 'tabeller': tab, 'månad': månad_namn, 'kanal': kanal_namn}
-        
-        # NETTO vy - ingen kanalfiltrering
-        kpi, tab = generera_innehåll_netto(df_stock, månad_nr, 2025)
-        key = f"netto_{månad_nr}"
-        innehåll_map[key] = {'kpi': kpi, 'tabeller': tab, 'månad': månad_namn}
-    
-    print(f"Generated {len(innehåll_map)} content combinations")
-    
-    # Bygg HTML dynamiskt
-    kpi_sections = ""
-    table_sections = ""
-    
-    # Nya kunder - alla kombinationer av månad och kanal
-    for månad_nr, månad_namn in månader:
-        for kanal_id, kanal_namn in kanaler:
-            key = f"nya_{månad_nr}_{kanal_id}"
-            data = innehåll_map[key]
-            display = "block" if månad_nr == 10 and kanal_id == "alla" else "none"
+def bygg_html_sektioner(innehåll_map, aktiv):
+    """
+    Bygg HTML-sektionerna (KPI, tabeller) för varje vy, dolda utom nya kunder för
+    alla kanaler under den aktiva perioden (år, månad).
+
+    Sektionerna ges en vy i taget i samma ordning som innehållet: först nya
+    kunder för alla kombinationer av månad och kanal, sedan nettoförändring per
+    månad (ingen kanal).
+    """
+    for data in innehåll_map:
+        år, månad_nr, månad_namn = data['år'], data['månad_nr'], data['månad']
+        if data['typ'] == 'nya':
+            kanal_id, kanal_namn = data['kanal_id'], data['kanal']
+            display = "block" if (år, månad_nr) == tuple(aktiv) and kanal_id == "alla" else "none"
             
-            kpi_sections += f'''
-        <div class="section" data-view="nya" data-month="{månad_nr}" data-channel="{kanal_id}" style="display: {display};">
+            kpi_section = f'''
+        <div class="section" data-view="nya" data-month="{månad_nr}" data-year="{år}" data-channel="{kanal_id}" style="display: {display};">
             <div class="section-header">
-                <h2>Nya kunder - {månad_namn} 2025</h2>
+                <h2>Nya kunder - {månad_namn} {år}</h2>
                 <p class="subtitle">{kanal_namn}</p>
             </div>
             {data['kpi']}
         </div>
         '''
             
-            table_sections += f'''
-        <div class="section" data-view="nya" data-month="{månad_nr}" data-channel="{kanal_id}" style="display: {display};">
+            table_section = f'''
+        <div class="section" data-view="nya" data-month="{månad_nr}" data-year="{år}" data-channel="{kanal_id}" style="display: {display};">
             {data['tabeller']}
         </div>
         '''
-    
-    # Nettoförändring - bara månad (ingen kanal)
-    for månad_nr, månad_namn in månader:
-        key = f"netto_{månad_nr}"
-        data = innehåll_map[key]
-        display = "none"  # Default dold
-        
-        kpi_sections += f'''
-        <div class="section" data-view="netto" data-month="{månad_nr}" style="display: {display};">
+        else:
+            display = "none"  # Default dold
+            
+            kpi_section = f'''
+        <div class="section" data-view="netto" data-month="{månad_nr}" data-year="{år}" style="display: {display};">
             <div class="section-header">
-                <h2>Nettoförändring - {månad_namn} 2025</h2>
+                <h2>Nettoförändring - {månad_namn} {år}</h2>
                 <p class="subtitle">Kundstocksutveckling</p>
             </div>
             {data['kpi']}
         </div>
         '''
-        
-        table_sections += f'''
-        <div class="section" data-view="netto" data-month="{månad_nr}" style="display: {display};">
+            
+            table_section = f'''
+        <div class="section" data-view="netto" data-month="{månad_nr}" data-year="{år}" style="display: {display};">
             {data['tabeller']}
         </div>
         '''
+        
+        yield kpi_section, table_section
+
+
+def bygg_klientsektioner(innehåll_map):
+    """Bygg tomma behållare, vydatan som JSON och skripten som renderar vald vy."""
+    vyer = {}
+    for key, data in innehåll_map.items():
+        if key.startswith('nya_'):
+            rubriker = [f"Nya kunder - {data['månad']} {data['år']}", data['kanal']]
+        else:
+            rubriker = [f"Nettoförändring - {data['månad']} {data['år']}", "Kundstocksutveckling"]
+        vyer[key] = {'rubriker': rubriker, 'kpi': data['kpi'], 'tabeller': data['tabeller']}
+    
+    klient_skript = "\n    ".join([data_skript({'vyer': vyer}), RENDERARE_JS, KLIENT_VISNING_JS])
+    return '<div id="klient-kpi"></div>', '<div id="klient-tabeller"></div>', klient_skript
+
+
+def sidmall(perioder, aktiv, klient_skript=""):
+    """
+    Dashboardsidan med markörer där KPI- och tabellsektionerna skrivs in (se skriv_sida).
+
+    perioder (ÅÅÅÅMM) blir sidans periodfilter, med den aktiva perioden (år, månad) vald.
+    """
+    aktivt_år, aktiv_månad = aktiv
+    # Sektionerna skrivs in vid markörerna när sidan sparas
+    kpi_sections, table_sections = sidmarkör('kpi'), sidmarkör('tabeller')
     
     # Nu resten av HTML (CSS kommer från tidigare script - vi kopierar det)
     html = f'''<!DOCTYPE html>
@@ -687,7 +633,7 @@ def generera_dashboard():
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <meta name="robots" content="noindex, nofollow, noarchive, nosnippet">
-    <title>Kundflödesrapport 2025 - Fortnox</title>
+    <title>Kundflödesrapport {periodrubrik(perioder)} - Fortnox</title>
     <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap" rel="stylesheet">
     <style>
         * {{ margin: 0; padding: 0; box-sizing: border-box; }}
@@ -902,10 +848,10 @@ def generera_dashboard():
     <div id="mainContent" class="content-hidden">
     <div class="container">
         <div class="header">
-            <h1>👥 Kundflödesrapport 2025</h1>
+            <h1>👥 Kundflödesrapport {periodrubrik(perioder)}</h1>
             <div class="header-meta">
                 Genererad: {datetime.now().strftime('%Y-%m-%d %H:%M')} | 
-                <span id="current-period">Oktober 2025</span>
+                <span id="current-period">{MÅNADSNAMN[aktiv_månad]} {aktivt_år}</span>
             </div>
             <a href="oktober_dashboard.html" class="nav-button">📊 Gå till Nykundsförsäljning →</a>
         </div>
@@ -914,16 +860,7 @@ def generera_dashboard():
         <div class="filter-section">
             <span class="filter-label">Välj månad:</span>
             <div class="filter-buttons">
-                <button class="filter-button" onclick="switchMonth(1)" data-month="1">Januari</button>
-                <button class="filter-button" onclick="switchMonth(2)" data-month="2">Februari</button>
-                <button class="filter-button" onclick="switchMonth(3)" data-month="3">Mars</button>
-                <button class="filter-button" onclick="switchMonth(4)" data-month="4">April</button>
-                <button class="filter-button" onclick="switchMonth(5)" data-month="5">Maj</button>
-                <button class="filter-button" onclick="switchMonth(6)" data-month="6">Juni</button>
-                <button class="filter-button" onclick="switchMonth(7)" data-month="7">Juli</button>
-                <button class="filter-button" onclick="switchMonth(8)" data-month="8">Augusti</button>
-                <button class="filter-button" onclick="switchMonth(9)" data-month="9">September</button>
-                <button class="filter-button active" onclick="switchMonth(10)" data-month="10">Oktober</button>
+                {periodknappar(perioder, aktiv)}
             </div>
         </div>
         
@@ -962,7 +899,8 @@ def generera_dashboard():
     </div>
     
     <script>
-        let currentMonth = 10;
+        let currentMonth = {aktiv_månad};
+        let currentYear = {aktivt_år};
         let currentView = 'nya';
         let currentChannel = 'alla';
         
@@ -973,15 +911,16 @@ def generera_dashboard():
         }};
         
         function updatePeriodText() {{
-            document.getElementById('current-period').textContent = monthNames[currentMonth] + ' 2025';
+            document.getElementById('current-period').textContent = monthNames[currentMonth] + ' ' + currentYear;
         }}
         
-        function switchMonth(month) {{
+        function switchMonth(month, year) {{
             currentMonth = month;
+            currentYear = year;
             document.querySelectorAll('[data-month][onclick*="switchMonth"]').forEach(btn => {{
                 btn.classList.remove('active');
             }});
-            document.querySelector(`[data-month="${{month}}"][onclick*="switchMonth"]`).classList.add('active');
+            document.querySelector(`[data-month="${{month}}"][data-year="${{year}}"][onclick*="switchMonth"]`).classList.add('active');
             updatePeriodText();
             showContent();
         }}
@@ -1022,12 +961,12 @@ def generera_dashboard():
             // Visa baserat på vy
             if (currentView === 'nya') {{
                 // Visa för vald månad och kanal
-                document.querySelectorAll(`.section[data-view="nya"][data-month="${{currentMonth}}"][data-channel="${{currentChannel}}"]`).forEach(section => {{
+                document.querySelectorAll(`.section[data-view="nya"][data-month="${{currentMonth}}"][data-year="${{currentYear}}"][data-channel="${{currentChannel}}"]`).forEach(section => {{
                     section.style.display = 'block';
                 }});
             }} else {{
                 // Visa för vald månad (ingen kanal)
-                document.querySelectorAll(`.section[data-view="netto"][data-month="${{currentMonth}}"]`).forEach(section => {{
+                document.querySelectorAll(`.section[data-view="netto"][data-month="${{currentMonth}}"][data-year="${{currentYear}}"]`).forEach(section => {{
                     section.style.display = 'block';
                 }});
             }}
@@ -1035,16 +974,111 @@ def generera_dashboard():
         
         // Initiera
         showContent();
-    </script>
+    </script>{klient_skript}
     </div>
     </div>
 </body>
 </html>'''
+    return html
+
+
+def generera_dashboard(klientrendering=False, arbetare=1, radblock=None, från=None, till=None, senaste=None):
+    """
+    Huvudfunktion för att generera dashboard.
+
+    Med klientrendering=True skrivs vyerna som kompakt JSON i sidan och renderas
+    i webbläsaren när de visas, i stället för att alla vyer förrenderas som HTML.
+
+    arbetare anger hur många processer vyerna genereras i (0 = en per kärna).
+    Resultatet är detsamma som vid seriell körning.
+
+    Med radblock läses nykunds- och kundstocksexporterna strömmande i block om
+    så många rader och aggregeras direkt, så att exporter större än minnet kan användas.
+
+    När aggregatexporten är startad (--export) skrivs varje vys KPI, tabeller
+    och kundflöde till exportfilen när vyn tas emot, se aggregatexport.
+
+    Perioderna som visas hämtas ur nykunds- och kundstocksdatan: som standard
+    alla månader under det senaste året, annars de som väljs med från, till
+    (ÅÅÅÅMM) och senaste (rullande fönster om N månader), se välj_perioder.
+    """
+    
+    # Ladda data
+    with steg('ladda_nya_kunder') as mätning:
+        df_nya = ladda_nya_kunder_data(NYA_KUNDER_FIL, radblock)
+        mätning['rader'] = len(df_nya)
+    with steg('ladda_kundstock') as mätning:
+        df_stock = ladda_kundstock_data(KUNDSTOCK_FILER, radblock)
+        mätning['rader'] = len(df_stock)
+    with steg('ladda_kundmål') as mätning:
+        df_mål = ladda_kundmål_data(KUNDMÅL_FIL)
+        mätning['rader'] = len(df_mål)
+    läge = '.aggregerat' if radblock else ''
+    källor = {
+        'nya': aggregatcache.källa(NYA_KUNDER_FIL, läge=läge),
+        'stock': aggregatcache.källa(*KUNDSTOCK_FILER.values(), läge=läge),
+        'mål': aggregatcache.källa(KUNDMÅL_FIL),
+    }
+    
+    # Perioderna som visas upptäcks ur datan, som (år, månad)
+    perioder_i_datan = perioder_i_data(df_nya, df_stock)
+    if not perioder_i_datan:
+        raise ValueError("Inga perioder i datan - exporterna saknar rader med år och månad")
+    perioder = välj_perioder(perioder_i_datan, från, till, senaste)
+    if not perioder:
+        raise ValueError(f"Inga perioder i datan ({perioder_i_datan[0]}-{perioder_i_datan[-1]}) matchar urvalet")
+    print(f"Perioder: {perioder[0]}-{perioder[-1]} ({len(perioder)} månader)")
+    månader = [divmod(period, 100) for period in perioder]
+    kanaler = KANALER
+    
+    # Alla vyer i visningsordning: NYA KUNDER för alla kanaler och NETTO utan kanalfiltrering
+    uppgifter = [('nya', år, månad_nr, kanal_id) for år, månad_nr in månader for kanal_id, _ in kanaler]
+    uppgifter += [('netto', år, månad_nr, None) for år, månad_nr in månader]
+    kanalnamn = dict(kanaler)
+    print(f"Generating {len(uppgifter)} content combinations")
+    
+    # Alla perioder summeras och jämförs en gång - vyerna är sedan uttag ur matriserna
+    with steg('bygg_kub'):
+        kuber = bygg_kundkuber(df_nya, df_stock)
+    
+    def innehåll_map():
+        """Innehåll för alla månader, vyer och kanaler, i visningsordning."""
+        # Vyerna är oberoende av varandra och kan genereras i flera processer. De tas
+        # emot en i taget, så att varje vy kan skrivas ut innan nästa behövs.
+        # (stegen inuti generera_vy mäts bara när vyerna genereras i den här processen)
+        # Med --export skrivs varje vys aggregat till exportfilen när vyn tas emot.
+        delad = {'kuber': kuber, 'mål': kundmål_per_period(df_mål), 'klientrendering': klientrendering,
+                 'källor': källor, 'kodversion': kodversion([Path(__file__)]), 'export': aggregatexport.aktiv()}
+        for (vy_typ, år, månad_nr, kanal_id), (kpi, tab, rader) in zip(
+                uppgifter, generera_parallellt(generera_vy, uppgifter, delad, arbetare)):
+            if rader is not None:
+                with steg('exportera'):
+                    aggregatexport.skriv(rader)
+            if vy_typ == 'nya':
+                yield {'typ': 'nya', 'key': f"nya_{år}_{månad_nr}_{kanal_id}", 'kpi': kpi, 'tabeller': tab,
+                       'år': år, 'månad_nr': månad_nr, 'månad': MÅNADSNAMN[månad_nr],
+                       'kanal_id': kanal_id, 'kanal': kanalnamn[kanal_id]}
+            else:
+                yield {'typ': 'netto', 'key': f"netto_{år}_{månad_nr}", 'kpi': kpi, 'tabeller': tab,
+                       'år': år, 'månad_nr': månad_nr, 'månad': MÅNADSNAMN[månad_nr]}
+    
+    # Bygg sektionerna - förrenderad HTML eller tomma behållare som fylls i webbläsaren
+    if klientrendering:
+        # Vydatan bäddas in som ett JSON-block och samlas därför ihop innan sidan skrivs
+        with steg('generera_vyer'):
+            innehåll = {data['key']: data for data in innehåll_map()}
+        kpi_sektion, tabellsektion, klient_skript = bygg_klientsektioner(innehåll)
+        sektioner = [(kpi_sektion, tabellsektion)]
+    else:
+        sektioner = bygg_html_sektioner(innehåll_map(), månader[-1])
+        klient_skript = ""
+    
+    html = sidmall(perioder, månader[-1], klient_skript)
     
-    # Spara filen
+    # Spara filen - förrenderade vyer genereras och skrivs en i taget
     output_fil = Path(__file__).parent / "kundflode_dashboard.html"
-    with open(output_fil, 'w', encoding='utf-8') as f:
-        f.write(html)
+    with steg('generera_och_skriv'):
+        skriv_sida(output_fil, html, ['kpi', 'tabeller'], sektioner)
     
     print(f"\n✅ Kundflödes-dashboard genererad framgångsrikt!")
     print(f"📄 Fil: {output_fil}")
@@ -1054,4 +1088,27 @@ def generera_dashboard():
 
 
 if __name__ == "__main__":
-    generera_dashboard()
+    parser = argparse.ArgumentParser(description="Generera HTML-dashboard för kundflöde")
+    parser.add_argument('--klientrendering', action='store_true',
+                        help="skriv vyerna som JSON i sidan och rendera dem i webbläsaren")
+    parser.add_argument('--arbetare', type=int, default=1, metavar='N',
+                        help="generera vyerna i N processer (0 = en per kärna, standard 1)")
+    parser.add_argument('--radblock', type=int, metavar='N',
+                        help="läs CSV-filerna strömmande i block om N rader och aggregera direkt "
+                             "(för exporter större än minnet)")
+    lägg_till_periodargument(parser)
+    profilering.lägg_till_argument(parser)
+    aggregatcache.lägg_till_argument(parser)
+    aggregatexport.lägg_till_argument(parser)
+    args = parser.parse_args()
+    
+    if args.profil or args.profil_dump:
+        profilering.starta(args.profil_dump)
+    if not args.utan_cache:
+        aggregatcache.starta(Path(__file__).parent / SNAPSHOT_KATALOG / AGGREGAT_KATALOG, args.cache_mb)
+    if args.export:
+        aggregatexport.starta(args.export)
+    generera_dashboard(klientrendering=args.klientrendering, arbetare=args.arbetare, radblock=args.radblock,
+                       från=args.från, till=args.till, senaste=args.senaste)
+    aggregatexport.avsluta()
+    profilering.avsluta("generera_kundflode_dashboard.py", Path(__file__).parent / "kundflode_dashboard.profil.json")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Inkrementell regenerering - räkna bara om vyer vars perioder har ändrats
+"""
+
+import hashlib
+import os
+import pickle
+
+import pandas as pd
+import numpy as np
+
+from inlasning import filhash
+from rapportmotor import jämförelsemånader
+
+
+def periodhashar(df):
+    """
+    Beräkna en hash per period av periodens rader.
+
+    Kräver en ram indexerad med indexera_perioder, där varje period är ett
+    sammanhängande radintervall. Returnerar {period (ÅÅÅÅMM): hash}.
+    """
+    radhashar = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    perioder, starter = np.unique(df.index.to_numpy(), return_index=True)
+    slut = list(starter[1:]) + [len(df)]
+
+    hashar = {}
+    for period, start, stopp in zip(perioder, starter, slut):
+        hashar[int(period)] = hashlib.blake2b(radhashar[start:stopp].tobytes(), digest_size=16).hexdigest()
+    return hashar
+
+
+def ändrade_perioder(gamla_hashar, nya_hashar):
+    """Returnera perioder som är nya, borttagna eller har ändrat innehåll."""
+    alla = set(gamla_hashar) | set(nya_hashar)
+    return {period for period in alla if gamla_hashar.get(period) != nya_hashar.get(period)}
+
+
+def jämförelseperioder(år, månad):
+    """Perioderna (ÅÅÅÅMM) en vy beror på: aktuell månad, samma månad föregående år och föregående månad."""
+    return {p_år * 100 + p_månad for p_år, p_månad in [(år, månad), *jämförelsemånader(år, månad)]}
+
+
+def kodversion(filer):
+    """Hash av källkoden som genererar vyerna - ändrad kod gör cachen ogiltig."""
+    return '-'.join(filhash(fil) for fil in filer)
+
+
+def ladda_vycache(cache_fil, version):
+    """Ladda vycachen, eller en tom cache om den saknas eller har en annan kodversion."""
+    tom = {'version': version, 'periodhashar': {}, 'kub': None, 'vyer': {}}
+    if not cache_fil.exists():
+        return tom
+    try:
+        with open(cache_fil, 'rb') as f:
+            cache = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return tom
+    return cache if cache.get('version') == version else tom
+
+
+def spara_vycache(cache_fil, cache):
+    """Spara vycachen via temporär fil så att en avbruten körning inte lämnar en trasig cache."""
+    cache_fil.parent.mkdir(exist_ok=True)
+    temp = cache_fil.with_name(cache_fil.name + '.tmp')
+    with open(temp, 'wb') as f:
+        pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp, cache_fil)
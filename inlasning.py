@@ -0,0 +1,430 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Gemensam inläsning av CSV-exporterna med cachade kolumnära snapshots
+"""
+
+import hashlib
+import os
+from pathlib import Path
+
+import pandas as pd
+import numpy as np
+
+# Parquet kräver pyarrow - utan det sparas snapshots som pickle
+try:
+    import pyarrow  # noqa: F401
+    SNAPSHOT_FORMAT = 'parquet'
+except ImportError:
+    SNAPSHOT_FORMAT = 'pickle'
+
+# Öka när rensningslogiken ändras så att gamla snapshots inte återanvänds
+SNAPSHOT_VERSION = 4
+
+SNAPSHOT_KATALOG = '.snapshots'
+
+# Tusentalsavgränsare i svenska exporter: mellanslag, non-breaking space och smala mellanslag
+TUSENTALSAVGRÄNSARE = '[ \xa0\u2009\u202f]'
+
+# Dimensionskolumner per export (kodas som kategorier)
+FÖRSÄLJNING_DIMENSIONER = ['KampanjKod', 'SäljKanal', 'Antal anställda', 'Avtalsperiod',
+                           'Bolagsform', 'Kundtyp', 'SNI']
+KUND_DIMENSIONER = ['KundTyp', 'Antal anställda', 'SNI', 'Bolagform', 'Omsättningsintervall']
+
+# Anskaffningskanaler: (mönster, kanal) i prioritetsordning. Första regeln med ett mönster
+# som finns i detaljen (gemener) avgör - övriga detaljer (t.ex. Cling, Boardeaser,
+# Okänd och '-') blir ÖVRIG_KANAL.
+KANALREGLER = [
+    (('fortnox.se', 'fortnox se'), 'fortnox.se'),
+    (('fortnox',), 'fortnox'),
+    (('winback',), 'winback'),
+    (('byrå',), 'byrå'),
+]
+ÖVRIG_KANAL = 'övrigt'
+
+# Kolumnerna i kundmålsarket och anskaffningskanalen de anger mål för ('alla' är totalen)
+MÅLKANALER = {
+    'Byrå': 'byrå', 'Winback': 'winback', 'säljare': 'fortnox', 'fortnox.se': 'fortnox.se',
+    'Cling/Boardeaser/Okänt': ÖVRIG_KANAL, 'Totalt': 'alla',
+}
+
+# Antal ursprungliga exportrader bakom varje rad i en aggregerad ram
+ANTAL_RADER = '_antal_rader'
+
+# Otolkbara celler per kolumn under strömmande inläsning (None annars) - varnas om en gång per fil
+_tvingade_celler = None
+
+# Gruppnycklar och summerbara mått per förberedelse vid strömmande inläsning.
+# Allt rapporterna summerar finns med, så de aggregerade ramarna ger samma summor.
+AGGREGERING = {
+    'förbered_försäljning': (
+        ['ÅrMånad', 'År', 'Månad'] + FÖRSÄLJNING_DIMENSIONER,
+        ['Antal försäljningsordrar', 'Försäljning', 'Rabattvärde', 'Ordervärde'],
+    ),
+    'förbered_nya_kunder': (
+        ['ÅrMånad', 'År', 'Månad', 'Anskaffningskanal'] + KUND_DIMENSIONER,
+        ['Nya kunder'],
+    ),
+    'förbered_kundstock': (
+        ['ÅrMånad', 'Månad'] + KUND_DIMENSIONER,
+        ['Antal kunder'],
+    ),
+}
+
+
+# Beräknade filhashar per (sökväg, ändringstid, storlek) - varje fil läses bara en gång per körning
+_filhashar = {}
+
+
+def filhash(filpath):
+    """Beräkna en hash av filens innehåll."""
+    stat = os.stat(filpath)
+    nyckel = (str(Path(filpath).resolve()), stat.st_mtime_ns, stat.st_size)
+    if nyckel not in _filhashar:
+        h = hashlib.blake2b(digest_size=16)
+        with open(filpath, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        _filhashar[nyckel] = h.hexdigest()
+    return _filhashar[nyckel]
+
+
+def läs_csv(filpath, förbered, använd_snapshot=True, radblock=None):
+    """
+    Läs en CSV-export och förbered den med given funktion.
+
+    Första gången en fil ses sparas den rensade datan som en snapshot bredvid
+    CSV-filen, nycklad på filens innehåll. Senare körningar med oförändrad fil
+    läser snapshoten direkt och hoppar över CSV-tolkning och strängrensning.
+
+    Med radblock läses filen strömmande i block om så många rader och
+    aggregeras direkt (se läs_csv_aggregerat), så att hela exporten aldrig
+    behöver ligga i minnet.
+    """
+    filpath = Path(filpath)
+    if radblock:
+        läs = lambda: läs_csv_aggregerat(filpath, förbered, radblock)  # noqa: E731
+        namn = f"{förbered.__name__}.aggregerat"
+    else:
+        läs = lambda: förbered(pd.read_csv(filpath))  # noqa: E731
+        namn = förbered.__name__
+    if not använd_snapshot:
+        return läs()
+
+    katalog = filpath.parent / SNAPSHOT_KATALOG
+    prefix = f"{filpath.stem}.{namn}.v{SNAPSHOT_VERSION}"
+    snapshot = katalog / f"{prefix}.{filhash(filpath)}.{SNAPSHOT_FORMAT}"
+
+    if snapshot.exists():
+        return _läs_snapshot(snapshot)
+
+    df = läs()
+
+    # Ta bort snapshots av äldre versioner av samma fil innan den nya sparas
+    katalog.mkdir(exist_ok=True)
+    for gammal in katalog.iterdir():
+        if gammal.name.startswith(f"{filpath.stem}.{namn}.v"):
+            gammal.unlink()
+    _skriv_snapshot(df, snapshot)
+
+    return df
+
+
+def läs_csv_aggregerat(filpath, förbered, radblock=500_000):
+    """
+    Läs en CSV-export i block och summera varje block direkt till en aggregerad ram.
+
+    Varje block förbereds och summeras per unik kombination av period och
+    dimensioner (AGGREGERING), och delsummorna slås ihop med de tidigare.
+    Resultatet har samma kolumner som den förberedda exporten och ger samma
+    summor vid filtrering och groupby, men har bara en rad per kombination.
+    Minnet begränsas därför av aggregatets storlek och inte av filens.
+    """
+    global _tvingade_celler
+    nycklar, mått = AGGREGERING[förbered.__name__]
+    perioder = [kol for kol in nycklar if kol in ('ÅrMånad', 'År', 'Månad')]
+    dimensioner = [kol for kol in nycklar if kol not in perioder]
+
+    summa = None
+    _tvingade_celler = {}
+    try:
+        for block in pd.read_csv(filpath, chunksize=radblock):
+            block = förbered(block)
+            block[ANTAL_RADER] = 1
+            # Blockens kategorier skiljer sig åt - gruppera på värdena så att delsummorna går att slå ihop
+            for kol in dimensioner:
+                block[kol] = block[kol].astype(object)
+            delsumma = block.groupby(nycklar, dropna=False, sort=False)[mått + [ANTAL_RADER]].sum()
+            if summa is not None:
+                delsumma = pd.concat([summa, delsumma]).groupby(level=nycklar, dropna=False, sort=False).sum()
+            summa = delsumma
+        tvingade, _tvingade_celler = _tvingade_celler, None
+    finally:
+        _tvingade_celler = None
+
+    for kol, antal in tvingade.items():
+        print(f"⚠️  {kol}: {antal} celler kunde inte tolkas och sattes till 0")
+
+    df = summa.reset_index()
+    krymp_heltal(df, perioder)
+    df = df.sort_values(nycklar, kind='stable', ignore_index=True)
+    return koda_kategorier(df, dimensioner)
+
+
+def antal_rader(df):
+    """Antal exportrader bakom en ram - även när den är aggregerad med läs_csv_aggregerat."""
+    return int(df[ANTAL_RADER].sum()) if ANTAL_RADER in df.columns else len(df)
+
+
+def _läs_snapshot(snapshot):
+    if SNAPSHOT_FORMAT == 'parquet':
+        return pd.read_parquet(snapshot)
+    return pd.read_pickle(snapshot)
+
+
+def _skriv_snapshot(df, snapshot):
+    # Skriv till temporär fil och byt namn så att en avbruten körning inte lämnar en trasig snapshot
+    temp = snapshot.with_name(snapshot.name + '.tmp')
+    if SNAPSHOT_FORMAT == 'parquet':
+        df.to_parquet(temp, index=False)
+    else:
+        df.to_pickle(temp)
+    os.replace(temp, snapshot)
+
+
+def tolka_svenska_tal(serie, decimaltecken=','):
+    """
+    Tolka en kolumn med svenskformaterade tal, t.ex. "1 234,50".
+
+    Returnerar talen som float och antalet celler som inte gick att tolka och
+    därför sattes till 0. Med decimaltecken=None behandlas komma som
+    tusentalsavgränsare. Kolumner som redan är numeriska tolkas inte om.
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        tal = serie
+    else:
+        text = serie.astype(str).str.replace(TUSENTALSAVGRÄNSARE, '', regex=True)
+        text = text.str.replace(',', '' if decimaltecken is None else '.', regex=False)
+        tal = pd.to_numeric(text, errors='coerce')
+
+    saknas = tal.isna()
+    antal_tvingade = int(saknas.sum())
+    if antal_tvingade:
+        tal = tal.fillna(0)
+    return tal, antal_tvingade
+
+
+def rensa_numeriska_kolumner(df, kolumner, heltal=False, decimaltecken=','):
+    """Tolka numeriska kolumner på plats och varna för celler som sattes till 0."""
+    for kol in kolumner:
+        tal, antal_tvingade = tolka_svenska_tal(df[kol], decimaltecken)
+        df[kol] = tal.astype(int) if heltal else tal
+        if antal_tvingade and _tvingade_celler is not None:
+            _tvingade_celler[kol] = _tvingade_celler.get(kol, 0) + antal_tvingade
+        elif antal_tvingade:
+            print(f"⚠️  {kol}: {antal_tvingade} celler kunde inte tolkas och sattes till 0")
+    return df
+
+
+def koda_kategorier(df, kolumner):
+    """
+    Koda dimensionskolumner som kategorier med sorterade kategorimängder.
+
+    Sorterade kategorier ger samma ordning i groupby som de ursprungliga
+    strängkolumnerna, samtidigt som groupby, isin och jämförelser körs på
+    heltalskoder.
+    """
+    for kol in kolumner:
+        if isinstance(df[kol].dtype, pd.CategoricalDtype):
+            continue
+        kategorier = sorted(df[kol].dropna().unique())
+        df[kol] = pd.Categorical(df[kol], categories=kategorier)
+    return df
+
+
+def krymp_heltal(df, kolumner):
+    """
+    Krymp heltalskolumner till minsta heltalstyp som rymmer värdena.
+
+    Används för period- och nyckelkolumner. Mått som summeras behåller full
+    bredd så att summornas datatyp inte beror på hur små värdena råkar vara.
+    """
+    for kol in kolumner:
+        df[kol] = pd.to_numeric(df[kol], downcast='integer')
+    return df
+
+
+def slå_ihop_kategorier(serie, mappning):
+    """Slå ihop kategorier i en kategorisk kolumn, t.ex. {'GRATTISNYSTARTAD': 'NYSTARTAD'}."""
+    gamla = list(serie.cat.categories)
+    nya = sorted({mappning.get(kategori, kategori) for kategori in gamla})
+    position = {kategori: i for i, kategori in enumerate(nya)}
+
+    # Översätt koderna i ett vektoriserat uppslag; -1 (saknat värde) behålls
+    översättning = np.array([position[mappning.get(kategori, kategori)] for kategori in gamla] + [-1])
+    koder = översättning[serie.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(koder, categories=nya), index=serie.index, name=serie.name)
+
+
+def kategorisera_kanaler(detaljer, regler=KANALREGLER):
+    """
+    Kategorisera anskaffningskanalen för en kategorisk kolumn med detaljer enligt regler.
+
+    Varje unik detalj klassas en gång (vektoriserat över kategorierna) och
+    resultatet sprids till raderna via kategorikoderna, så kostnaden beror på
+    antalet olika detaljer och inte på antalet rader. Saknade detaljer och
+    detaljer utan träff blir ÖVRIG_KANAL.
+    """
+    gemener = pd.Series(detaljer.cat.categories.astype(str)).str.lower()
+    villkor = [np.logical_or.reduce([gemener.str.contains(m, regex=False).to_numpy() for m in mönster])
+               for mönster, _ in regler]
+    kanal_per_detalj = np.select(villkor, [kanal for _, kanal in regler], default=ÖVRIG_KANAL)
+
+    # Sista platsen tar saknade detaljer (kod -1)
+    kanal_per_kod = np.append(kanal_per_detalj, ÖVRIG_KANAL).astype(object)
+    koder = detaljer.cat.codes.to_numpy()
+    kanaler = sorted(set(kanal_per_kod[np.unique(koder)]))
+    position = {kanal: i for i, kanal in enumerate(kanaler)}
+    översättning = np.array([position.get(kanal, -1) for kanal in kanal_per_kod])
+    return pd.Series(pd.Categorical.from_codes(översättning[koder], categories=kanaler),
+                     index=detaljer.index, name='Anskaffningskanal')
+
+
+def slå_samman_ramar(ramar):
+    """Slå samman ramar och behåll kategoriska kolumner med en gemensam kategorimängd."""
+    for kol in ramar[0].columns:
+        if not all(isinstance(ram[kol].dtype, pd.CategoricalDtype) for ram in ramar):
+            continue
+        kategorier = sorted(set().union(*(ram[kol].cat.categories for ram in ramar)))
+        for ram in ramar:
+            ram[kol] = ram[kol].cat.set_categories(kategorier)
+    return pd.concat(ramar, ignore_index=True)
+
+
+def indexera_perioder(df):
+    """
+    Sortera datan på period och indexera raderna med period (ÅÅÅÅMM).
+
+    Varje period blir då ett sammanhängande radintervall som filtrera_period
+    hittar med binärsökning och returnerar som ett utsnitt utan kopiering.
+    """
+    period = df['År'].to_numpy().astype(np.int32) * 100 + df['Månad'].to_numpy()
+    if len(period) and not (np.diff(period) >= 0).all():
+        ordning = np.argsort(period, kind='stable')
+        df = df.iloc[ordning]
+        period = period[ordning]
+    df.index = pd.Index(period, name='Period')
+    return df
+
+
+def filtrera_period(df, år, månad):
+    """Filtrera data för en specifik period."""
+    if df.index.name == 'Period' and df.index.is_monotonic_increasing:
+        start, stopp = df.index.slice_locs(år * 100 + månad, år * 100 + månad)
+        return df.iloc[start:stopp]
+    return df[(df['År'] == år) & (df['Månad'] == månad)].copy()
+
+
+def förbered_försäljning(df):
+    """Rensa försäljningsexporten och beräkna härledda kolumner."""
+    # Rensa och konvertera numeriska kolumner - tusentalsavgränsare och decimalkomma
+    rensa_numeriska_kolumner(df, ['Antal försäljningsordrar', 'Försäljning', 'Rabattvärde'])
+
+    # Separera år och månad från ÅrMånad-kolumnen
+    df['År'] = df['ÅrMånad'] // 100
+    df['Månad'] = df['ÅrMånad'] % 100
+    krymp_heltal(df, ['ÅrMånad', 'År', 'Månad'])
+
+    # Spara sorterat på period så att indexera_perioder inte behöver sortera om
+    df = df.sort_values('ÅrMånad', kind='stable', ignore_index=True)
+
+    # Dimensioner som kategorier
+    koda_kategorier(df, FÖRSÄLJNING_DIMENSIONER)
+
+    # Beräkna ordervärde (försäljning + rabattvärde)
+    df['Ordervärde'] = df['Försäljning'] + df['Rabattvärde']
+
+    # Beräkna rabatt%
+    df['Rabatt%'] = np.where(
+        df['Ordervärde'] > 0,
+        (df['Rabattvärde'] / df['Ordervärde']) * 100,
+        0
+    )
+
+    return df
+
+
+def ladda_försäljning(filpath, radblock=None):
+    """
+    Ladda försäljningsexporten förberedd och indexerad på period - samma data för alla rapporter.
+
+    Med radblock läses den strömmande och aggregerat (se läs_csv_aggregerat).
+    """
+    df = läs_csv(filpath, förbered_försäljning, radblock=radblock)
+
+    # GRATTISNYSTARTAD och NYSTARTAD ska båda visas som NYSTARTAD
+    df['KampanjKod'] = slå_ihop_kategorier(df['KampanjKod'], {'GRATTISNYSTARTAD': 'NYSTARTAD'})
+
+    return indexera_perioder(df)
+
+
+def förbered_nya_kunder(df):
+    """Rensa exporten av nya kunder och kategorisera anskaffningskanal."""
+    # Rensa numeriska kolumner
+    rensa_numeriska_kolumner(df, ['Nya kunder'], heltal=True)
+
+    # Separera år och månad
+    df['År'] = df['ÅrMånad'] // 100
+    df['Månad'] = df['ÅrMånad'] % 100
+    krymp_heltal(df, ['ÅrMånad', 'År', 'Månad'])
+
+    # Spara sorterat på period så att indexera_perioder inte behöver sortera om
+    df = df.sort_values('ÅrMånad', kind='stable', ignore_index=True)
+
+    # Dimensioner som kategorier
+    koda_kategorier(df, ['Anskaffad via - Detalj'] + KUND_DIMENSIONER)
+
+    # Gruppera anskaffningskanaler
+    df['Anskaffningskanal'] = kategorisera_kanaler(df['Anskaffad via - Detalj'])
+
+    return df
+
+
+def förbered_kundstock(df):
+    """Rensa en kundstocksexport."""
+    # Rensa numeriska kolumner
+    rensa_numeriska_kolumner(df, ['Antal kunder'], heltal=True)
+
+    # Separera månad från ÅrMånad
+    df['Månad'] = df['ÅrMånad'] % 100
+    krymp_heltal(df, ['ÅrMånad', 'Månad'])
+    df = df.sort_values('ÅrMånad', kind='stable', ignore_index=True)
+
+    # Dimensioner som kategorier
+    koda_kategorier(df, KUND_DIMENSIONER)
+
+    return df
+
+
+def förbered_kundmål(df):
+    """
+    Rensa kundmålen och forma om till long format per månad och kanal.
+
+    Ger en rad per (månad, kanal) med kolumnerna Månad, Kanal och Mål. Har
+    arket en kolumn År (mål för flera år) följer den med.
+    """
+    # Mappa månadsnamn till nummer
+    månad_map = {
+        'Jan': 1, 'Feb': 2, 'Mars': 3, 'Apr': 4, 'Maj': 5, 'Juni': 6,
+        'Juli': 7, 'Aug': 8, 'Sep': 9, 'Okt': 10, 'Nov': 11, 'Dec': 12
+    }
+    df['Månad'] = df['Månad'].map(månad_map)
+
+    # Rensa numeriska kolumner (non-breaking spaces, kommatecken som tusentalsavgränsare)
+    rensa_numeriska_kolumner(df, list(MÅLKANALER), heltal=True, decimaltecken=None)
+
+    # Omforma till long format med kanal-kategorier
+    id_kolumner = [kol for kol in ['År', 'Månad'] if kol in df.columns]
+    return df.rename(columns=MÅLKANALER).melt(
+        id_vars=id_kolumner, value_vars=list(MÅLKANALER.values()), var_name='Kanal', value_name='Mål'
+    )
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Klientrendering - kompakt JSON-data och en liten JS-renderare i stället för förrenderade vyer
+"""
+
+import json
+
+
+def data_skript(data):
+    """Bädda in vydatan som ett JSON-block som JS-renderaren läser vid sidladdning."""
+    text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    # "</" får inte förekomma i ett script-block
+    text = text.replace('</', '<\\/')
+    return f'<script id="dashboard-data" type="application/json">{text}</script>'
+
+
+def avrunda(värde, decimaler=1):
+    """
+    Avrunda en förändring för JSON - den visas ändå bara med en decimal.
+
+    Små värden som skulle avrundas till 0 behålls, så att tecken, pil och
+    färgklass blir desamma som i den förrenderade HTML:en.
+    """
+    avrundat = round(float(värde), decimaler)
+    return avrundat if avrundat != 0 else float(värde)
+
+
+# Gemensamma renderingsfunktioner för båda dashboardsen. Formateringen speglar
+# mallarna i mallar.kpi_kort och generera_tabell*.
+RENDERARE_JS = r"""<script>
+    const DASHBOARD_DATA = JSON.parse(document.getElementById('dashboard-data').textContent);
+    const MANADER_KORT = {1: 'Jan', 2: 'Feb', 3: 'Mar', 4: 'Apr', 5: 'Maj', 6: 'Jun',
+                          7: 'Jul', 8: 'Aug', 9: 'Sep', 10: 'Okt', 11: 'Nov', 12: 'Dec'};
+
+    function esc(text) {
+        return String(text).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+    }
+    function fmtHeltal(v) { return Math.trunc(v).toLocaleString('en-US'); }
+    function fmtKr(v) { return Math.round(v).toLocaleString('en-US') + ' kr'; }
+    function fmtTecken(v, decimaler) { return (v >= 0 ? '+' : '') + v.toFixed(decimaler); }
+    function fmtTeckenHeltal(v) { return (v >= 0 ? '+' : '') + fmtHeltal(v); }
+
+    // Pil och färgklass för en förändring där positiv avgör riktningen
+    function riktning(positiv, förändring) {
+        if (positiv) return ['↑', 'positive'];
+        return förändring !== 0 ? ['↓', 'negative'] : ['→', 'neutral'];
+    }
+
+    function jämförelseperioder(månad, år) {
+        return {yoyÅr: år - 1, momMånad: månad === 1 ? 12 : månad - 1, momÅr: månad === 1 ? år - 1 : år};
+    }
+
+    function kpiKort(titel, värdeText, rader) {
+        return `<div class="kpi-card"><div class="kpi-title">${esc(titel)}</div>` +
+            `<div class="kpi-value">${värdeText}</div><div class="kpi-comparisons">` +
+            rader.map(([etikett, text, förändring, [pil, klass]]) =>
+                `<div class="comparison-row"><span class="comparison-label">${etikett}:</span>` +
+                `<span class="comparison-value">${text}</span>` +
+                `<span class="kpi-change-inline ${klass}"><span class="arrow-small">${pil}</span> ${förändring}</span></div>`
+            ).join('') + '</div></div>';
+    }
+
+    // Försäljning: [titel, aktuell, yoy, mom, förändring_yoy, förändring_mom, är_rabatt]
+    function kpiKortFörsäljning([titel, aktuell, yoy, mom, fYoy, fMom, rabatt], månad, år) {
+        const p = jämförelseperioder(månad, år);
+        const yoyEtikett = `vs ${MANADER_KORT[månad]} ${p.yoyÅr}: `;
+        const momEtikett = `vs ${MANADER_KORT[p.momMånad]} ${p.momÅr}: `;
+        if (rabatt) {
+            // Lägre rabatt är bättre
+            return kpiKort(titel, aktuell.toFixed(2) + '%', [
+                ['YoY', yoyEtikett + yoy.toFixed(2) + '%', fmtTecken(fYoy, 2) + 'pp', riktning(fYoy < 0, fYoy)],
+                ['MoM', momEtikett + mom.toFixed(2) + '%', fmtTecken(fMom, 2) + 'pp', riktning(fMom < 0, fMom)],
+            ]);
+        }
+        const fmt = titel.toLowerCase().includes('värde') ? fmtKr : fmtHeltal;
+        return kpiKort(titel, fmt(aktuell), [
+            ['YoY', yoyEtikett + fmt(yoy), fmtTecken(fYoy, 1) + '%', riktning(fYoy > 0, fYoy)],
+            ['MoM', momEtikett + fmt(mom), fmtTecken(fMom, 1) + '%', riktning(fMom > 0, fMom)],
+        ]);
+    }
+
+    // Kundflöde: [titel, aktuell, yoy, mom, diff_yoy, diff_mom, förändring%_yoy, förändring%_mom, mål]
+    function kpiKortKundflöde([titel, aktuell, yoy, mom, dYoy, dMom, pYoy, pMom, mål], månad, år) {
+        const p = jämförelseperioder(månad, år);
+        const rader = [
+            ['YoY', `vs ${MANADER_KORT[månad]} ${p.yoyÅr}: ${fmtHeltal(yoy)}`,
+             `${fmtTecken(pYoy, 1)}% (${fmtTeckenHeltal(dYoy)})`, riktning(dYoy > 0, dYoy)],
+            ['MoM', `vs ${MANADER_KORT[p.momMånad]} ${p.momÅr}: ${fmtHeltal(mom)}`,
+             `${fmtTecken(pMom, 1)}% (${fmtTeckenHeltal(dMom)})`, riktning(dMom > 0, dMom)],
+        ];
+        if (mål) {
+            const uppfyllelse = aktuell / mål * 100;
+            rader.push(['Mål', fmtHeltal(mål), `${uppfyllelse.toFixed(1)}% (${fmtTeckenHeltal(aktuell - mål)})`,
+                        uppfyllelse >= 100 ? ['✓', 'positive'] : ['✗', 'negative']]);
+        }
+        return kpiKort(titel, fmtHeltal(aktuell), rader);
+    }
+
+    function tecknetsKlass(v) { return v > 0 ? 'positive' : v < 0 ? 'negative' : 'neutral'; }
+    function tecknetsPil(v) { return v > 0 ? '↑' : v < 0 ? '↓' : '→'; }
+
+    // Försäljning: [titel, dimension, [[namn, antal, yoy%, mom%], ...]]
+    function tabellFörsäljning([titel, dimension, rader]) {
+        const cell = v => `<td class="number ${tecknetsKlass(v)}"><span class="arrow-small">${tecknetsPil(v)}</span> ${fmtTecken(v, 1)}%</td>`;
+        return `<div class="table-card"><h3>${esc(titel)}</h3><table><thead><tr><th>${esc(dimension)}</th>` +
+            '<th>Antal</th><th>YoY %</th><th>MoM %</th></tr></thead><tbody>' +
+            rader.map(([namn, antal, yoy, mom]) =>
+                `<tr><td class="dimension-name">${esc(namn)}</td><td class="number">${fmtHeltal(antal)}</td>${cell(yoy)}${cell(mom)}</tr>`
+            ).join('') + '</tbody></table></div>';
+    }
+
+    // Kundflöde: [typ ('nya' | 'stock' | 'flöde'), titel, dimension, [[namn, antal, diff_yoy, diff_mom, yoy%, mom%], ...]]
+    function tabellKundflöde([typ, titel, dimension, rader]) {
+        if (rader.length === 0) {
+            return `<div class="table-container"><h3 class="table-title">${esc(titel)}</h3>` +
+                '<p style="text-align: center; color: #6B7280; padding: 2rem;">Ingen data tillgänglig</p></div>';
+        }
+        if (typ === 'flöde') return tabellFlöde(titel, dimension, rader);
+        const nya = typ === 'nya';
+        const höger = 'style="text-align: right;"';
+        const rubriker = nya ? ['Antal', 'YoY%', 'MoM%'] : ['Kundstock', 'YoY diff', 'MoM diff'];
+        return `<div class="table-container"><h3 class="table-title">${esc(titel)}</h3><table><thead><tr><th>${esc(dimension)}</th>` +
+            rubriker.map(r => `<th ${höger}>${r}</th>`).join('') + '</tr></thead><tbody>' +
+            rader.map(([namn, antal, dYoy, dMom, pYoy, pMom]) =>
+                `<tr><td>${esc(namn)}</td><td ${höger}>${fmtHeltal(antal)}</td>` +
+                `<td ${höger} class="${tecknetsKlass(dYoy)}">${nya ? fmtTecken(pYoy, 1) + '%' : fmtTeckenHeltal(dYoy)}</td>` +
+                `<td ${höger} class="${tecknetsKlass(dMom)}">${nya ? fmtTecken(pMom, 1) + '%' : fmtTeckenHeltal(dMom)}</td></tr>`
+            ).join('') + '</tbody></table></div>';
+    }
+
+    // Kundflödets rader: [namn, ingående, nya, tappade, netto, churn%]
+    function tabellFlöde(titel, dimension, rader) {
+        const höger = 'style="text-align: right;"';
+        return `<div class="table-container"><h3 class="table-title">${esc(titel)}</h3><table><thead><tr><th>${esc(dimension)}</th>` +
+            ['Ingående', 'Nya', 'Tappade', 'Netto', 'Churn'].map(r => `<th ${höger}>${r}</th>`).join('') +
+            '</tr></thead><tbody>' +
+            rader.map(([namn, ingående, nya, tappade, netto, churn]) =>
+                `<tr><td>${esc(namn)}</td><td ${höger}>${fmtHeltal(ingående)}</td><td ${höger}>${fmtHeltal(nya)}</td>` +
+                `<td ${höger}>${fmtHeltal(tappade)}</td><td ${höger} class="${tecknetsKlass(netto)}">${fmtTeckenHeltal(netto)}</td>` +
+                `<td ${höger}>${churn.toFixed(1)}%</td></tr>`
+            ).join('') + '</tbody></table></div>';
+    }
+
+    function sektion(rubrik, underrubrik, innehåll) {
+        const huvud = rubrik === null ? '' :
+            `<div class="section-header"><h2>${esc(rubrik)}</h2><p class="subtitle">${esc(underrubrik)}</p></div>`;
+        return `<div class="section">${huvud}${innehåll}</div>`;
+    }
+</script>"""
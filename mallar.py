@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+HTML-mallar - tabellrader renderade från kolumner och sidor som skrivs strömmande till disk
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from rapportmotor import jämförelsemånader
+
+
+MÅNADSNAMN = {
+    1: "Januari", 2: "Februari", 3: "Mars", 4: "April", 5: "Maj", 6: "Juni",
+    7: "Juli", 8: "Augusti", 9: "September", 10: "Oktober", 11: "November", 12: "December"
+}
+
+MÅNADER_KORT = {
+    1: "Jan", 2: "Feb", 3: "Mar", 4: "Apr", 5: "Maj", 6: "Jun",
+    7: "Jul", 8: "Aug", 9: "Sep", 10: "Okt", 11: "Nov", 12: "Dec"
+}
+
+KPI_KORT_MALL = """
+    <div class="kpi-card">
+        <div class="kpi-title">{titel}</div>
+        <div class="kpi-value">{värde}</div>
+        <div class="kpi-comparisons">{jämförelser}
+        </div>
+    </div>
+    """
+
+JÄMFÖRELSERAD_MALL = """
+            <div class="comparison-row">
+                <span class="comparison-label">{etikett}:</span>
+                <span class="comparison-value">{värde}</span>
+                <span class="kpi-change-inline {färg}">
+                    <span class="arrow-small">{pil}</span>
+                    {förändring}
+                </span>
+            </div>"""
+
+
+def förändringsklass(värden):
+    """CSS-klass per värde: positive, negative eller neutral efter tecknet."""
+    värden = np.asarray(värden, dtype=float)
+    return np.where(värden > 0, 'positive', np.where(värden < 0, 'negative', 'neutral')).tolist()
+
+
+def förändringspil(värden):
+    """Pil per värde: ↑, ↓ eller → efter tecknet."""
+    värden = np.asarray(värden, dtype=float)
+    return np.where(värden > 0, '↑', np.where(värden < 0, '↓', '→')).tolist()
+
+
+def heltal(kolumn):
+    """Kolumnen som Python-heltal (avkortade som int()) för formatering med tusentalsavgränsare."""
+    return kolumn.astype('int64').tolist()
+
+
+def rendera_rader(mall, **kolumner):
+    """
+    Rendera mallen en gång per rad och foga ihop raderna i ett svep.
+
+    Kolumnerna ges som listor (eller serier) med samma längd och fyller
+    mallens fält med samma namn. Raderna byggs ur kolumnerna direkt, utan
+    en Series per rad, och sätts ihop med join i stället för upprepad +=.
+    """
+    namn = list(kolumner)
+    kolumner = [värden.tolist() if hasattr(värden, 'tolist') else värden for värden in kolumner.values()]
+    return ''.join(mall.format_map(dict(zip(namn, rad))) for rad in zip(*kolumner))
+
+
+def kpi_kort(titel, värde_aktuell, värde_yoy, värde_mom, förändring_yoy, förändring_mom, månad, år,
+             format='heltal', diff_yoy=None, diff_mom=None, mål=None):
+    """
+    Generera HTML för ett kombinerat KPI-kort med både YoY och MoM, och eventuellt mål.
+
+    format avgör hur värdena visas: 'heltal', 'kr' eller 'procent'. Procentsatser
+    (t.ex. rabatt) jämförs i procentenheter och där är en minskning positiv.
+    Med diff_yoy och diff_mom visas även den absoluta förändringen.
+    """
+    (yoy_år, _), (mom_år, mom_månad) = jämförelsemånader(år, månad)
+
+    def visa(värde):
+        if format == 'procent':
+            return f"{värde:.2f}%"
+        if format == 'kr':
+            return f"{värde:,.0f} kr"
+        return f"{int(värde):,}"
+
+    rader = []
+    for etikett, jämförelse_text, värde, förändring, diff in [
+        ("YoY", f"vs {MÅNADER_KORT[månad]} {yoy_år}", värde_yoy, förändring_yoy, diff_yoy),
+        ("MoM", f"vs {MÅNADER_KORT[mom_månad]} {mom_år}", värde_mom, förändring_mom, diff_mom),
+    ]:
+        if format == 'procent':
+            förändring_text = f"{förändring:+.2f}pp"
+            positiv = förändring < 0  # Lägre rabatt är bättre
+        else:
+            förändring_text = f"{förändring:+.1f}%" + (f" ({diff:+,})" if diff is not None else "")
+            positiv = förändring > 0
+        rader.append(JÄMFÖRELSERAD_MALL.format(
+            etikett=etikett, värde=f"{jämförelse_text}: {visa(värde)}", förändring=förändring_text,
+            pil="↑" if positiv else "↓" if förändring != 0 else "→",
+            färg="positive" if positiv else "negative" if förändring != 0 else "neutral",
+        ))
+
+    # Lägg till målrad om mål finns
+    if mål is not None and mål > 0:
+        uppfyllelse = (värde_aktuell / mål) * 100
+        mål_uppnått = uppfyllelse >= 100
+        rader.append(JÄMFÖRELSERAD_MALL.format(
+            etikett="Mål", värde=f"{int(mål):,}", förändring=f"{uppfyllelse:.1f}% ({värde_aktuell - mål:+,})",
+            pil="✓" if mål_uppnått else "✗", färg="positive" if mål_uppnått else "negative",
+        ))
+
+    return KPI_KORT_MALL.format(titel=titel, värde=visa(värde_aktuell), jämförelser="".join(rader))
+
+
+def periodrubrik(perioder):
+    """Året som perioderna (ÅÅÅÅMM) täcker, eller spannet av år, t.ex. "2024–2025"."""
+    första, sista = min(perioder) // 100, max(perioder) // 100
+    return str(sista) if första == sista else f"{första}–{sista}"
+
+
+def periodknappar(perioder, aktiv):
+    """
+    Knapparna i sidans periodfilter, en per period (ÅÅÅÅMM), med den aktiva (år, månad) markerad.
+
+    Ligger alla perioder inom samma år visas bara månadens namn, annars kort månad och år.
+    """
+    ett_år = len({period // 100 for period in perioder}) == 1
+    knappar = []
+    for period in perioder:
+        år, månad = divmod(period, 100)
+        namn = MÅNADSNAMN[månad] if ett_år else f"{MÅNADER_KORT[månad]} {år}"
+        aktiv_klass = " active" if (år, månad) == tuple(aktiv) else ""
+        knappar.append(f'<button class="filter-button{aktiv_klass}" onclick="switchMonth({månad}, {år})" '
+                       f'data-month="{månad}" data-year="{år}">{namn}</button>')
+    return "\n                ".join(knappar)
+
+
+def sidmarkör(namn):
+    """Platshållare i en sidmall där en strömmad del skrivs in (se skriv_sida)."""
+    return f"\x00{namn}\x00"
+
+
+def skriv_sida(filpath, sida, delar, sektioner):
+    """
+    Skriv en sida till disk medan dess sektioner produceras.
+
+    sida är sidmallen med en sidmarkör per del, i ordningen delar. sektioner
+    ger för varje vy en tupel med ett HTML-fragment per del. Den första delens
+    fragment skrivs direkt till filen, övriga mellanlagras i temporära filer och
+    kopieras in vid sin markör - ingen del av sidan hålls alltså i minnet.
+
+    Sidan skrivs till en temporär fil bredvid filpath som byts in först när
+    allt är skrivet, så ett avbrott lämnar den tidigare filen orörd.
+    """
+    filpath = Path(filpath)
+    temp = filpath.with_name(filpath.name + '.tmp')
+    buffertar = [tempfile.TemporaryFile('w+', encoding='utf-8') for _ in delar[1:]]
+    try:
+        with open(temp, 'w', encoding='utf-8') as f:
+            början, rest = sida.split(sidmarkör(delar[0]), 1)
+            f.write(början)
+            for fragment in sektioner:
+                f.write(fragment[0])
+                for buffert, text in zip(buffertar, fragment[1:]):
+                    buffert.write(text)
+
+            for namn, buffert in zip(delar[1:], buffertar):
+                mellan, rest = rest.split(sidmarkör(namn), 1)
+                f.write(mellan)
+                buffert.seek(0)
+                shutil.copyfileobj(buffert, f)
+            f.write(rest)
+        os.replace(temp, filpath)
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+    finally:
+        for buffert in buffertar:
+            buffert.close()
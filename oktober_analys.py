@@ -5,159 +5,57 @@ Analysverktyg för Oktober-försäljning
 Jämför oktober 2025 vs oktober 2024 (YoY) och vs september 2025 (MoM)
 """
 
-import pandas as pd
-import numpy as np
+import argparse
 from pathlib import Path
 
+import aggregatcache
+import profilering
+from aggregatcache import AGGREGAT_KATALOG
+from inlasning import ladda_försäljning, filtrera_period, antal_rader, SNAPSHOT_KATALOG
+from rapportmotor import (bygg_kub_cachad, kub_uttag, försäljnings_kpi, jämför_perioder, jämför_dimension,
+                          FÖRSÄLJNINGSMÅTT)
+from profilering import steg, profilerad
 
-def ladda_data(filpath):
-    """Ladda och förbered datan från CSV-filen."""
-    df = pd.read_csv(filpath)
-    
-    # Rensa och konvertera numeriska kolumner - ta bort mellanslag och non-breaking spaces
-    numeriska_kolumner = ['Antal försäljningsordrar', 'Försäljning', 'Rabattvärde']
-    for kol in numeriska_kolumner:
-        # Konvertera till string först, sedan ta bort alla mellanslag (både vanliga och non-breaking)
-        df[kol] = df[kol].astype(str).str.replace(' ', '').str.replace('\xa0', '')
-        df[kol] = pd.to_numeric(df[kol], errors='coerce').fillna(0)
-    
-    # Separera år och månad från ÅrMånad-kolumnen
-    df['År'] = df['ÅrMånad'] // 100
-    df['Månad'] = df['ÅrMånad'] % 100
-    
-    # Beräkna ordervärde (försäljning + rabattvärde)
-    df['Ordervärde'] = df['Försäljning'] + df['Rabattvärde']
-    
-    # Beräkna rabatt%
-    df['Rabatt%'] = np.where(
-        df['Ordervärde'] > 0,
-        (df['Rabattvärde'] / df['Ordervärde']) * 100,
-        0
-    )
-    
-    return df
 
+# Perioderna (år, månad) som analyseras och jämförs
+OKTOBER_2025, OKTOBER_2024, SEPTEMBER_2025 = (2025, 10), (2024, 10), (2025, 9)
 
-def filtrera_period(df, år, månad):
-    """Filtrera data för en specifik period."""
-    return df[(df['År'] == år) & (df['Månad'] == månad)].copy()
+DIMENSIONER = ['KampanjKod', 'SäljKanal', 'Antal anställda', 'Avtalsperiod', 'Bolagsform', 'Kundtyp', 'SNI']
 
 
-def beräkna_huvud_kpi(df):
-    """Beräkna huvud-KPI:er för en given period."""
-    return {
-        'Ordervärde': df['Ordervärde'].sum(),
-        'Försäljning': df['Försäljning'].sum(),
-        'Rabattvärde': df['Rabattvärde'].sum(),
-        'Försäljningsantal': df['Antal försäljningsordrar'].sum(),
-        'Rabatt%': (df['Rabattvärde'].sum() / df['Ordervärde'].sum() * 100) if df['Ordervärde'].sum() > 0 else 0,
-        'Antal_rader': len(df)
-    }
+def bygg_kub(df, källa):
+    """
+    Aggregera de analyserade perioderna per dimension (se rapportmotor.bygg_kub_cachad).
 
+    Aggregat som dashboarden redan räknat fram för samma fil läses ur aggregatcachen.
+    """
+    perioder = [år * 100 + månad for år, månad in [OKTOBER_2025, OKTOBER_2024, SEPTEMBER_2025]]
+    return bygg_kub_cachad(df, källa, DIMENSIONER, FÖRSÄLJNINGSMÅTT, perioder=perioder)
 
-def jämför_perioder(kpi_aktuell, kpi_jämförelse, period_namn):
-    """Jämför två perioder och returnera förändringarna."""
-    jämförelse = {}
-    
-    for nyckel in ['Ordervärde', 'Försäljning', 'Rabattvärde', 'Försäljningsantal', 'Rabatt%']:
-        värde_aktuell = kpi_aktuell[nyckel]
-        värde_jämförelse = kpi_jämförelse[nyckel]
-        
-        if nyckel == 'Rabatt%':
-            # För procentenheter använder vi absolut skillnad
-            skillnad = värde_aktuell - värde_jämförelse
-            jämförelse[nyckel] = {
-                'Aktuell': värde_aktuell,
-                'Jämförelse': värde_jämförelse,
-                'Skillnad_pp': skillnad,
-                'Förändring': 'Bättre' if skillnad < 0 else ('Sämre' if skillnad > 0 else 'Oförändrat')
-            }
-        else:
-            # För övriga värden beräknar vi procentuell förändring
-            if värde_jämförelse > 0:
-                förändring_procent = ((värde_aktuell - värde_jämförelse) / värde_jämförelse) * 100
-            else:
-                förändring_procent = 0 if värde_aktuell == 0 else float('inf')
-            
-            jämförelse[nyckel] = {
-                'Aktuell': värde_aktuell,
-                'Jämförelse': värde_jämförelse,
-                'Skillnad': värde_aktuell - värde_jämförelse,
-                'Förändring%': förändring_procent,
-                'Förändring': 'Bättre' if förändring_procent > 0 else ('Sämre' if förändring_procent < 0 else 'Oförändrat')
-            }
-    
-    return jämförelse
 
+@profilerad('beräkna_huvud_kpi')
+def beräkna_huvud_kpi(kub, period):
+    """Beräkna huvud-KPI:er för en given period (år, månad)."""
+    return försäljnings_kpi(kub_uttag(kub, *period))
 
-def analysera_dimension(df_aktuell, df_jämförelse, dimension, top_n=10):
-    """Analysera en specifik dimension (t.ex. kampanjkod, säljkanal)."""
-    
-    # Aggregera för aktuell period
-    agg_aktuell = df_aktuell.groupby(dimension).agg({
-        'Ordervärde': 'sum',
-        'Försäljning': 'sum',
-        'Rabattvärde': 'sum',
-        'Antal försäljningsordrar': 'sum'
-    }).reset_index()
-    
-    # Aggregera för jämförelseperiod
-    agg_jämförelse = df_jämförelse.groupby(dimension).agg({
-        'Ordervärde': 'sum',
-        'Försäljning': 'sum',
-        'Rabattvärde': 'sum',
-        'Antal försäljningsordrar': 'sum'
-    }).reset_index()
-    
-    # Slå samman
-    jämförelse_df = pd.merge(
-        agg_aktuell,
-        agg_jämförelse,
-        on=dimension,
-        how='outer',
-        suffixes=('_aktuell', '_jämförelse')
-    ).fillna(0)
-    
-    # Beräkna förändringar
-    jämförelse_df['Ordervärde_förändring%'] = np.where(
-        jämförelse_df['Ordervärde_jämförelse'] > 0,
-        ((jämförelse_df['Ordervärde_aktuell'] - jämförelse_df['Ordervärde_jämförelse']) / 
-         jämförelse_df['Ordervärde_jämförelse']) * 100,
-        0
-    )
-    
-    jämförelse_df['Försäljningsantal_förändring%'] = np.where(
-        jämförelse_df['Antal försäljningsordrar_jämförelse'] > 0,
-        ((jämförelse_df['Antal försäljningsordrar_aktuell'] - 
-          jämförelse_df['Antal försäljningsordrar_jämförelse']) / 
-         jämförelse_df['Antal försäljningsordrar_jämförelse']) * 100,
-        0
-    )
-    
-    # Beräkna rabatt%
-    jämförelse_df['Rabatt%_aktuell'] = np.where(
-        jämförelse_df['Ordervärde_aktuell'] > 0,
-        (jämförelse_df['Rabattvärde_aktuell'] / jämförelse_df['Ordervärde_aktuell']) * 100,
-        0
-    )
-    
-    jämförelse_df['Rabatt%_jämförelse'] = np.where(
-        jämförelse_df['Ordervärde_jämförelse'] > 0,
-        (jämförelse_df['Rabattvärde_jämförelse'] / jämförelse_df['Ordervärde_jämförelse']) * 100,
-        0
-    )
-    
-    jämförelse_df['Rabatt%_förändring_pp'] = (
-        jämförelse_df['Rabatt%_aktuell'] - jämförelse_df['Rabatt%_jämförelse']
+
+@profilerad('analysera_dimension')
+def analysera_dimension(kub, aktuell, jämförelse, dimension, top_n=10):
+    """Analysera en specifik dimension (t.ex. kampanjkod, säljkanal) mellan två perioder."""
+    return jämför_dimension(
+        kub_uttag(kub, *aktuell, dimension=dimension),
+        {'jämförelse': kub_uttag(kub, *jämförelse, dimension=dimension)},
+        dimension, FÖRSÄLJNINGSMÅTT, top_n=top_n, sortera_efter='Ordervärde'
     )
-    
-    # Sortera efter ordervärde aktuell period
-    jämförelse_df = jämförelse_df.sort_values('Ordervärde_aktuell', ascending=False)
-    
-    # Returnera top N (eller alla om färre än top_n)
-    return jämförelse_df.head(top_n) if len(jämförelse_df) > top_n else jämförelse_df
 
 
+def status(nyckel, data):
+    """Bättre, Sämre eller Oförändrat - för Rabatt% är en minskning bättre."""
+    förändring = -data['Förändring_pp'] if nyckel == 'Rabatt%' else data['Förändring%']
+    return 'Bättre' if förändring > 0 else ('Sämre' if förändring < 0 else 'Oförändrat')
+
+
+@profilerad('skriv_rapport')
 def skriv_rapport_huvud_kpi(titel, jämförelse):
     """Skriv ut en rapport för huvud-KPI:er."""
     print(f"\n{'='*80}")
@@ -171,17 +69,18 @@ def skriv_rapport_huvud_kpi(titel, jämförelse):
         data = jämförelse[nyckel]
         if nyckel == 'Försäljningsantal':
             print(f"{nyckel:<25} {data['Aktuell']:>15,.0f} {data['Jämförelse']:>15,.0f} "
-                  f"{data['Förändring%']:>14.1f}% {data['Förändring']:>10}")
+                  f"{data['Förändring%']:>14.1f}% {status(nyckel, data):>10}")
         else:
             print(f"{nyckel:<25} {data['Aktuell']:>15,.0f} {data['Jämförelse']:>15,.0f} "
-                  f"{data['Förändring%']:>14.1f}% {data['Förändring']:>10}")
+                  f"{data['Förändring%']:>14.1f}% {status(nyckel, data):>10}")
     
     # Rabatt% visas annorlunda
     data = jämförelse['Rabatt%']
     print(f"{'Rabatt%':<25} {data['Aktuell']:>14.2f}% {data['Jämförelse']:>14.2f}% "
-          f"{data['Skillnad_pp']:>14.2f}pp {data['Förändring']:>10}")
+          f"{data['Förändring_pp']:>14.2f}pp {status('Rabatt%', data):>10}")
 
 
+@profilerad('skriv_rapport')
 def skriv_rapport_dimension(titel, dimension_df, dimension_namn):
     """Skriv ut en rapport för en dimension."""
     print(f"\n{'='*100}")
@@ -198,13 +97,13 @@ def skriv_rapport_dimension(titel, dimension_df, dimension_namn):
     
     for _, rad in dimension_df.iterrows():
         print(f"{str(rad[dimension_namn]):<30} "
-              f"{rad['Ordervärde_aktuell']:>15,.0f} "
-              f"{rad['Ordervärde_förändring%']:>11.1f}% "
-              f"{rad['Antal försäljningsordrar_aktuell']:>13,.0f} "
-              f"{rad['Försäljningsantal_förändring%']:>11.1f}%")
+              f"{rad['Ordervärde']:>15,.0f} "
+              f"{rad['Ordervärde_jämförelse%']:>11.1f}% "
+              f"{rad['Antal försäljningsordrar']:>13,.0f} "
+              f"{rad['Antal försäljningsordrar_jämförelse%']:>11.1f}%")
 
 
-def analysera_oktober():
+def analysera_oktober(radblock=None):
     """Huvudfunktion för att analysera oktober-försäljning."""
     
     # Hitta CSV-filen
@@ -216,30 +115,39 @@ def analysera_oktober():
     
     # Ladda data
     print("\nLaddar data...")
-    df = ladda_data(csv_fil)
+    with steg('ladda_data') as mätning:
+        df = ladda_försäljning(csv_fil, radblock)
+        mätning['rader'] = len(df)
     
     # Filtrera perioder
-    okt_2025 = filtrera_period(df, 2025, 10)
-    okt_2024 = filtrera_period(df, 2024, 10)
-    sep_2025 = filtrera_period(df, 2025, 9)
+    with steg('filtrera_perioder') as mätning:
+        okt_2025 = filtrera_period(df, *OKTOBER_2025)
+        okt_2024 = filtrera_period(df, *OKTOBER_2024)
+        sep_2025 = filtrera_period(df, *SEPTEMBER_2025)
+        mätning['rader'] = len(okt_2025) + len(okt_2024) + len(sep_2025)
+    
+    print(f"Oktober 2025: {antal_rader(okt_2025)} rader")
+    print(f"Oktober 2024: {antal_rader(okt_2024)} rader")
+    print(f"September 2025: {antal_rader(sep_2025)} rader")
     
-    print(f"Oktober 2025: {len(okt_2025)} rader")
-    print(f"Oktober 2024: {len(okt_2024)} rader")
-    print(f"September 2025: {len(sep_2025)} rader")
+    # Summera perioderna per dimension - eller läs aggregaten ur cachen
+    with steg('bygg_kub') as mätning:
+        kub = bygg_kub(df, aggregatcache.källa(csv_fil, läge='.aggregerat' if radblock else ''))
+        mätning['rader'] = len(okt_2025) + len(okt_2024) + len(sep_2025)
     
     # ==================== HUVUD-KPI:ER ====================
     
     # Beräkna KPI:er
-    kpi_okt_2025 = beräkna_huvud_kpi(okt_2025)
-    kpi_okt_2024 = beräkna_huvud_kpi(okt_2024)
-    kpi_sep_2025 = beräkna_huvud_kpi(sep_2025)
+    kpi_okt_2025 = beräkna_huvud_kpi(kub, OKTOBER_2025)
+    kpi_okt_2024 = beräkna_huvud_kpi(kub, OKTOBER_2024)
+    kpi_sep_2025 = beräkna_huvud_kpi(kub, SEPTEMBER_2025)
     
     # YoY-jämförelse
-    yoy_jämförelse = jämför_perioder(kpi_okt_2025, kpi_okt_2024, "YoY")
+    yoy_jämförelse = jämför_perioder(kpi_okt_2025, kpi_okt_2024)
     skriv_rapport_huvud_kpi("OKTOBER 2025 vs OKTOBER 2024 (YoY)", yoy_jämförelse)
     
     # MoM-jämförelse
-    mom_jämförelse = jämför_perioder(kpi_okt_2025, kpi_sep_2025, "MoM")
+    mom_jämförelse = jämför_perioder(kpi_okt_2025, kpi_sep_2025)
     skriv_rapport_huvud_kpi("OKTOBER 2025 vs SEPTEMBER 2025 (MoM)", mom_jämförelse)
     
     # ==================== KAMPANJKODER ====================
@@ -249,12 +157,12 @@ def analysera_oktober():
     print("="*80)
     
     # YoY
-    kampanj_yoy = analysera_dimension(okt_2025, okt_2024, 'KampanjKod', top_n=10)
+    kampanj_yoy = analysera_dimension(kub, OKTOBER_2025, OKTOBER_2024, 'KampanjKod', top_n=10)
     skriv_rapport_dimension("Kampanjkoder - Oktober 2025 vs Oktober 2024 (YoY)", 
                            kampanj_yoy, 'KampanjKod')
     
     # MoM
-    kampanj_mom = analysera_dimension(okt_2025, sep_2025, 'KampanjKod', top_n=10)
+    kampanj_mom = analysera_dimension(kub, OKTOBER_2025, SEPTEMBER_2025, 'KampanjKod', top_n=10)
     skriv_rapport_dimension("Kampanjkoder - Oktober 2025 vs September 2025 (MoM)", 
                            kampanj_mom, 'KampanjKod')
     
@@ -264,11 +172,11 @@ def analysera_oktober():
     print("SÄLJKANAL")
     print("="*80)
     
-    säljkanal_yoy = analysera_dimension(okt_2025, okt_2024, 'SäljKanal', top_n=20)
+    säljkanal_yoy = analysera_dimension(kub, OKTOBER_2025, OKTOBER_2024, 'SäljKanal', top_n=20)
     skriv_rapport_dimension("Säljkanal - Oktober 2025 vs Oktober 2024 (YoY)", 
                            säljkanal_yoy, 'SäljKanal')
     
-    säljkanal_mom = analysera_dimension(okt_2025, sep_2025, 'SäljKanal', top_n=20)
+    säljkanal_mom = analysera_dimension(kub, OKTOBER_2025, SEPTEMBER_2025, 'SäljKanal', top_n=20)
     skriv_rapport_dimension("Säljkanal - Oktober 2025 vs September 2025 (MoM)", 
                            säljkanal_mom, 'SäljKanal')
     
@@ -278,11 +186,11 @@ def analysera_oktober():
     print("ANTAL ANSTÄLLDA")
     print("="*80)
     
-    anställda_yoy = analysera_dimension(okt_2025, okt_2024, 'Antal anställda', top_n=20)
+    anställda_yoy = analysera_dimension(kub, OKTOBER_2025, OKTOBER_2024, 'Antal anställda', top_n=20)
     skriv_rapport_dimension("Antal anställda - Oktober 2025 vs Oktober 2024 (YoY)", 
                            anställda_yoy, 'Antal anställda')
     
-    anställda_mom = analysera_dimension(okt_2025, sep_2025, 'Antal anställda', top_n=20)
+    anställda_mom = analysera_dimension(kub, OKTOBER_2025, SEPTEMBER_2025, 'Antal anställda', top_n=20)
     skriv_rapport_dimension("Antal anställda - Oktober 2025 vs September 2025 (MoM)", 
                            anställda_mom, 'Antal anställda')
     
@@ -292,11 +200,11 @@ def analysera_oktober():
     print("AVTALSPERIOD")
     print("="*80)
     
-    avtal_yoy = analysera_dimension(okt_2025, okt_2024, 'Avtalsperiod', top_n=20)
+    avtal_yoy = analysera_dimension(kub, OKTOBER_2025, OKTOBER_2024, 'Avtalsperiod', top_n=20)
     skriv_rapport_dimension("Avtalsperiod - Oktober 2025 vs Oktober 2024 (YoY)", 
                            avtal_yoy, 'Avtalsperiod')
     
-    avtal_mom = analysera_dimension(okt_2025, sep_2025, 'Avtalsperiod', top_n=20)
+    avtal_mom = analysera_dimension(kub, OKTOBER_2025, SEPTEMBER_2025, 'Avtalsperiod', top_n=20)
     skriv_rapport_dimension("Avtalsperiod - Oktober 2025 vs September 2025 (MoM)", 
                            avtal_mom, 'Avtalsperiod')
     
@@ -306,11 +214,11 @@ def analysera_oktober():
     print("BOLAGSFORM")
     print("="*80)
     
-    bolag_yoy = analysera_dimension(okt_2025, okt_2024, 'Bolagsform', top_n=20)
+    bolag_yoy = analysera_dimension(kub, OKTOBER_2025, OKTOBER_2024, 'Bolagsform', top_n=20)
     skriv_rapport_dimension("Bolagsform - Oktober 2025 vs Oktober 2024 (YoY)", 
                            bolag_yoy, 'Bolagsform')
     
-    bolag_mom = analysera_dimension(okt_2025, sep_2025, 'Bolagsform', top_n=20)
+    bolag_mom = analysera_dimension(kub, OKTOBER_2025, SEPTEMBER_2025, 'Bolagsform', top_n=20)
     skriv_rapport_dimension("Bolagsform - Oktober 2025 vs September 2025 (MoM)", 
                            bolag_mom, 'Bolagsform')
     
@@ -320,11 +228,11 @@ def analysera_oktober():
     print("KUNDTYP")
     print("="*80)
     
-    kundtyp_yoy = analysera_dimension(okt_2025, okt_2024, 'Kundtyp', top_n=20)
+    kundtyp_yoy = analysera_dimension(kub, OKTOBER_2025, OKTOBER_2024, 'Kundtyp', top_n=20)
     skriv_rapport_dimension("Kundtyp - Oktober 2025 vs Oktober 2024 (YoY)", 
                            kundtyp_yoy, 'Kundtyp')
     
-    kundtyp_mom = analysera_dimension(okt_2025, sep_2025, 'Kundtyp', top_n=20)
+    kundtyp_mom = analysera_dimension(kub, OKTOBER_2025, SEPTEMBER_2025, 'Kundtyp', top_n=20)
     skriv_rapport_dimension("Kundtyp - Oktober 2025 vs September 2025 (MoM)", 
                            kundtyp_mom, 'Kundtyp')
     
@@ -334,11 +242,11 @@ def analysera_oktober():
     print("SNI (TOP 15)")
     print("="*80)
     
-    sni_yoy = analysera_dimension(okt_2025, okt_2024, 'SNI', top_n=15)
+    sni_yoy = analysera_dimension(kub, OKTOBER_2025, OKTOBER_2024, 'SNI', top_n=15)
     skriv_rapport_dimension("SNI - Oktober 2025 vs Oktober 2024 (YoY)", 
                            sni_yoy, 'SNI')
     
-    sni_mom = analysera_dimension(okt_2025, sep_2025, 'SNI', top_n=15)
+    sni_mom = analysera_dimension(kub, OKTOBER_2025, SEPTEMBER_2025, 'SNI', top_n=15)
     skriv_rapport_dimension("SNI - Oktober 2025 vs September 2025 (MoM)", 
                            sni_mom, 'SNI')
     
@@ -355,21 +263,34 @@ def analysera_oktober():
     for kpi in ['Ordervärde', 'Försäljningsantal', 'Rabatt%']:
         data = yoy_jämförelse[kpi]
         if kpi == 'Rabatt%':
-            print(f"  • {kpi}: {data['Skillnad_pp']:+.2f}pp - {data['Förändring']}")
+            print(f"  • {kpi}: {data['Förändring_pp']:+.2f}pp - {status(kpi, data)}")
         else:
-            print(f"  • {kpi}: {data['Förändring%']:+.1f}% - {data['Förändring']}")
+            print(f"  • {kpi}: {data['Förändring%']:+.1f}% - {status(kpi, data)}")
     
     print("\nMonth-over-Month (Oktober 2025 vs September 2025):")
     for kpi in ['Ordervärde', 'Försäljningsantal', 'Rabatt%']:
         data = mom_jämförelse[kpi]
         if kpi == 'Rabatt%':
-            print(f"  • {kpi}: {data['Skillnad_pp']:+.2f}pp - {data['Förändring']}")
+            print(f"  • {kpi}: {data['Förändring_pp']:+.2f}pp - {status(kpi, data)}")
         else:
-            print(f"  • {kpi}: {data['Förändring%']:+.1f}% - {data['Förändring']}")
+            print(f"  • {kpi}: {data['Förändring%']:+.1f}% - {status(kpi, data)}")
     
     print("\n\n✅ ANALYS SLUTFÖRD!")
     print("="*80)
 
 
 if __name__ == "__main__":
-    analysera_oktober()
+    parser = argparse.ArgumentParser(description="Analysera oktober-försäljningen i terminalen")
+    parser.add_argument('--radblock', type=int, metavar='N',
+                        help="läs CSV-filerna strömmande i block om N rader och aggregera direkt "
+                             "(för exporter större än minnet)")
+    profilering.lägg_till_argument(parser)
+    aggregatcache.lägg_till_argument(parser)
+    args = parser.parse_args()
+    
+    if args.profil or args.profil_dump:
+        profilering.starta(args.profil_dump)
+    if not args.utan_cache:
+        aggregatcache.starta(Path(__file__).parent / SNAPSHOT_KATALOG / AGGREGAT_KATALOG, args.cache_mb)
+    analysera_oktober(radblock=args.radblock)
+    profilering.avsluta("oktober_analys.py", Path(__file__).parent / "oktober_analys.profil.json")
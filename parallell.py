@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Parallell generering - kör oberoende vyer i en processpool
+"""
+
+import multiprocessing
+import os
+
+
+# Data som delas med arbetsprocesserna (inläsda ramar, kub m.m.)
+_delad_data = {}
+
+
+def _initiera_arbetare(delad_data):
+    """Ta emot delad data en gång per process när fork inte finns."""
+    _delad_data.update(delad_data)
+
+
+def _kör_uppgift(funktion_och_argument):
+    funktion, argument = funktion_och_argument
+    return funktion(_delad_data, *argument)
+
+
+def antal_arbetare(önskat):
+    """Tolka önskat antal processer - 0 eller None betyder en per kärna."""
+    return önskat if önskat else (os.cpu_count() or 1)
+
+
+def generera_parallellt(funktion, uppgifter, delad_data, arbetare=1):
+    """
+    Kör funktion(delad_data, *argument) för varje argumenttupel i uppgifter.
+
+    Resultaten ges ett i taget i uppgifternas ordning så fort de är klara,
+    oavsett vilken process som blev klar först, så att utdata blir identiska med
+    en seriell körning och kan skrivas ut utan att alla hålls i minnet. Med fork
+    ärvs delad_data av processerna utan kopiering eller pickling; annars skickas
+    den en gång per process och inte per uppgift. Funktionen måste ligga på
+    modulnivå så att den kan skickas till processerna.
+    """
+    uppgifter = list(uppgifter)
+    arbetare = min(antal_arbetare(arbetare), len(uppgifter))
+    if arbetare <= 1:
+        for argument in uppgifter:
+            yield funktion(delad_data, *argument)
+        return
+
+    _delad_data.clear()
+    _delad_data.update(delad_data)
+    if 'fork' in multiprocessing.get_all_start_methods():
+        pool = multiprocessing.get_context('fork').Pool(arbetare)
+    else:
+        pool = multiprocessing.get_context().Pool(arbetare, _initiera_arbetare, (delad_data,))
+
+    try:
+        with pool:
+            yield from pool.imap(_kör_uppgift, [(funktion, argument) for argument in uppgifter], chunksize=1)
+    finally:
+        _delad_data.clear()
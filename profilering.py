@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Profilering - tid, minne och radantal per steg bakom flaggan --profil
+
+Stegen markeras i koden med `with steg('namn') as mätning:`. När profileringen
+inte är startad returneras en färdig tom kontext, så kostnaden är ett funktionsanrop.
+"""
+
+import contextlib
+import functools
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows saknar resource - minnet rapporteras då inte
+    resource = None
+
+
+PROFILERARE = ['cprofile', 'pyinstrument']
+
+# Tillståndet för pågående profilering (None när den är avstängd)
+_profil = None
+
+# Delas av alla steg när profileringen är avstängd - det som skrivs hit kastas
+_INAKTIV = contextlib.nullcontext({})
+
+
+def starta(profilerare=None):
+    """Starta profileringen, eventuellt med cProfile eller pyinstrument för en detaljerad dump."""
+    global _profil
+    _profil = {'start': time.perf_counter(), 'steg': {}, 'profilerare': None}
+
+    if profilerare == 'cprofile':
+        import cProfile
+        _profil['profilerare'] = ('cprofile', cProfile.Profile())
+        _profil['profilerare'][1].enable()
+    elif profilerare == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("⚠️  pyinstrument är inte installerat (pip install pyinstrument) - kör utan dump")
+        else:
+            _profil['profilerare'] = ('pyinstrument', Profiler())
+            _profil['profilerare'][1].start()
+
+
+def steg(namn):
+    """
+    Mät ett steg. Upprepade steg med samma namn summeras.
+
+    Kontexten ger en dict där anroparen kan sätta 'rader' till antalet
+    bearbetade rader.
+    """
+    if _profil is None:
+        return _INAKTIV
+    return _mät(namn)
+
+
+def profilerad(namn):
+    """Dekorator som mäter varje anrop av funktionen som steget namn."""
+    def dekorera(funktion):
+        @functools.wraps(funktion)
+        def omslag(*args, **kwargs):
+            if _profil is None:
+                return funktion(*args, **kwargs)
+            with _mät(namn):
+                return funktion(*args, **kwargs)
+        return omslag
+    return dekorera
+
+
+@contextlib.contextmanager
+def _mät(namn):
+    mätning = {}
+    start = time.perf_counter()
+    try:
+        yield mätning
+    finally:
+        sekunder = time.perf_counter() - start
+        post = _profil['steg'].setdefault(namn, {'sekunder': 0.0, 'anrop': 0, 'rader': None})
+        post['sekunder'] += sekunder
+        post['anrop'] += 1
+        if mätning.get('rader') is not None:
+            post['rader'] = (post['rader'] or 0) + int(mätning['rader'])
+        post['max_rss_mb'] = max_rss_mb()
+
+
+def max_rss_mb():
+    """Processens högsta minnesanvändning hittills i MB, eller None om det inte går att mäta."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux rapporterar kB, macOS byte
+    return round(max_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def avsluta(skript, rapport_fil):
+    """Stoppa profileringen, skriv JSON-rapporten (och eventuell dump) och en kort sammanfattning."""
+    global _profil
+    if _profil is None:
+        return None
+    profil, _profil = _profil, None
+
+    rapport_fil = Path(rapport_fil)
+    rapport = {
+        'skript': skript,
+        'tidpunkt': datetime.now().isoformat(timespec='seconds'),
+        'total_sekunder': round(time.perf_counter() - profil['start'], 4),
+        'max_rss_mb': max_rss_mb(),
+        'steg': [{'namn': namn, **post, 'sekunder': round(post['sekunder'], 4)}
+                 for namn, post in profil['steg'].items()],
+    }
+
+    if profil['profilerare']:
+        typ, profilerare = profil['profilerare']
+        if typ == 'cprofile':
+            profilerare.disable()
+            dump = rapport_fil.with_suffix('.prof')
+            profilerare.dump_stats(dump)
+        else:
+            profilerare.stop()
+            dump = rapport_fil.with_suffix('.html')
+            dump.write_text(profilerare.output_html(), encoding='utf-8')
+        rapport['dump'] = str(dump)
+
+    rapport_fil.write_text(json.dumps(rapport, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    print(f"\n⏱️  Profil för {skript} ({rapport['total_sekunder']:.2f} s, max {rapport['max_rss_mb']} MB):")
+    for post in rapport['steg']:
+        rader = f"{post['rader']:>12,} rader" if post['rader'] is not None else ""
+        print(f"   {post['namn']:<28} {post['sekunder']:>8.3f} s  {post['anrop']:>4}×  {rader}")
+    print(f"📄 Profilrapport: {rapport_fil}")
+    if 'dump' in rapport:
+        print(f"📄 Profildump: {rapport['dump']}")
+
+    return rapport
+
+
+def lägg_till_argument(parser):
+    """Lägg till --profil och --profil-dump i ett skripts argumentparser."""
+    parser.add_argument('--profil', '--profile', action='store_true',
+                        help="mät tid, minne och rader per steg och skriv en JSON-rapport")
+    parser.add_argument('--profil-dump', choices=PROFILERARE,
+                        help="spara även en detaljerad profil med cProfile eller pyinstrument")
@@ -0,0 +1,664 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Gemensam aggregeringsmotor för dashboards och analysrapporter
+
+Alla rapporter räknar KPI:er, periodjämförelser och dimensionstabeller här, så
+att terminalrapporten och dashboardsen ger samma siffror.
+"""
+
+import numpy as np
+import pandas as pd
+
+import aggregatcache
+from inlasning import filtrera_period
+
+
+# Summerbara försäljningsmått (förberäknas i kuben och summeras i KPI:erna)
+FÖRSÄLJNINGSMÅTT = ['Ordervärde', 'Försäljning', 'Rabattvärde', 'Antal försäljningsordrar']
+
+
+def bygg_kub(df, dimensioner, mått, kanal_kolumn='SäljKanal'):
+    """
+    Aggregera datan en gång per dimension till en förberäknad kub.
+
+    Varje dimension grupperas i ett enda pass över (År, Månad, kanal, dimension).
+    Resultatet delas upp per (år, månad, kanal) så att varje KPI-kort och tabell
+    blir en uppslagning i stället för en ny filtrering och groupby över hela datan.
+    Kanal None motsvarar alla kanaler. Dimension None ger totalerna för KPI:erna.
+    """
+    kub = {'uttag': {}, 'tomma': {}}
+
+    for dimension in [None] + list(dimensioner):
+        # Kanalnivån döps om så att kanalen även kan vara en egen dimension
+        nivåer = [df['År'], df['Månad'], df[kanal_kolumn].rename('_kanal')]
+        if dimension:
+            nivåer.append(df[dimension])
+        agg = df.groupby(nivåer, dropna=False, observed=True, sort=True)[mått].sum()
+
+        if dimension:
+            # En vanlig groupby(dimension) hoppar över saknade värden - gör likadant
+            agg = agg[agg.index.get_level_values(dimension).notna()]
+            alla_kanaler = agg.groupby(level=['År', 'Månad', dimension], observed=True, sort=True).sum()
+        else:
+            alla_kanaler = agg.groupby(level=['År', 'Månad'], sort=True).sum()
+
+        uttag = {}
+        for (år, månad, kanal), del_df in agg.groupby(level=[0, 1, 2], dropna=False, observed=True, sort=False):
+            uttag[(år, månad, kanal)] = _till_uttag(del_df, dimension)
+        for (år, månad), del_df in alla_kanaler.groupby(level=[0, 1], sort=False):
+            uttag[(år, månad, None)] = _till_uttag(del_df, dimension)
+
+        kub['uttag'][dimension] = uttag
+        if dimension:
+            kub['tomma'][dimension] = _till_uttag(agg.iloc[0:0], dimension)
+        else:
+            kub['tomma'][dimension] = pd.Series(0.0, index=mått)
+
+    return kub
+
+
+def bygg_kub_cachad(df, källa, dimensioner, mått, kanal_kolumn='SäljKanal', perioder=None):
+    """
+    Som bygg_kub, men med kubens uttag sparade i aggregatcachen per period och dimension.
+
+    Uttag som redan finns för källan - från en tidigare körning eller en annan
+    rapport över samma fil - läses ur cachen, och bara saknade perioder och
+    dimensioner aggregeras. perioder (ÅÅÅÅMM) begränsar kuben till vissa perioder.
+    """
+    if perioder is None:
+        perioder = np.unique(df.index.to_numpy()).tolist()
+    kub = bygg_kub(df.iloc[0:0], dimensioner, mått, kanal_kolumn)
+
+    nycklar = {
+        (period, dimension): ('kub', källa, kanal_kolumn, tuple(mått), period, dimension)
+        for period in perioder for dimension in [None] + list(dimensioner)
+    }
+    delar = {post: aggregatcache.läs(nyckel) for post, nyckel in nycklar.items()}
+    saknade = [post for post, del_ in delar.items() if del_ is None]
+
+    if saknade:
+        # Aggregera de perioder och dimensioner som saknas i ett pass
+        nya_perioder = sorted({period for period, _ in saknade})
+        nya_dimensioner = [dimension for dimension in dimensioner if any(d == dimension for _, d in saknade)]
+        ny_kub = bygg_kub(
+            pd.concat([filtrera_period(df, period // 100, period % 100) for period in nya_perioder]),
+            nya_dimensioner, mått, kanal_kolumn
+        )
+        for period, dimension in saknade:
+            del_ = {kanal: uttag for (år, månad, kanal), uttag in ny_kub['uttag'][dimension].items()
+                    if år * 100 + månad == period}
+            aggregatcache.skriv(nycklar[(period, dimension)], del_)
+            delar[(period, dimension)] = del_
+
+    for (period, dimension), del_ in delar.items():
+        år, månad = divmod(period, 100)
+        kub['uttag'][dimension].update({(år, månad, kanal): uttag for kanal, uttag in del_.items()})
+    return kub
+
+
+def uppdatera_kub(kub, df, perioder, dimensioner, mått, kanal_kolumn='SäljKanal'):
+    """
+    Bygg om kuben enbart för givna perioder (ÅÅÅÅMM) och behåll övriga uttag.
+
+    Uttagen för en period beror bara på periodens egna rader, så en ändrad
+    månad kräver bara en aggregering av den månadens rader.
+    """
+    delar = [filtrera_period(df, period // 100, period % 100) for period in sorted(perioder)]
+    ny_kub = bygg_kub(pd.concat(delar) if delar else df.iloc[0:0], dimensioner, mått, kanal_kolumn)
+    if kub is None:
+        return ny_kub
+
+    for dimension, uttag in kub['uttag'].items():
+        for nyckel in [nyckel for nyckel in uttag if nyckel[0] * 100 + nyckel[1] in perioder]:
+            del uttag[nyckel]
+        uttag.update(ny_kub['uttag'][dimension])
+    return kub
+
+
+def _till_uttag(del_df, dimension):
+    """Forma om en del av kuben till samma form som en groupby(dimension).sum()."""
+    if dimension is None:
+        return del_df.iloc[0]
+    return del_df.reset_index(level=dimension).reset_index(drop=True)
+
+
+def kub_uttag(kub, år, månad, kanal=None, dimension=None):
+    """Hämta aggregatet för en period, kanal och dimension ur kuben."""
+    return kub['uttag'][dimension].get((år, månad, kanal), kub['tomma'][dimension])
+
+
+def procentuell_förändring(aktuell, jämförelse, vid_ny=100):
+    """
+    Procentuell förändring från jämförelse till aktuell för hela kolumner på en gång.
+
+    jämförelse kan vara en kolumn eller en tabell med en kolumn per
+    jämförelseperiod (t.ex. YoY och MoM), och aktuell jämförs då mot varje
+    kolumn. Där jämförelsen inte är över 0 blir förändringen vid_ny om
+    aktuell är över 0, annars 0.
+    """
+    aktuell = np.asarray(aktuell, dtype=float)
+    jämförelse = np.asarray(jämförelse, dtype=float)
+    if jämförelse.ndim == 2 and aktuell.ndim == 1:
+        aktuell = aktuell[:, np.newaxis]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        förändring = (aktuell - jämförelse) / jämförelse * 100
+    return np.where(jämförelse > 0, förändring, np.where(aktuell > 0, vid_ny, 0.0))
+
+
+def jämförelsemånader(år, månad):
+    """Perioderna (år, månad) som jämförs YoY (samma månad föregående år) och MoM (föregående månad)."""
+    yoy = (år - 1, månad)
+    # Januari jämför med december föregående år
+    mom = (år - 1, 12) if månad == 1 else (år, månad - 1)
+    return yoy, mom
+
+
+def månadsnummer(perioder):
+    """Perioderna (ÅÅÅÅMM) som löpande månadsnummer, så att månader kan räknas över årsskiften."""
+    perioder = np.asarray(perioder, dtype=np.int64)
+    return perioder // 100 * 12 + perioder % 100 - 1
+
+
+def från_månadsnummer(nummer):
+    """Löpande månadsnummer tillbaka till perioder (ÅÅÅÅMM)."""
+    nummer = np.asarray(nummer, dtype=np.int64)
+    return nummer // 12 * 100 + nummer % 12 + 1
+
+
+def perioder_i_data(*ramar):
+    """Perioderna (ÅÅÅÅMM) i ramarnas periodindex (se indexera_perioder), sorterade."""
+    return np.unique(np.concatenate([ram.index.to_numpy() for ram in ramar])).astype(np.int64).tolist()
+
+
+def välj_perioder(perioder, från=None, till=None, senaste=None):
+    """
+    Perioderna (ÅÅÅÅMM) som ska visas, valda i ett svep över periodaxeln.
+
+    från och till (ÅÅÅÅMM) avgränsar perioderna, och senaste ger ett rullande
+    fönster med de senaste N kalendermånaderna fram till den sista perioden i
+    urvalet. Utan något av dem väljs alla perioder under det senaste året.
+    """
+    perioder = np.unique(np.asarray(perioder, dtype=np.int64))
+    urval = np.ones(len(perioder), dtype=bool)
+    if från is not None:
+        urval &= perioder >= från
+    if till is not None:
+        urval &= perioder <= till
+    if senaste is not None and urval.any():
+        nummer = månadsnummer(perioder)
+        urval &= nummer > nummer[urval].max() - senaste
+    if från is None and till is None and senaste is None and len(perioder):
+        urval &= perioder // 100 == perioder[-1] // 100
+    return perioder[urval].tolist()
+
+
+def med_jämförelseperioder(perioder):
+    """Perioderna (ÅÅÅÅMM) tillsammans med perioderna de jämförs mot YoY och MoM."""
+    nummer = månadsnummer(perioder)
+    return från_månadsnummer(np.unique(np.concatenate([nummer, nummer - 12, nummer - 1]))).tolist()
+
+
+def lägg_till_periodargument(parser):
+    """Lägg till --från, --till och --senaste (val av perioder) i ett skripts argumentparser."""
+    parser.add_argument('--från', type=int, metavar='ÅÅÅÅMM',
+                        help="första perioden som visas (standard: januari det senaste året i datan)")
+    parser.add_argument('--till', type=int, metavar='ÅÅÅÅMM',
+                        help="sista perioden som visas (standard: den sista perioden i datan)")
+    parser.add_argument('--senaste', type=int, metavar='N',
+                        help="visa bara de senaste N månaderna (rullande fönster)")
+
+
+def försäljnings_kpi(summor):
+    """Beräkna huvud-KPI:er för försäljningen från summerade mått (en period eller ett kubuttag)."""
+    return {
+        'Ordervärde': summor['Ordervärde'],
+        'Försäljning': summor['Försäljning'],
+        'Rabattvärde': summor['Rabattvärde'],
+        'Försäljningsantal': summor['Antal försäljningsordrar'],
+        'Rabatt%': (summor['Rabattvärde'] / summor['Ordervärde'] * 100) if summor['Ordervärde'] > 0 else 0,
+    }
+
+
+def jämför_perioder(kpi_aktuell, kpi_jämförelse, procentenheter=('Rabatt%',)):
+    """
+    Jämför KPI:er mellan två perioder.
+
+    Varje KPI får Aktuell, Jämförelse och Förändring (skillnaden). KPI:er som
+    själva är procentsatser (procentenheter) jämförs i procentenheter
+    (Förändring_pp), övriga som procentuell förändring (Förändring%) enligt
+    procentuell_förändring.
+    """
+    jämförelse = {}
+    for nyckel, värde_aktuell in kpi_aktuell.items():
+        värde_jämförelse = kpi_jämförelse.get(nyckel, 0)
+        jämförelse[nyckel] = {
+            'Aktuell': värde_aktuell,
+            'Jämförelse': värde_jämförelse,
+            'Förändring': värde_aktuell - värde_jämförelse,
+        }
+        if nyckel in procentenheter:
+            jämförelse[nyckel]['Förändring_pp'] = värde_aktuell - värde_jämförelse
+
+    nycklar = [nyckel for nyckel in kpi_aktuell if nyckel not in procentenheter]
+    förändringar = procentuell_förändring(
+        [jämförelse[nyckel]['Aktuell'] for nyckel in nycklar],
+        [jämförelse[nyckel]['Jämförelse'] for nyckel in nycklar],
+    )
+    for nyckel, förändring in zip(nycklar, förändringar.tolist()):
+        jämförelse[nyckel]['Förändring%'] = förändring
+
+    return jämförelse
+
+
+def jämför_dimension(aktuell, jämförelser, dimension, jämförda_mått, top_n=10, sortera_efter=None,
+                     sorteringsnyckel=None, exkludera_värden=None, bara_aktuella=False):
+    """
+    Jämför en redan aggregerad dimension (en rad per värde, t.ex. ett kubuttag) mellan perioder.
+
+    jämförelser är {namn: aggregat}, t.ex. {'yoy': ..., 'mom': ...}. För varje
+    jämfört mått m och jämförelse namn läggs kolumnerna m_namn (jämförelsens
+    värde), m_namn_diff och m_namn% (procentuell_förändring) till, medan
+    aktuella värden behåller måttets namn. Värden som saknas i en period räknas
+    som 0; med bara_aktuella tas bara värden från aktuell period med.
+
+    Raderna sorteras fallande på sortera_efter (lika värden i dimensionens
+    ordning), eller stigande på sorteringsnyckel(värde) om den ges, och
+    begränsas till top_n. Sorteras det på sortera_efter väljs de top_n raderna
+    ur aktuell period innan jämförelserna kopplas på, så att en lång svans av
+    små värden (t.ex. SNI-koder) varken jämförs eller sorteras.
+    """
+    if exkludera_värden:
+        aktuell = aktuell[~aktuell[dimension].isin(exkludera_värden)]
+        jämförelser = {namn: agg[~agg[dimension].isin(exkludera_värden)] for namn, agg in jämförelser.items()}
+
+    koppling = 'left' if bara_aktuella else 'outer'
+    if sortera_efter and not sorteringsnyckel and len(aktuell) > top_n:
+        topp = aktuell.iloc[np.sort(topp_index(aktuell[sortera_efter], top_n))]
+        # Värden som bara finns i jämförelserna har 0 i aktuell period och kan
+        # bara komma med om något av de valda värdena inte är över 0
+        if bara_aktuella or topp[sortera_efter].min() > 0:
+            aktuell, koppling = topp, 'left'
+
+    resultat = aktuell
+    for namn, agg in jämförelser.items():
+        agg = agg[[dimension] + jämförda_mått].rename(columns={m: f"{m}_{namn}" for m in jämförda_mått})
+        resultat = resultat.merge(agg, on=dimension, how=koppling).fillna(0)
+
+    for namn in jämförelser:
+        for m in jämförda_mått:
+            resultat[f"{m}_{namn}_diff"] = resultat[m] - resultat[f"{m}_{namn}"]
+        resultat[[f"{m}_{namn}%" for m in jämförda_mått]] = procentuell_förändring(
+            resultat[jämförda_mått], resultat[[f"{m}_{namn}" for m in jämförda_mått]]
+        )
+
+    return _sortera_och_begränsa(resultat, dimension, top_n, sortera_efter, sorteringsnyckel)
+
+
+def _sortera_och_begränsa(resultat, dimension, top_n, sortera_efter, sorteringsnyckel):
+    """Sortera en jämförd dimension (se jämför_dimension) och behåll de top_n första raderna."""
+    if sorteringsnyckel:
+        resultat['_sort_key'] = resultat[dimension].astype(str).apply(sorteringsnyckel)
+        resultat = resultat.sort_values('_sort_key').drop('_sort_key', axis=1)
+        return resultat.head(top_n)
+
+    return resultat.iloc[topp_index(resultat[sortera_efter], top_n)]
+
+
+def topp_index(värden, n):
+    """
+    Positionerna för de n största värdena, fallande och med lika värden i ursprunglig ordning.
+
+    Samma rader som en stabil fallande sortering följd av head(n), men med
+    partiell selektion (argpartition) - bara de utvalda raderna sorteras.
+    """
+    värden = np.asarray(värden, dtype=float)
+    if n < len(värden):
+        # Alla värden lika med det n:te största är kandidater, så att lika värden väljs i ordning
+        gräns = np.partition(värden, len(värden) - n)[len(värden) - n]
+        kandidater = np.flatnonzero(värden >= gräns)
+    else:
+        kandidater = np.arange(len(värden))
+    return kandidater[np.argsort(-värden[kandidater], kind='stable')][:n]
+
+
+# Jämförelserna i en periodmatris: namn och antal perioder bakåt längs periodaxeln
+JÄMFÖRELSESTEG = {'yoy': 12, 'mom': 1}
+
+# Dimensioner med fler värden än så lagras glest, med bara de celler som förekommer
+GLES_GRÄNS = 64
+
+
+def bygg_periodmatris(df, dimension, mått, filter_kolumn=None, jämförelsesteg=JÄMFÖRELSESTEG, gles=None):
+    """
+    Summera en dimension per filter, period och värde i ett pass, för uttag av alla vyer.
+
+    Periodaxeln är löpande månader (se månadsnummer) från datans första period,
+    så att en jämförelse i jämförelsesteg (t.ex. YoY 12 och MoM 1 månad bakåt)
+    är samma cell ett antal steg tidigare längs axeln - ingen vy behöver
+    filtrera eller gruppera om datan. Vyer tas ut med jämför_i_matris.
+
+    Dimensioner med få värden lagras som en tät matris (filter × period × värde).
+    Med fler än GLES_GRÄNS värden (t.ex. SNI), eller med gles=True, lagras
+    bara celler som förekommer i datan, sorterade på cellens position, så att
+    minnet växer med datan och inte med svansen av sällsynta värden.
+
+    Värdeaxeln har samma ordning som en groupby på dimensionen, och rader där
+    dimensionen saknas räknas inte (dimension None ger totalen). Med
+    filter_kolumn får varje värde i den kolumnen en egen rad i filteraxeln,
+    och den sista raden summerar alla rader.
+    """
+    return bygg_periodmatriser(df, [dimension], mått, filter_kolumn, jämförelsesteg, gles)[dimension]
+
+
+def bygg_periodmatriser(df, dimensioner, mått, filter_kolumn=None, jämförelsesteg=JÄMFÖRELSESTEG, gles=None):
+    """
+    Periodmatriser (se bygg_periodmatris) för flera dimensioner i ett gemensamt pass över raderna.
+
+    Period- och filteraxlarna och måttens vikter räknas fram en gång och delas
+    av alla dimensioner, så att varje dimension bara kostar sin faktorisering
+    och en bincount per mått. Ger {dimension: matris}; dimension None ger totalen.
+    """
+    perioder = månadsnummer(df.index.to_numpy())
+    start = int(perioder.min()) if len(perioder) else 0
+    period_kod = perioder - start
+    antal_perioder = int(period_kod.max()) + 1 if len(period_kod) else 0
+
+    if filter_kolumn:
+        filter_kod, filtervärden = pd.factorize(df[filter_kolumn], sort=True)
+        # Rader utan filtervärde räknas bara i summaraden
+        filter_kod = np.where(filter_kod < 0, len(filtervärden), filter_kod)
+    else:
+        filter_kod, filtervärden = np.zeros(len(df), dtype=np.intp), []
+
+    # Varje rad summeras både i sin filterrad och i summaraden
+    summarad = len(filtervärden)
+    egen = np.flatnonzero(filter_kod != summarad)
+    rad = np.concatenate([egen, np.arange(len(df))])
+    cell = np.concatenate([filter_kod[egen], np.full(len(df), summarad)]) * antal_perioder + period_kod[rad]
+    vikter = {m: df[m].to_numpy(dtype=float, na_value=0.0)[rad] for m in mått}
+
+    gemensamt = {
+        'start': start, 'steg': dict(jämförelsesteg), 'mått': list(mått),
+        'filter': {värde: i for i, värde in enumerate(filtervärden)},
+        'heltal': [m for m in mått if pd.api.types.is_integer_dtype(df[m])],
+    }
+    axlar = (summarad + 1, antal_perioder)
+    return {
+        dimension: _bygg_dimensionsmatris(df, dimension, rad, cell, vikter, axlar, gemensamt, gles)
+        for dimension in dimensioner
+    }
+
+
+def _bygg_dimensionsmatris(df, dimension, rad, cell, vikter, axlar, gemensamt, gles):
+    """En dimensions periodmatris ur de delade axlarna och vikterna (se bygg_periodmatriser)."""
+    if dimension:
+        värde_kod, värden = pd.factorize(df[dimension], sort=True)
+    else:
+        värde_kod, värden = np.zeros(len(df), dtype=np.intp), pd.Index([None])
+    form = axlar + (len(värden),)
+    värde_kod = värde_kod[rad]
+    index = cell * form[2] + värde_kod
+    if (värde_kod < 0).any():
+        giltiga = värde_kod >= 0
+        index = index[giltiga]
+        vikter = {m: v[giltiga] for m, v in vikter.items()}
+
+    matris = dict(gemensamt, form=form, dimension=dimension, värden=värden,
+                  gles=len(värden) > GLES_GRÄNS if gles is None else gles)
+    if matris['gles']:
+        nycklar, cell_index = np.unique(index, return_inverse=True)
+        matris['nycklar'] = nycklar
+        # Antal rader per cell avgör vilka värden som förekommer i en period
+        matris['rader'] = np.bincount(cell_index, minlength=len(nycklar))
+        matris['summor'] = {m: np.bincount(cell_index, weights=v, minlength=len(nycklar)) for m, v in vikter.items()}
+    else:
+        storlek = int(np.prod(form))
+        matris['rader'] = np.bincount(index, minlength=storlek).reshape(form)
+        matris['summor'] = {m: np.bincount(index, weights=v, minlength=storlek).reshape(form)
+                            for m, v in vikter.items()}
+    return matris
+
+
+def periodmatriser_ur_kub(kub, dimensionsmått=None, jämförelsesteg=JÄMFÖRELSESTEG, gles=None):
+    """
+    Kubens uttag (se bygg_kub) som periodmatriser med kanalen som filter: {dimension: matris}.
+
+    Vyerna tas då ut med matris_summor och jämför_i_matris som arrayer, i
+    stället för att uttagen för perioden och dess jämförelser kopplas ihop per
+    vy. Matriserna byggs ur kubens summor, så kuben kan ha byggts i delar
+    (bygg_kub_cachad, uppdatera_kub). Totalen har alla kubens mått, dimensionerna
+    bara dimensionsmått om de anges.
+    """
+    mått = list(kub['tomma'][None].index)
+    nycklar = {nyckel for uttag in kub['uttag'].values() for nyckel in uttag}
+    # Uttag för rader utan kanal ingår redan i alla kanaler (None) och efterfrågas aldrig
+    nycklar = [(år, månad, kanal) for år, månad, kanal in nycklar if kanal is None or not pd.isna(kanal)]
+    perioder = månadsnummer([år * 100 + månad for år, månad, _ in nycklar])
+    start = int(perioder.min()) if len(perioder) else 0
+    kanaler = sorted({kanal for _, _, kanal in nycklar if kanal is not None})
+    filter_index = {kanal: i for i, kanal in enumerate(kanaler)}
+    axlar = (len(kanaler) + 1, int(perioder.max()) - start + 1 if len(perioder) else 0)
+
+    def cell(år, månad, kanal):
+        return (len(kanaler) if kanal is None else filter_index[kanal]) * axlar[1] + \
+            int(månadsnummer(år * 100 + månad)) - start
+
+    matriser = {}
+    for dimension, uttag in kub['uttag'].items():
+        delar = {nyckel: del_ for nyckel, del_ in uttag.items() if nyckel[2] is None or nyckel[2] in filter_index}
+        if dimension is None:
+            df = pd.DataFrame([del_.to_numpy(dtype=float) for del_ in delar.values()], columns=mått)
+            dimensionens_mått = mått
+        else:
+            df = pd.concat(list(delar.values()) or [kub['tomma'][dimension]], ignore_index=True)
+            dimensionens_mått = dimensionsmått or mått
+        celler = np.repeat(np.array([cell(*nyckel) for nyckel in delar], dtype=np.int64),
+                           [1 if dimension is None else len(del_) for del_ in delar.values()])
+        gemensamt = {
+            'start': start, 'steg': dict(jämförelsesteg), 'mått': list(dimensionens_mått), 'filter': filter_index,
+            'heltal': [m for m in dimensionens_mått if pd.api.types.is_integer_dtype(df[m])],
+        }
+        vikter = {m: df[m].to_numpy(dtype=float, na_value=0.0) for m in dimensionens_mått}
+        matriser[dimension] = _bygg_dimensionsmatris(df, dimension, np.arange(len(df)), celler, vikter, axlar,
+                                                     gemensamt, gles)
+    return matriser
+
+
+def matrisuttag(matris, år, månad, filter_värde=None):
+    """
+    Index (filter, period) för en vy i en periodmatris, eller None om filtervärdet saknas.
+
+    filter_värde None ger summan över alla rader. Perioden kan ligga utanför
+    datan - dess celler är då tomma.
+    """
+    period = int(månadsnummer(år * 100 + månad)) - matris['start']
+    filter_index = len(matris['filter']) if filter_värde is None else matris['filter'].get(filter_värde)
+    if filter_index is None:
+        return None
+    return filter_index, period
+
+
+def _koder_i_cell(matris, filter_index, period):
+    """Värdeaxelns positioner för de värden som förekommer i en period, i axelns ordning."""
+    antal_filter, antal_perioder, antal_värden = matris['form']
+    if not 0 <= period < antal_perioder:
+        return np.zeros(0, dtype=np.intp)
+    if matris['gles']:
+        bas = (filter_index * antal_perioder + period) * antal_värden
+        början, slut = np.searchsorted(matris['nycklar'], [bas, bas + antal_värden])
+        return matris['nycklar'][början:slut] - bas
+    return np.flatnonzero(matris['rader'][filter_index, period] > 0)
+
+
+def _värden_i_cell(matris, filter_index, period, koder):
+    """Måttens summor för värdena koder i en period: {mått: array}, 0 där ett värde saknas."""
+    antal_filter, antal_perioder, antal_värden = matris['form']
+    if not 0 <= period < antal_perioder:
+        return {m: np.zeros(len(koder)) for m in matris['mått']}
+    if not matris['gles']:
+        return {m: matris['summor'][m][filter_index, period][koder] for m in matris['mått']}
+
+    # Slå upp cellerna bland de lagrade nycklarna
+    nycklar = (filter_index * antal_perioder + period) * antal_värden + np.asarray(koder)
+    position = np.minimum(np.searchsorted(matris['nycklar'], nycklar), len(matris['nycklar']) - 1)
+    finns = matris['nycklar'][position] == nycklar if len(matris['nycklar']) else np.zeros(len(nycklar), dtype=bool)
+    return {m: np.where(finns, matris['summor'][m][position], 0.0) if len(nycklar) else np.zeros(0)
+            for m in matris['mått']}
+
+
+def matris_summor(matris, år, månad, filter_värde=None):
+    """
+    Måttens totaler för en period och dess jämförelser ur en periodmatris utan dimension.
+
+    Ger {'aktuell': {mått: summa}, namn: {mått: summa}, ...} med ett namn per jämförelse.
+    """
+    uttag = matrisuttag(matris, år, månad, filter_värde)
+    koder = np.zeros(1, dtype=np.intp)
+
+    def summor(steg):
+        värden = _värden_i_cell(matris, uttag[0], uttag[1] - steg, koder) if uttag else {}
+        return {m: (int if m in matris['heltal'] else float)(värden[m][0] if uttag else 0)
+                for m in matris['mått']}
+
+    resultat = {'aktuell': summor(0)}
+    resultat.update({namn: summor(steg) for namn, steg in matris['steg'].items()})
+    return resultat
+
+
+def jämför_i_matris(matris, år, månad, filter_värde=None, top_n=10, sortera_efter=None,
+                    sorteringsnyckel=None, exkludera_värden=None, bara_aktuella=False, jämförda_mått=None):
+    """
+    Som jämför_dimension, men uttagen ur en periodmatris (se bygg_periodmatris).
+
+    Vyn är ett uttag av periodens celler. Sorteras det på sortera_efter väljs
+    de top_n värdena med partiell selektion (topp_index) innan jämförelserna
+    slås upp, så att bara de rader som visas jämförs. Kolumnerna och
+    radordningen är desamma som från jämför_dimension. Utan jämförda_mått
+    jämförs alla matrisens mått.
+    """
+    dimension, mått = matris['dimension'], matris['mått']
+    jämförda_mått = jämförda_mått or mått
+    uttag = matrisuttag(matris, år, månad, filter_värde)
+    if uttag is None:
+        filter_index, period = 0, -1
+    else:
+        filter_index, period = uttag
+
+    koder = _koder_i_cell(matris, filter_index, period)
+    if not bara_aktuella:
+        for steg in matris['steg'].values():
+            koder = np.union1d(koder, _koder_i_cell(matris, filter_index, period - steg))
+    if exkludera_värden:
+        koder = koder[~matris['värden'][koder].isin(exkludera_värden)]
+
+    aktuella = _värden_i_cell(matris, filter_index, period, koder)
+    if not sorteringsnyckel:
+        topp = topp_index(aktuella[sortera_efter], top_n)
+        koder, aktuella = koder[topp], {m: värden[topp] for m, värden in aktuella.items()}
+
+    resultat = {dimension: matris['värden'][koder]}
+    resultat.update({m: aktuella[m].astype(np.int64) if m in matris['heltal'] else aktuella[m] for m in mått})
+    jämförda = {namn: _värden_i_cell(matris, filter_index, period - steg, koder) for namn, steg in matris['steg'].items()}
+    for namn, värden in jämförda.items():
+        resultat.update({f"{m}_{namn}": värden[m] for m in jämförda_mått})
+    for namn, värden in jämförda.items():
+        for m in jämförda_mått:
+            resultat[f"{m}_{namn}_diff"] = aktuella[m] - värden[m]
+            resultat[f"{m}_{namn}%"] = procentuell_förändring(aktuella[m], värden[m])
+
+    resultat = pd.DataFrame(resultat)
+    if sorteringsnyckel:
+        return _sortera_och_begränsa(resultat, dimension, top_n, sortera_efter, sorteringsnyckel)
+    return resultat
+
+
+# Kolumnerna i ett kundflöde (se flöde_per_värde och flöde_per_period)
+FLÖDESKOLUMNER = ['Ingående', 'Nya', 'Tappade', 'Netto', 'Utgående', 'Churn%']
+
+
+def _flöde(ingående, nya, utgående):
+    """Flödet mellan två ögonblicksbilder: tappade härleds som ingående + nya - utgående."""
+    tappade = ingående + nya - utgående
+    with np.errstate(divide='ignore', invalid='ignore'):
+        churn = np.where(ingående > 0, tappade / ingående * 100, 0.0)
+    return dict(zip(FLÖDESKOLUMNER, [ingående, nya, tappade, utgående - ingående, utgående, churn]))
+
+
+def flöde_per_period(stock, inflöde, år, månad, antal=12):
+    """
+    Kundflödet totalt per månad för de antal månaderna fram till och med (år, månad).
+
+    stock är en periodmatris utan dimension över ögonblicksbilder (t.ex.
+    kundstocken per månad) och inflöde en över det som tillkommit under
+    månaden (t.ex. nya kunder). Ingående är föregående månads stock, och
+    tappade härleds som ingående + nya - utgående. Alla månader räknas på en
+    gång genom att stockens periodaxel förskjuts ett steg. Månader utan
+    ögonblicksbild för både månaden och månaden före tas inte med.
+    """
+    slut = int(månadsnummer(år * 100 + månad))
+    nummer = np.arange(slut - antal + 1, slut + 1)
+
+    def serie(matris, förskjutning=0):
+        """Måttets total per månad i nummer (0 utanför datan) och om månaden finns i datan."""
+        (mått,) = matris['mått']
+        position = nummer - förskjutning - matris['start']
+        inom = (position >= 0) & (position < matris['form'][1])
+        värden, finns = np.zeros(len(nummer)), np.zeros(len(nummer), dtype=bool)
+        värden[inom] = matris['summor'][mått][-1, position[inom], 0]
+        finns[inom] = matris['rader'][-1, position[inom], 0] > 0
+        return värden, finns
+
+    utgående, finns = serie(stock)
+    ingående, fanns = serie(stock, 1)
+    nya, _ = serie(inflöde)
+    med = finns & fanns
+    perioder = från_månadsnummer(nummer[med])
+    resultat = pd.DataFrame({'Period': perioder, **_flöde(ingående[med], nya[med], utgående[med])})
+    return resultat.astype({kol: np.int64 for kol in FLÖDESKOLUMNER[:-1]})
+
+
+def flöde_per_värde(stock, inflöde, år, månad, top_n=10, sortera_efter='Tappade', sorteringsnyckel=None,
+                    exkludera_värden=None):
+    """
+    Kundflödet för en månad per värde i en dimension (se flöde_per_period).
+
+    stock och inflöde är periodmatriser över samma dimension. Värdeaxlarna
+    matchas på värdenas namn, så matriserna kan vara byggda ur olika ramar.
+    Ett värde tas med om det finns i stocken före eller efter månaden eller
+    bland inflödet. Saknas ögonblicksbilden för månaden eller månaden före
+    blir tabellen tom. Tappade per värde innefattar även kunder som bytt
+    värde (t.ex. antal anställda) mellan ögonblicksbilderna.
+    """
+    dimension = stock['dimension']
+    (stockmått,), (inflödesmått,) = stock['mått'], inflöde['mått']
+    _, period = matrisuttag(stock, år, månad)
+    summarad = len(stock['filter'])
+    aktuella = _koder_i_cell(stock, summarad, period)
+    föregående = _koder_i_cell(stock, summarad, period - 1)
+    if len(aktuella) == 0 or len(föregående) == 0:
+        return pd.DataFrame(columns=[dimension] + FLÖDESKOLUMNER)
+
+    _, inflödesperiod = matrisuttag(inflöde, år, månad)
+    inflödesrad = len(inflöde['filter'])
+    nya_koder = _koder_i_cell(inflöde, inflödesrad, inflödesperiod)
+    värden = pd.Index(stock['värden'][np.union1d(aktuella, föregående)].astype(str)).append(
+        pd.Index(inflöde['värden'][nya_koder].astype(str))).unique().sort_values()
+    if exkludera_värden:
+        värden = värden[~värden.isin(exkludera_värden)]
+
+    def summor(matris, filter_index, period, mått):
+        """Måttet per värde i värden, 0 för värden som saknas i matrisen."""
+        koder = pd.Index(matris['värden'].astype(str)).get_indexer(värden)
+        finns = koder >= 0
+        resultat = np.zeros(len(värden))
+        resultat[finns] = _värden_i_cell(matris, filter_index, period, koder[finns])[mått]
+        return resultat
+
+    flöde = _flöde(summor(stock, summarad, period - 1, stockmått),
+                   summor(inflöde, inflödesrad, inflödesperiod, inflödesmått),
+                   summor(stock, summarad, period, stockmått))
+    resultat = pd.DataFrame({dimension: värden, **flöde})
+    resultat = resultat.astype({kol: np.int64 for kol in FLÖDESKOLUMNER[:-1]})
+    return _sortera_och_begränsa(resultat, dimension, top_n, sortera_efter, sorteringsnyckel)